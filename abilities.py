@@ -1,8 +1,22 @@
 # abilities.py
 
+import math
 import random
+from battle_events import EFFECT, HEAL
+from config import ABILITY_TIER_CHANCES, MAX_CREATURE_LEVEL
+from effects import ATTACK, DEFENSE, STUN, Effect
+
+# Constructor order; also the keys of ability_to_dict().
+FIELDS = ("name", "base_damage", "ability_type", "tier", "min_level",
+          "energy_cost", "effect_value", "duration", "cooldown")
 
 class Ability:
+    """
+    One ability definition. Creatures share Ability objects (see the catalog
+    at the end of this file), so an Ability cannot be changed once built.
+    """
+    __slots__ = FIELDS + ("damage",)
+
     def __init__(self, name, base_damage, ability_type, tier=1, min_level=1,
                  energy_cost=10, effect_value=0, duration=0, cooldown=0):
         """
@@ -16,16 +30,20 @@ class Ability:
         :param duration: Duration of effect in turns (0 means instant).
         :param cooldown: Cooldown in turns.
         """
-        self.name = name
-        self.base_damage = base_damage
-        self.ability_type = ability_type
-        self.tier = tier
-        self.min_level = min_level
-        self.energy_cost = energy_cost
-        self.effect_value = effect_value
-        self.duration = duration
-        self.cooldown = cooldown
-        self.damage = self.calculate_damage()
+        values = (name, base_damage, ability_type, tier, min_level, energy_cost, effect_value, duration, cooldown)
+        for field, value in zip(FIELDS, values):
+            object.__setattr__(self, field, value)
+        object.__setattr__(self, "damage", self.calculate_damage())
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Ability {self.name!r} is shared between creatures and cannot be changed")
+
+    def __reduce__(self):
+        # Unpickles to the catalog's instance, e.g. in a pool worker.
+        return ability_from_dict, (ability_ref(self),)
+
+    def fields(self):
+        return tuple(getattr(self, f) for f in FIELDS)
 
     def calculate_damage(self):
         multiplier = 1 + (self.tier - 1) * 0.2
@@ -33,51 +51,81 @@ class Ability:
 
     def apply_effect(self, attacker, defender, battle):
         """
-        Apply additional effect:
-         - "buff": boosts attacker stat.
-         - "debuff": reduces defender stat.
-         - "heal": restores HP.
-         - "status": e.g., stun.
+        Apply additional effect (see effects.py):
+         - "buff": boosts attacker's attack for `duration` of its turns.
+         - "debuff": reduces defender's defense for `duration` of its turns.
+         - "heal": restores HP at once.
+         - "status": stuns the defender for `duration` of its turns.
+        Each is reported to battle.events.
         """
-        if self.ability_type == "buff":
-            attacker.add_effect({"stat": "attack", "multiplier": 1 + self.effect_value, "duration": self.duration})
-        elif self.ability_type == "debuff":
-            defender.add_effect({"stat": "defense", "multiplier": max(0, 1 - self.effect_value), "duration": self.duration})
+        if self.ability_type == "buff" and self.duration > 0:
+            effect = Effect(ATTACK, 1 + self.effect_value, self.duration)
+            attacker.add_effect(effect)
+            battle.events.emit(EFFECT, attacker, attacker, effect, self.duration)
+        elif self.ability_type == "debuff" and self.duration > 0:
+            effect = Effect(DEFENSE, max(0, 1 - self.effect_value), self.duration)
+            defender.add_effect(effect)
+            battle.events.emit(EFFECT, attacker, defender, effect, self.duration)
         elif self.ability_type == "heal":
+            before = attacker.current_hp
             attacker.current_hp = min(attacker.max_hp, attacker.current_hp + self.effect_value)
-        elif self.ability_type == "status":
-            defender.add_effect({"status": "stun", "duration": self.duration})
+            battle.events.emit(HEAL, attacker, amount=attacker.current_hp - before)
+        elif self.ability_type == "status" and self.duration > 0:
+            effect = Effect(STUN, 1.0, self.duration)
+            defender.add_effect(effect)
+            battle.events.emit(EFFECT, attacker, defender, effect, self.duration)
         # Extend with more effect types as needed.
 
     def __str__(self):
         return (f"{self.name} (Tier {self.tier}) - Damage: {self.damage} "
                 f"(Cost: {self.energy_cost} energy, Min Lvl: {self.min_level})")
 
+ABILITY_TYPES = ("damage", "buff", "debuff", "heal", "status")
+# Accepted range per numeric field, for abilities that arrive from a client.
+FIELD_RANGES = {
+    "base_damage": (0, 1000),
+    "tier": (1, max(ABILITY_TIER_CHANCES)),
+    "min_level": (1, MAX_CREATURE_LEVEL),
+    "energy_cost": (0, 100),
+    "effect_value": (0, 1000),
+    "duration": (0, 100),
+    "cooldown": (0, 100),
+}
+INT_FIELDS = ("tier", "min_level", "duration", "cooldown")
+
+def check_ability(ability):
+    """Raises ValueError unless every field has the type and range the battle rules expect."""
+    if not isinstance(ability.name, str) or ability.ability_type not in ABILITY_TYPES:
+        raise ValueError(f"Invalid ability {ability.name!r}")
+    for field, (low, high) in FIELD_RANGES.items():
+        value = getattr(ability, field)
+        numeric = int if field in INT_FIELDS else (int, float)
+        if (not isinstance(value, numeric) or isinstance(value, bool) or not math.isfinite(value)
+                or not low <= value <= high):
+            raise ValueError(f"Invalid {field} {value!r} for ability {ability.name!r}")
+
 def ability_to_dict(ability):
-    return {
-        "name": ability.name,
-        "base_damage": ability.base_damage,
-        "ability_type": ability.ability_type,
-        "tier": ability.tier,
-        "min_level": ability.min_level,
-        "energy_cost": ability.energy_cost,
-        "effect_value": ability.effect_value,
-        "duration": ability.duration,
-        "cooldown": ability.cooldown
-    }
+    return {f: getattr(ability, f) for f in FIELDS}
 
 def ability_from_dict(d):
-    return Ability(
-        d["name"],
-        d["base_damage"],
-        d["ability_type"],
-        d.get("tier", 1),
-        d.get("min_level", 1),
-        d.get("energy_cost", 10),
-        d.get("effect_value", 0),
-        d.get("duration", 0),
-        d.get("cooldown", 0)
-    )
+    """
+    The Ability for an ability id (see ability_ref) or an ability_to_dict()
+    record, as written by older saves and clients and by replays. Records
+    of a catalog ability resolve to the shared instance; any other record
+    gets an Ability of its own, so client data never grows the catalog.
+    Raises KeyError/TypeError/ValueError on anything else.
+    """
+    if isinstance(d, str):
+        name, _, tier = d.rpartition(ID_SEPARATOR)
+        return get_ability(name, int(tier))
+    values = (d["name"], d["base_damage"], d["ability_type"], d.get("tier", 1), d.get("min_level", 1),
+              d.get("energy_cost", 10), d.get("effect_value", 0), d.get("duration", 0), d.get("cooldown", 0))
+    name, tier = values[0], values[3]
+    if name in ABILITY_SPECS and type(tier) is int and 1 <= tier <= MAX_TIER:
+        ability = get_ability(name, tier)
+        if ability.fields() == values:
+            return ability
+    return Ability(*values)
 
 # Base ability pools per creature type.
 BASE_ABILITY_POOLS = {
@@ -108,8 +156,8 @@ NORMAL_ABILITY_POOL = [
     {"name": "Focus", "base_damage": 0, "ability_type": "buff", "min_level": 1, "effect_value": 0.2, "duration": 1},
 ]
 
-def get_random_tier():
-    roll = random.random()
+def get_random_tier(rng=random):
+    roll = rng.random()
     if roll < 0.7:
         return 1
     elif roll < 0.9:
@@ -117,20 +165,40 @@ def get_random_tier():
     else:
         return 3
 
-def generate_random_ability(creature_type):
+def generate_random_ability(creature_type, rng=random):
+    """:param rng: random.Random (or the random module) to draw from."""
     pool = BASE_ABILITY_POOLS.get(creature_type, []) + NORMAL_ABILITY_POOL
-    chosen = random.choice(pool)
-    tier = get_random_tier()
+    chosen = rng.choice(pool)
+    tier = get_random_tier(rng)
     if tier > 1:  # For new creatures, force tier 1.
         tier = 1
-    return Ability(
-        chosen["name"],
-        chosen["base_damage"],
-        chosen["ability_type"],
-        tier,
-        chosen.get("min_level", 1),
-        chosen.get("energy_cost", 10),
-        chosen.get("effect_value", 0),
-        chosen.get("duration", 0),
-        chosen.get("cooldown", 0)
-    )
+    return get_ability(chosen["name"], tier)
+
+# Ability catalog: one shared, immutable Ability per (name, tier) of the
+# pools above, built on first use. Creatures hold references to these, and
+# saves and network payloads name them by id ("Bone Smash:1") instead of
+# repeating every field.
+ID_SEPARATOR = ":"
+MAX_TIER = max(ABILITY_TIER_CHANCES)
+ABILITY_SPECS = {spec["name"]: spec for pool in list(BASE_ABILITY_POOLS.values()) + [NORMAL_ABILITY_POOL]
+                 for spec in pool}
+_catalog = {}  # (name, tier) -> Ability
+
+def get_ability(name, tier=1):
+    """Raises KeyError for a name that is in no pool, ValueError for a tier outside 1..MAX_TIER."""
+    ability = _catalog.get((name, tier))
+    if ability is None:
+        spec = ABILITY_SPECS[name]
+        if type(tier) is not int or not 1 <= tier <= MAX_TIER:
+            raise ValueError(f"No tier {tier!r} of {name}")
+        ability = Ability(name, spec["base_damage"], spec["ability_type"], tier, spec.get("min_level", 1),
+                          spec.get("energy_cost", 10), spec.get("effect_value", 0),
+                          spec.get("duration", 0), spec.get("cooldown", 0))
+        _catalog[name, tier] = ability
+    return ability
+
+def ability_ref(ability):
+    """What a save or payload stores for ability: its id, or the full record if it is not in the catalog."""
+    if _catalog.get((ability.name, ability.tier)) is ability:
+        return f"{ability.name}{ID_SEPARATOR}{ability.tier}"
+    return ability_to_dict(ability)
@@ -0,0 +1,210 @@
+# ai.py
+#
+# Search-based move choice for computer-controlled creatures: wild-battle
+# enemies (Battle.enemy_ai) and server-played bot seats. Battle outcomes
+# are deterministic once a move is picked, so the turn tree is searched
+# with alpha-beta minimax (negamax form, which also handles a faster side
+# moving twice in a row in speed-ordered battles): iterative deepening under a
+# wall-clock budget of a few milliseconds, with a transposition table
+# keyed by BattleState.key() (battle_state.py). A search cut off by the
+# budget falls back to the best move of the last depth that finished.
+#
+#   python ai.py --battles 300
+import argparse
+import random
+import time
+from battle_state import ENERGY, SIDES, BattleState
+from config import AI_MAX_DEPTH, AI_TIME_BUDGET
+from log import get_logger
+
+log = get_logger("ai")
+
+WIN = 1000.0
+TABLE_SIZE = 50000
+EXACT, LOWER, UPPER = 0, 1, 2
+DEADLINE_SHARE = 0.8  # Of the budget; the rest covers unwinding and OS jitter
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def evaluate(state):
+    """Static value for the side to move: HP share lead, energy as a tie-break."""
+    me = state.turn
+    values = state.values
+    return (100.0 * (state.hp_share(me) - state.hp_share(1 - me))
+            + 0.05 * (values[SIDES[me] + ENERGY] - values[SIDES[1 - me] + ENERGY]))
+
+
+class SearchAI:
+    """
+    :param budget: seconds of search per move.
+    :param table_size: transposition table entries kept before it is reset.
+    Keeps running totals in ``nodes`` and ``search_time`` (see report()).
+    """
+
+    def __init__(self, budget=AI_TIME_BUDGET, max_depth=AI_MAX_DEPTH, table_size=TABLE_SIZE):
+        self.budget = budget
+        self.max_depth = max_depth
+        self.table_size = table_size
+        self.table = {}  # state -> (depth, value, bound, best move)
+        self.profiles = None
+        self.nodes = 0
+        self.search_time = 0.0
+        self.moves_chosen = 0
+        self.last_depth = 0
+        self.deadline = 0.0
+
+    def choose(self, battle, attacker):
+        """Ability index for ``attacker`` (battle.player or battle.enemy) to play now."""
+        started = time.perf_counter()
+        side = 0 if attacker is battle.player else 1
+        root = BattleState.from_battle(battle, side)
+        if root.profiles != self.profiles:
+            self.profiles = root.profiles
+            self.table.clear()
+        moves = self.moves(root)
+        if len(moves) < 2:
+            # Stunned, stuck or forced: nothing to search.
+            best = moves[0] if moves else 0
+        else:
+            best = moves[0]
+            self.deadline = started + self.budget * DEADLINE_SHARE
+            nodes = self.nodes
+            for depth in range(1, self.max_depth + 1):
+                depth_started = time.perf_counter()
+                try:
+                    _, move = self.search(root, depth, -WIN * 2, WIN * 2, 0)
+                except SearchTimeout:
+                    break
+                best = move
+                self.last_depth = depth
+                # A deeper pass takes at least as long as this one did: don't
+                # start what the budget can't finish.
+                now = time.perf_counter()
+                if now + (now - depth_started) > self.deadline:
+                    break
+            log.debug("Searched %d nodes to depth %d", self.nodes - nodes, self.last_depth)
+        self.search_time += time.perf_counter() - started
+        self.moves_chosen += 1
+        return best
+
+    @staticmethod
+    def moves(state):
+        """Distinct choices for the side to move: a stunned side's all play out alike."""
+        if state.stunned(state.turn):
+            return [0]
+        return state.legal_moves()
+
+    def search(self, state, depth, alpha, beta, ply):
+        """Negamax with alpha-beta. :return: (value for the side to move, best move or None)."""
+        self.nodes += 1
+        if time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        key = state.key()
+        entry = self.table.get(key)
+        hint = None
+        if entry is not None:
+            entry_depth, value, bound, hint = entry
+            if entry_depth >= depth and (bound == EXACT or (bound == LOWER and value >= beta)
+                                         or (bound == UPPER and value <= alpha)):
+                return value, hint
+        moves = self.moves(state)
+        if not moves and not state.legal_moves(1 - state.turn):
+            return evaluate(state), None  # Neither side can ever act again.
+        if depth == 0:
+            return evaluate(state), None
+        if hint is not None and hint in moves:
+            moves.remove(hint)
+            moves.insert(0, hint)
+        original_alpha = alpha
+        best_value, best_move = -WIN * 2, None
+        for move in moves or [None]:
+            child = state.clone()
+            if move is None:
+                child.pass_turn()
+            else:
+                child.apply(move)
+            if child.winner is not None:
+                value = WIN - ply
+            elif child.turn == state.turn:
+                # Turns by speed: the faster side moves again.
+                value = self.search(child, depth - 1, alpha, beta, ply + 1)[0]
+            else:
+                value = -self.search(child, depth - 1, -beta, -alpha, ply + 1)[0]
+            if value > best_value:
+                best_value, best_move = value, move
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+        bound = UPPER if best_value <= original_alpha else LOWER if best_value >= beta else EXACT
+        if len(self.table) >= self.table_size:
+            self.table.clear()
+        self.table[key] = (depth, best_value, bound, best_move)
+        return best_value, best_move
+
+    def report(self):
+        """Nodes/sec and time per move so far, for tuning the budget."""
+        rate = self.nodes / self.search_time if self.search_time else 0.0
+        per_move = self.search_time / self.moves_chosen * 1000 if self.moves_chosen else 0.0
+        return (f"{self.nodes} nodes in {self.search_time:.3f}s ({rate:,.0f} nodes/s), "
+                f"{per_move:.2f} ms/move, last depth {self.last_depth}")
+
+
+def benchmark(battles=300, budget=AI_TIME_BUDGET, seed=1):
+    """
+    Wild-battle matchups (turns by speed, as game_engine sets them up)
+    with the enemy played by SearchAI and by Battle.enemy_turn's random
+    pick, against a random-playing player.
+    """
+    from battle_system import Battle
+    from creatures import Creature
+    from server_battle import Combatant
+    ai = SearchAI(budget)
+    wins = {"search": 0, "random": 0}
+    move_times = []
+    for i in range(battles):
+        rng = random.Random(seed + i)
+        player_data, enemy_data = Creature(rng=rng).to_dict(), Creature(rng=rng).to_dict()
+        for mode in wins:
+            battle = Battle(Combatant.from_dict(player_data), Combatant.from_dict(enemy_data), seed + i,
+                            speed_order=True)
+            if mode == "search":
+                battle.enemy_ai = ai
+            for _ in range(200):
+                if battle.turn == "player":
+                    battle.apply_attack(battle.player, battle.enemy,
+                                        battle.rng.randint(0, len(battle.player.abilities) - 1))
+                    if not battle.battle_over:
+                        battle.next_turn()
+                else:
+                    started = time.perf_counter()
+                    battle.enemy_turn()
+                    if mode == "search":
+                        move_times.append(time.perf_counter() - started)
+                if battle.battle_over:
+                    break
+            wins[mode] += battle.winner == "enemy"
+    move_times.sort()
+    return {"battles": battles, "search_win_rate": wins["search"] / battles,
+            "random_win_rate": wins["random"] / battles,
+            "p99_move_ms": move_times[len(move_times) * 99 // 100] * 1000 if move_times else 0.0,
+            "slowest_move_ms": move_times[-1] * 1000 if move_times else 0.0,
+            "report": ai.report()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search AI against random play")
+    parser.add_argument("--battles", type=int, default=300)
+    parser.add_argument("--budget-ms", type=float, default=AI_TIME_BUDGET * 1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    r = benchmark(args.battles, args.budget_ms / 1000, args.seed)
+    print(f"Enemy win rate over {r['battles']} battles: search {r['search_win_rate']:.1%}, "
+          f"random {r['random_win_rate']:.1%}")
+    print(f"Search: {r['report']}; p99 move {r['p99_move_ms']:.2f} ms, slowest {r['slowest_move_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# balance.py
+#
+# Type-vs-type balance check. Rolls a population of every creature type at
+# several levels (Creature plus Creature.level_up, so stat and ability odds
+# match the game's), then plays a round robin between the types at each
+# level: ``battles`` fights per pairing, seats alternating so neither type
+# always moves first. Fights use tournament.simulate_match (random legal
+# moves on the server's rules) spread over a process pool, and the result is
+# a win-rate matrix with Wilson score intervals.
+#
+# Everything random derives from --seed, and no result depends on the number
+# of workers or how battles are chunked, so two runs with the same seed are
+# comparable across balance patches.
+#   python balance.py --levels 1 10 25 --battles 2000 --seed 7 --out balance.json
+import argparse
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from abilities import BASE_ABILITY_POOLS
+from creatures import Creature
+from tournament import simulate_match
+
+TYPES = tuple(BASE_ABILITY_POOLS)
+Z_95 = 1.959964
+
+_populations = None  # Worker copy of {(type, level): [payloads]}; set by load_populations
+
+
+def population(creature_type, level, count, rng):
+    """count Creature.to_dict() payloads of one type, levelled up to ``level``."""
+    payloads = []
+    for _ in range(count):
+        creature = Creature.at_level(level, creature_type, rng)
+        creature.pending_skill = None  # Learning it is the player's choice.
+        payloads.append(creature.to_dict())
+    return payloads
+
+
+def build_populations(levels, per_type, seed):
+    rng = random.Random(seed)
+    return {(t, level): population(t, level, per_type, rng) for level in levels for t in TYPES}
+
+
+def wilson_interval(wins, n, z=Z_95):
+    """Wilson score interval for a win rate of wins/n."""
+    if n == 0:
+        return 0.0, 1.0
+    p = wins / n
+    denominator = 1 + z * z / n
+    centre = (p + z * z / (2 * n)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / denominator
+    return centre - margin, centre + margin
+
+
+def load_populations(populations):
+    """Pool initializer: every worker receives the populations once."""
+    global _populations
+    _populations = populations
+
+
+def run_chunk(jobs):
+    """
+    Pool entry point. jobs: (pairing, level, type a, type b, index a,
+    index b, a moves first, seed).
+    :return: (worker pid, seconds busy, {pairing: wins for type a}, battles).
+    """
+    start = time.perf_counter()
+    wins = {}
+    for pairing, level, a, b, i, j, a_first, seed in jobs:
+        first, second = _populations[a, level][i], _populations[b, level][j]
+        if not a_first:
+            first, second = second, first
+        winner = simulate_match(first, second, seed)
+        a_won = (winner == "player1") == a_first
+        wins[pairing] = wins.get(pairing, 0) + a_won
+    return os.getpid(), time.perf_counter() - start, wins, len(jobs)
+
+
+def schedule(levels, per_type, battles, seed):
+    """Every battle of the round robin, as run_chunk jobs, and the pairings they belong to."""
+    rng = random.Random(seed)
+    pairings, jobs = [], []
+    for level in levels:
+        for x in range(len(TYPES)):
+            for y in range(x + 1, len(TYPES)):
+                pairing = len(pairings)
+                pairings.append((level, TYPES[x], TYPES[y]))
+                for k in range(battles):
+                    jobs.append((pairing, level, TYPES[x], TYPES[y], rng.randrange(per_type),
+                                 rng.randrange(per_type), k % 2 == 0, rng.getrandbits(32)))
+    return pairings, jobs
+
+
+def run(levels=(1, 10, 25), per_type=64, battles=2000, seed=1, workers=None, chunks_per_worker=4):
+    """
+    :return: dict with "matrix" {level: {type a: {type b: (rate, low, high)}}}
+             (rate: type a's share of wins against type b), "workers"
+             {pid: (battles, busy seconds)}, "battles" and "elapsed".
+    """
+    populations = build_populations(levels, per_type, seed)
+    pairings, jobs = schedule(levels, per_type, battles, seed)
+    workers = workers or os.cpu_count() or 1
+    size = max(1, -(-len(jobs) // (workers * chunks_per_worker)))
+    chunks = [jobs[i:i + size] for i in range(0, len(jobs), size)]
+    wins = [0] * len(pairings)
+    per_worker = {}
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, initializer=load_populations, initargs=(populations,)) as executor:
+        for pid, busy, chunk_wins, count in executor.map(run_chunk, chunks):
+            for pairing, won in chunk_wins.items():
+                wins[pairing] += won
+            done, seconds = per_worker.get(pid, (0, 0.0))
+            per_worker[pid] = (done + count, seconds + busy)
+    elapsed = time.perf_counter() - start
+
+    # A type against itself wins half its battles by definition; mirrors are not played.
+    matrix = {level: {a: {a: (0.5, 0.5, 0.5)} for a in TYPES} for level in levels}
+    for (level, a, b), won in zip(pairings, wins):
+        low, high = wilson_interval(won, battles)
+        matrix[level][a][b] = (won / battles, low, high)
+        matrix[level][b][a] = (1 - won / battles, 1 - high, 1 - low)
+    return {"matrix": matrix, "workers": per_worker, "battles": len(jobs), "elapsed": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Creature type win-rate matrix from a round robin")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 10, 25])
+    parser.add_argument("--per-type", type=int, default=64, help="creatures rolled per type and level")
+    parser.add_argument("--battles", type=int, default=2000, help="battles per type pairing and level")
+    parser.add_argument("--workers", type=int, help="worker processes (default: every core)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="also write the matrix and run settings as JSON")
+    args = parser.parse_args()
+
+    r = run(args.levels, args.per_type, args.battles, args.seed, args.workers)
+    width = max(len(t) for t in TYPES)
+    for level, rows in r["matrix"].items():
+        print(f"Level {level}: row type's win rate against column type "
+              f"(95% interval half-width <= {max(h - l for row in rows.values() for _, l, h in row.values()) / 2:.3f})")
+        print(" " * width + "".join(f"{t[:10]:>12}" for t in TYPES))
+        for a in TYPES:
+            print(f"{a:<{width}}" + "".join(f"{rows[a][b][0]:>12.3f}" for b in TYPES))
+        print()
+    for pid, (done, busy) in sorted(r["workers"].items()):
+        print(f"Worker {pid}: {done} battles in {busy:.2f} s busy ({done / busy:,.0f} battles/s)")
+    print(f"{r['battles']} battles in {r['elapsed']:.2f} s ({r['battles'] / r['elapsed']:,.0f} battles/s) "
+          f"on {len(r['workers'])} workers")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "seed": args.seed,
+                "levels": args.levels,
+                "per_type": args.per_type,
+                "battles": args.battles,
+                "matrix": {str(level): {a: {b: dict(zip(("rate", "low", "high"), cell)) for b, cell in row.items()}
+                                        for a, row in rows.items()}
+                           for level, rows in r["matrix"].items()},
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+# batch_sim.py
+#
+# Headless battle simulator for balance work. Runs many battle_system.Battle
+# fights at once: both sides' HP and energy live in NumPy arrays, the
+# ability tables are padded 2-D arrays, and each turn is a handful of array
+# operations over every battle still running. The rules are those of
+# Battle.apply_attack with Battle's default alternating turns (player
+# first, speed_order off), as play_scalar drives it for --verify. Both
+# sides pick one of their abilities uniformly at random, as
+# Battle.enemy_turn does without an enemy_ai; wild battles' speed order
+# and SearchAI (ai.py) are not modelled. A rejected move (not enough
+# energy, tier too high) still ends the turn. Effects follow effects.py:
+# one per slot, counted down when their owner spends a turn, and a stunned
+# side loses its turn. Energy does not regenerate in battle, so a battle
+# where neither side can afford any move is a draw.
+#
+#   python batch_sim.py --battles 40000 --seed 1
+#   python batch_sim.py --verify 2000
+import argparse
+import time
+import numpy as np
+from abilities import BASE_ABILITY_POOLS
+from battle_system import Battle
+from effects import ATTACK, DEFENSE, STUN
+from server_battle import Combatant
+
+MAX_TURNS = 200
+DRAW = -1  # BatchResult.winner for battles nobody won
+# CreatureTable.kind codes, one per Ability.apply_effect branch.
+NO_EFFECT, BUFF, DEBUFF, HEAL, STATUS = range(5)
+KINDS = {"buff": BUFF, "debuff": DEBUFF, "heal": HEAL, "status": STATUS}
+
+
+class CreatureTable:
+    """
+    Combat stats of a set of creatures, one row per creature. Ability
+    tables are padded to the largest ability count; ``count`` says how many
+    entries of each row are real.
+    :param payloads: Creature.to_dict() payloads; kept as ``payloads``.
+    """
+
+    def __init__(self, payloads):
+        self.payloads = list(payloads)
+        creatures = [Combatant.from_dict(p) for p in self.payloads]
+        width = max((len(c.abilities) for c in creatures), default=0) or 1
+        n = len(creatures)
+        self.creature_type = [c.creature_type for c in creatures]
+        self.max_hp = np.array([c.max_hp for c in creatures], dtype=np.float64)
+        self.hp = np.array([c.current_hp for c in creatures], dtype=np.float64)
+        self.attack = np.array([c.attack for c in creatures], dtype=np.int64)
+        self.defense = np.array([c.defense for c in creatures], dtype=np.int64)
+        self.energy = np.array([c.energy for c in creatures], dtype=np.float64)
+        self.allowed_tier = np.array([c.allowed_tier for c in creatures], dtype=np.int64)
+        self.count = np.array([len(c.abilities) for c in creatures], dtype=np.int64)
+        self.damage = np.zeros((n, width), dtype=np.int64)
+        self.cost = np.zeros((n, width), dtype=np.float64)
+        self.tier = np.zeros((n, width), dtype=np.int64)
+        self.kind = np.zeros((n, width), dtype=np.int64)
+        self.value = np.zeros((n, width), dtype=np.float64)  # Effect multiplier, or HP for HEAL
+        self.duration = np.zeros((n, width), dtype=np.int64)
+        for row, c in enumerate(creatures):
+            for k, a in enumerate(c.abilities):
+                self.damage[row, k] = a.damage
+                self.cost[row, k] = a.energy_cost
+                self.tier[row, k] = a.tier
+                kind = KINDS.get(a.ability_type, NO_EFFECT)
+                if kind in (BUFF, DEBUFF, STATUS) and a.duration <= 0:
+                    kind = NO_EFFECT
+                self.kind[row, k] = kind
+                self.duration[row, k] = a.duration
+                self.value[row, k] = {BUFF: 1 + a.effect_value, DEBUFF: max(0, 1 - a.effect_value),
+                                      HEAL: a.effect_value}.get(kind, 1.0)
+        # Cheapest move each creature may ever use; below it a side is out of moves.
+        usable = (np.arange(width) < self.count[:, None]) & (self.tier <= self.allowed_tier[:, None])
+        self.min_cost = np.where(usable, self.cost, np.inf).min(axis=1)
+
+    def __len__(self):
+        return len(self.creature_type)
+
+
+class BatchResult:
+    """
+    :param winner: per battle 0 (player), 1 (enemy) or DRAW.
+    :param turns: moves made (rejected ones included) until the battle ended.
+    :param hp, energy: final values, shape (2, battles).
+    Effects are cleared when a battle is won, as in Battle.
+    """
+
+    def __init__(self, winner, turns, hp, energy):
+        self.winner = winner
+        self.turns = turns
+        self.hp = hp
+        self.energy = energy
+
+    def __len__(self):
+        return len(self.winner)
+
+    def win_rates(self):
+        n = len(self) or 1
+        return {"player": np.count_nonzero(self.winner == 0) / n,
+                "enemy": np.count_nonzero(self.winner == 1) / n,
+                "draw": np.count_nonzero(self.winner == DRAW) / n}
+
+    def turn_histogram(self):
+        """Battles decided after each number of turns (index = turns)."""
+        return np.bincount(self.turns[self.winner != DRAW])
+
+
+def simulate(table, players, enemies, max_turns=MAX_TURNS, rng=None, choices=None):
+    """
+    Fight table row players[i] (as Battle.player) against enemies[i] (as
+    Battle.enemy) for every i. Neither row is modified.
+    :param rng: numpy Generator for the move choices.
+    :param choices: optional (max_turns, battles) array of floats in [0, 1);
+        turn t of battle i uses ability int(choices[t, i] * ability count).
+        Replaces rng, so a run can be replayed on the scalar Battle.
+    """
+    rows = np.stack([np.asarray(players, dtype=np.int64), np.asarray(enemies, dtype=np.int64)])
+    n = rows.shape[1]
+    if rng is None:
+        rng = np.random.default_rng()
+    hp = table.hp[rows]
+    energy = table.energy[rows]
+    # Effect slots per side: multiplier (1.0 when empty) and turns left.
+    mult = np.ones((2, 3, n))
+    left = np.zeros((2, 3, n), dtype=np.int64)
+    winner = np.full(n, DRAW, dtype=np.int64)
+    turns = np.full(n, max_turns, dtype=np.int64)
+    live = np.arange(n)
+    for t in range(max_turns):
+        # Out of affordable moves on both sides: nothing can change any more.
+        stuck = ((energy[0, live] < table.min_cost[rows[0, live]])
+                 & (energy[1, live] < table.min_cost[rows[1, live]]))
+        if stuck.any():
+            turns[live[stuck]] = t
+            live = live[~stuck]
+        if not len(live):
+            break
+        side = t % 2
+        att_rows = rows[side, live]
+        def_rows = rows[1 - side, live]
+        counts = table.count[att_rows]
+        u = choices[t, live] if choices is not None else rng.random(len(live))
+        k = np.minimum((u * counts).astype(np.int64), np.maximum(counts - 1, 0))
+        cost = table.cost[att_rows, k]
+        stunned = left[side, STUN, live] > 0
+        ok = (~stunned & (counts > 0) & (table.tier[att_rows, k] <= table.allowed_tier[att_rows])
+              & (energy[side, live] >= cost))
+        energy[side, live] -= np.where(ok, cost, 0.0)
+        # Battle.calculate_damage on effective stats; int() truncates toward zero.
+        attack = np.trunc(table.attack[att_rows] * mult[side, ATTACK, live])
+        defense = np.trunc(table.defense[def_rows] * mult[1 - side, DEFENSE, live])
+        damage = np.maximum(1, table.damage[att_rows, k] + attack.astype(np.int64)
+                            - np.trunc(defense * 0.5).astype(np.int64))
+        hp[1 - side, live] -= np.where(ok, damage, 0)
+
+        # A spent turn (a move or a stun) counts down the attacker's effects.
+        spent = ok | stunned
+        own_left, own_mult = left[side][:, live], mult[side][:, live]
+        ticking = spent & (own_left > 0)
+        own_left -= ticking
+        own_mult[ticking & (own_left == 0)] = 1.0
+        left[side][:, live], mult[side][:, live] = own_left, own_mult
+
+        # Then the move's own effect (Ability.apply_effect).
+        kind = np.where(ok, table.kind[att_rows, k], NO_EFFECT)
+        value = table.value[att_rows, k]
+        duration = table.duration[att_rows, k]
+        for effect, target, slot in ((BUFF, side, ATTACK), (DEBUFF, 1 - side, DEFENSE), (STATUS, 1 - side, STUN)):
+            hit = kind == effect
+            if hit.any():
+                mult[target, slot, live[hit]] = value[hit] if effect != STATUS else 1.0
+                left[target, slot, live[hit]] = duration[hit]
+        healed = kind == HEAL
+        if healed.any():
+            hp[side, live[healed]] = np.minimum(table.max_hp[att_rows[healed]],
+                                                hp[side, live[healed]] + value[healed])
+        dead = ok & (hp[1 - side, live] <= 0)
+        if dead.any():
+            done = live[dead]
+            hp[1 - side, done] = 0
+            winner[done] = side
+            turns[done] = t + 1
+            mult[:, :, done] = 1.0
+            left[:, :, done] = 0
+            live = live[~dead]
+    return BatchResult(winner, turns, hp, energy)
+
+
+def play_scalar(player, enemy, choices, max_turns=MAX_TURNS):
+    """
+    The same fight on battle_system.Battle, for checking simulate().
+    :param player, enemy: Combatant objects; modified in place.
+    :param choices: floats in [0, 1), one per turn.
+    :return: (winner, turns) with winner as in BatchResult.
+    """
+    battle = Battle(player, enemy)
+    sides = (player, enemy)
+    for t in range(max_turns):
+        attacker, defender = sides[t % 2], sides[1 - t % 2]
+        if attacker.abilities:
+            battle.apply_attack(attacker, defender, int(choices[t] * len(attacker.abilities)))
+        if battle.battle_over:
+            return (0 if battle.winner == "player" else 1), t + 1
+    return DRAW, max_turns
+
+
+def verify(table, battles=1000, max_turns=MAX_TURNS, seed=None):
+    """
+    Replay random battles on the scalar Battle and count the ones whose
+    winner, turn count (for decided battles), final HP or energy differ.
+    """
+    rng = np.random.default_rng(seed)
+    players = rng.integers(0, len(table), battles)
+    enemies = rng.integers(0, len(table), battles)
+    choices = rng.random((max_turns, battles))
+    batch = simulate(table, players, enemies, max_turns, choices=choices)
+    mismatches = 0
+    for i in range(battles):
+        player = Combatant.from_dict(table.payloads[players[i]])
+        enemy = Combatant.from_dict(table.payloads[enemies[i]])
+        winner, turns = play_scalar(player, enemy, choices[:, i], max_turns)
+        if (winner != batch.winner[i] or (winner != DRAW and turns != batch.turns[i])
+                or [player.current_hp, enemy.current_hp] != list(batch.hp[:, i])
+                or [player.energy, enemy.energy] != list(batch.energy[:, i])):
+            mismatches += 1
+    return mismatches
+
+
+def creature_pool(per_type=512):
+    """
+    Freshly hatched creatures of every type, rolled by Creature itself so
+    stat and ability odds match the game's. Battles sample rows from it.
+    :return: (CreatureTable, {type: row indices}).
+    """
+    from creatures import Creature
+    payloads, rows = [], {}
+    for creature_type in BASE_ABILITY_POOLS:
+        rows[creature_type] = np.arange(len(payloads), len(payloads) + per_type)
+        payloads.extend(Creature(creature_type).to_dict() for _ in range(per_type))
+    return CreatureTable(payloads), rows
+
+
+def type_matchups(table, rows, battles=40000, max_turns=MAX_TURNS, seed=None):
+    """
+    Every creature type against every other (and itself), ``battles`` fights
+    per pairing, all in one simulate() call.
+    :return: {(player type, enemy type): BatchResult}.
+    """
+    rng = np.random.default_rng(seed)
+    pairs = [(a, b) for a in rows for b in rows]
+    players = np.concatenate([rng.choice(rows[a], battles) for a, _ in pairs])
+    enemies = np.concatenate([rng.choice(rows[b], battles) for _, b in pairs])
+    batch = simulate(table, players, enemies, max_turns, rng)
+    results = {}
+    for i, pair in enumerate(pairs):
+        part = slice(i * battles, (i + 1) * battles)
+        results[pair] = BatchResult(batch.winner[part], batch.turns[part], batch.hp[:, part], batch.energy[:, part])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized battle simulator for balance analysis")
+    parser.add_argument("--battles", type=int, default=40000, help="battles per type pairing")
+    parser.add_argument("--pool", type=int, default=512, help="creatures rolled per type")
+    parser.add_argument("--max-turns", type=int, default=MAX_TURNS)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--verify", type=int, default=0, metavar="N",
+                        help="also replay N battles on battle_system.Battle and compare")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        import random
+        random.seed(args.seed)
+    table, rows = creature_pool(args.pool)
+    start = time.perf_counter()
+    results = type_matchups(table, rows, args.battles, args.max_turns, args.seed)
+    elapsed = time.perf_counter() - start
+    total = sum(len(r) for r in results.values())
+
+    types = list(rows)
+    width = max(len(t) for t in types)
+    print("Player win rate (rows: player type, columns: enemy type)")
+    print(" " * width + "".join(f"{t[:10]:>12}" for t in types))
+    for a in types:
+        print(f"{a:<{width}}" + "".join(f"{results[a, b].win_rates()['player']:>12.3f}" for b in types))
+    print()
+    for a in types:
+        merged = np.concatenate([results[a, b].turns[results[a, b].winner != DRAW] for b in types])
+        draws = np.mean([results[a, b].win_rates()["draw"] for b in types])
+        print(f"{a:<{width}} as player: turns p50 {np.percentile(merged, 50):.0f}, "
+              f"p90 {np.percentile(merged, 90):.0f}, max {merged.max()}; draws {draws:.3%}")
+    print(f"\n{total} battles in {elapsed:.2f} s ({total / elapsed:,.0f} battles/s)")
+    if args.verify:
+        mismatches = verify(table, args.verify, args.max_turns, args.seed)
+        print(f"Scalar check: {mismatches} of {args.verify} battles differ from battle_system.Battle")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# battle_events.py
+#
+# What happens in a battle, as typed records instead of text. Battle (and
+# Ability.apply_effect) append events to the battle's EventLog, a
+# fixed-size buffer that drops its oldest events, so a long session holds
+# a bounded number of them. Events keep references to the creatures and
+# abilities involved; format_event() turns one into a line of text only
+# when a screen or tool actually shows it.
+from collections import deque
+from config import BATTLE_EVENT_BUFFER
+from effects import ATTACK as ATTACK_SLOT, DEFENSE as DEFENSE_SLOT
+
+START, ATTACK, DAMAGE, EFFECT, HEAL, FAINT, STUNNED, REJECTED, PASS = range(9)
+KIND_NAMES = ("start", "attack", "damage", "effect", "heal", "faint", "stunned", "rejected", "pass")
+# Kinds that open an action; Battle.message describes the latest of these.
+HEADLINES = frozenset((START, ATTACK, STUNNED, REJECTED, PASS))
+
+
+class BattleEvent:
+    __slots__ = ("seq", "kind", "actor", "target", "detail", "amount")
+
+    def __init__(self, seq, kind, actor=None, target=None, detail=None, amount=0):
+        """
+        :param actor: creature acting (ATTACK, HEAL, STUNNED, REJECTED, PASS)
+                      or applying an EFFECT.
+        :param target: creature hit (ATTACK, DAMAGE), affected (EFFECT) or
+                       knocked out (FAINT).
+        :param detail: the Ability for ATTACK, the Effect for EFFECT, the
+                       reason for REJECTED, HP left for DAMAGE.
+        :param amount: damage for ATTACK and DAMAGE, HP restored for HEAL,
+                       turns for EFFECT.
+        """
+        self.seq = seq
+        self.kind = kind
+        self.actor = actor
+        self.target = target
+        self.detail = detail
+        self.amount = amount
+
+    def __repr__(self):
+        return f"BattleEvent({self.seq}, {KIND_NAMES[self.kind]})"
+
+
+class EventLog:
+    """The most recent ``capacity`` events of a battle, oldest first."""
+    __slots__ = ("events", "next_seq")
+
+    def __init__(self, capacity=BATTLE_EVENT_BUFFER):
+        self.events = deque(maxlen=capacity)
+        self.next_seq = 1
+
+    def __iter__(self):
+        return (BattleEvent(*record) for record in self.events)
+
+    def __len__(self):
+        return len(self.events)
+
+    def emit(self, kind, actor=None, target=None, detail=None, amount=0):
+        # The hot path stores a bare tuple; BattleEvents are built on reading.
+        self.events.append((self.next_seq, kind, actor, target, detail, amount))
+        self.next_seq += 1
+
+    def since(self, seq):
+        """Events after sequence number seq that are still held."""
+        first = self.next_seq - len(self.events)
+        events = self.events
+        return [BattleEvent(*events[i]) for i in range(max(0, seq + 1 - first), len(events))]
+
+    def last(self, kinds=HEADLINES):
+        for record in reversed(self.events):
+            if record[1] in kinds:
+                return BattleEvent(*record)
+        return None
+
+
+def format_event(event):
+    kind = event.kind
+    if kind == ATTACK:
+        return f"{event.actor.creature_type} used {event.detail.name} for {event.amount} damage!"
+    if kind == DAMAGE:
+        return f"{event.target.creature_type} takes {event.amount} damage ({event.detail:g} HP left)."
+    if kind == EFFECT:
+        effect = event.detail
+        if effect.slot in (ATTACK_SLOT, DEFENSE_SLOT):
+            stat = "attack" if effect.slot == ATTACK_SLOT else "defense"
+            return f"{event.target.creature_type}'s {stat} is x{effect.multiplier:g} for {event.amount} turns."
+        return f"{event.target.creature_type} is stunned for {event.amount} turns!"
+    if kind == HEAL:
+        return f"{event.actor.creature_type} recovers {event.amount:g} HP."
+    if kind == FAINT:
+        return f"{event.target.creature_type} fainted!"
+    if kind == STUNNED:
+        return f"{event.actor.creature_type} is stunned and loses its turn!"
+    if kind == REJECTED:
+        return event.detail
+    if kind == PASS:
+        if not event.actor.abilities:
+            return f"{event.actor.creature_type} has no abilities!"
+        return f"{event.actor.creature_type} has nothing it can use!"
+    return "Battle start!"
@@ -0,0 +1,325 @@
+# battle_state.py
+#
+# A compact copy of a battle for search and simulation. Everything that
+# never changes during a battle (stats, abilities) sits in one Profile per
+# creature, shared by every copy; everything that does change is one flat
+# list:
+#
+#   [turn, winner, <player side>, <enemy side>, speed order, player due, enemy due]
+#   side: hp, energy, attack multiplier, attack turns left,
+#         defense multiplier, defense turns left, stun turns left
+#
+# turn and winner are 0 (player) or 1 (enemy); winner is NO_WINNER while
+# the battle runs. speed order is 1 for a Battle with speed_order, whose
+# turns go by the sides' due times on its InitiativeScheduler (the side to
+# move already rescheduled, as after InitiativeScheduler.next()); it is 0,
+# and the due times unused, when sides alternate. clone() is one list copy and key() a tuple of it, so
+# states can be copied per search node and used as dict keys. apply()
+# follows Battle.apply_attack move for move; from_battle(), apply_to() and
+# to_battle() convert to and from battle_system.Battle.
+#   python battle_state.py
+import time
+from battle_system import Battle, InitiativeScheduler
+from effects import ATTACK, DEFENSE, STUN, Effect
+
+SIDE_FIELDS = 7
+HP, ENERGY, ATK_MULT, ATK_TURNS, DEF_MULT, DEF_TURNS, STUN_TURNS = range(SIDE_FIELDS)
+TURN, WINNER = 0, 1
+SIDES = (2, 2 + SIDE_FIELDS)  # Offset of each side's fields
+SPEED_ORDER = 2 + 2 * SIDE_FIELDS
+DUE = (SPEED_ORDER + 1, SPEED_ORDER + 2)  # Offset of each side's due time
+NO_WINNER = -1
+TURN_NAMES = ("player", "enemy")
+
+
+class Profile:
+    """
+    The fixed combat stats of one creature. ``moves`` has one entry per
+    ability: (damage, energy cost, ability type, effect multiplier or heal
+    amount, duration, usable at the creature's tier).
+    """
+    __slots__ = ("creature_type", "max_hp", "attack", "defense", "speed", "allowed_tier",
+                 "abilities", "moves", "key")
+
+    def __init__(self, creature):
+        self.creature_type = creature.creature_type
+        self.max_hp = creature.max_hp
+        self.attack = creature.attack
+        self.defense = creature.defense
+        self.speed = creature.speed
+        self.allowed_tier = getattr(creature, "allowed_tier", 1)
+        self.abilities = tuple(creature.abilities)
+        moves = []
+        for a in self.abilities:
+            if a.ability_type == "buff":
+                value = 1 + a.effect_value
+            elif a.ability_type == "debuff":
+                value = max(0, 1 - a.effect_value)
+            else:
+                value = a.effect_value
+            moves.append((a.damage, a.energy_cost, a.ability_type, value, a.duration, a.tier <= self.allowed_tier))
+        self.moves = tuple(moves)
+        self.key = (self.creature_type, self.max_hp, self.attack, self.defense, self.moves)
+
+    def __eq__(self, other):
+        return isinstance(other, Profile) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+def side_values(creature):
+    slots = creature.effects.slots
+    attack, defense, stun = slots[ATTACK], slots[DEFENSE], slots[STUN]
+    return [creature.current_hp, creature.energy,
+            attack.multiplier if attack else 1.0, attack.turns if attack else 0,
+            defense.multiplier if defense else 1.0, defense.turns if defense else 0,
+            stun.turns if stun else 0]
+
+
+class BattleState:
+    __slots__ = ("profiles", "values")
+
+    def __init__(self, profiles, values):
+        """
+        :param profiles: (player Profile, enemy Profile).
+        :param values: the flat list described at the top of this file.
+        """
+        self.profiles = profiles
+        self.values = values
+
+    @classmethod
+    def from_creatures(cls, player, enemy, turn=0, profiles=None, dues=None):
+        """
+        :param profiles: Profiles of player and enemy if already built
+                         (e.g. by an earlier from_battle of the same battle).
+        :param dues: (player, enemy) due times for turns by speed; None
+                     for alternating turns.
+        """
+        values = [turn, NO_WINNER] + side_values(player) + side_values(enemy)
+        values += [0, 0.0, 0.0] if dues is None else [1, dues[0], dues[1]]
+        if player.current_hp <= 0:
+            values[WINNER] = 1
+        elif enemy.current_hp <= 0:
+            values[WINNER] = 0
+        return cls(profiles or (Profile(player), Profile(enemy)), values)
+
+    @classmethod
+    def from_battle(cls, battle, turn=None, profiles=None):
+        """:param turn: side to move; battle.turn if None."""
+        if turn is None:
+            turn = TURN_NAMES.index(battle.turn)
+        dues = None
+        if battle.scheduler is not None:
+            entries = battle.scheduler.entries
+            dues = (entries[battle.player][0], entries[battle.enemy][0])
+        return cls.from_creatures(battle.player, battle.enemy, turn, profiles, dues)
+
+    def apply_to(self, battle):
+        """Write this state into battle, whose creatures must match the profiles."""
+        values = self.values
+        for creature, base in zip((battle.player, battle.enemy), SIDES):
+            creature.current_hp = values[base + HP]
+            creature.energy = values[base + ENERGY]
+            creature.effects.clear()
+            if values[base + ATK_TURNS]:
+                creature.effects.add(Effect(ATTACK, values[base + ATK_MULT], values[base + ATK_TURNS]))
+            if values[base + DEF_TURNS]:
+                creature.effects.add(Effect(DEFENSE, values[base + DEF_MULT], values[base + DEF_TURNS]))
+            if values[base + STUN_TURNS]:
+                creature.effects.add(Effect(STUN, 1.0, values[base + STUN_TURNS]))
+        battle.turn = TURN_NAMES[values[TURN]]
+        if values[SPEED_ORDER] and battle.scheduler is not None:
+            mover = values[TURN]
+            sides = (battle.player, battle.enemy)
+            # The side to move was rescheduled last, so it loses ties.
+            battle.scheduler.load(((sides[1 - mover], values[DUE[1 - mover]]), (sides[mover], values[DUE[mover]])))
+        battle.battle_over = values[WINNER] != NO_WINNER
+        battle.winner = TURN_NAMES[values[WINNER]] if battle.battle_over else None
+
+    def to_battle(self, seed=None):
+        """A new Battle between Combatants in this state (its start_state has no effects)."""
+        from server_battle import Combatant
+        creatures = []
+        for profile, base in zip(self.profiles, SIDES):
+            creatures.append(Combatant(profile.creature_type, profile.max_hp, self.values[base + HP],
+                                       profile.attack, profile.defense, profile.speed,
+                                       self.values[base + ENERGY], list(profile.abilities), profile.allowed_tier))
+        battle = Battle(creatures[0], creatures[1], seed, speed_order=bool(self.values[SPEED_ORDER]))
+        self.apply_to(battle)
+        return battle
+
+    def clone(self):
+        return BattleState(self.profiles, self.values[:])
+
+    def key(self):
+        """Hashable snapshot of the changing fields; profiles are left out."""
+        return tuple(self.values)
+
+    def __eq__(self, other):
+        return isinstance(other, BattleState) and self.values == other.values and self.profiles == other.profiles
+
+    def __hash__(self):
+        return hash(tuple(self.values))
+
+    @property
+    def turn(self):
+        return self.values[TURN]
+
+    @property
+    def winner(self):
+        return None if self.values[WINNER] == NO_WINNER else self.values[WINNER]
+
+    def side(self, side):
+        """The seven fields of side 0 (player) or 1 (enemy), as a tuple."""
+        return tuple(self.values[SIDES[side]:SIDES[side] + SIDE_FIELDS])
+
+    def set_side(self, side, fields):
+        self.values[SIDES[side]:SIDES[side] + SIDE_FIELDS] = fields
+
+    def hp_share(self, side):
+        max_hp = self.profiles[side].max_hp
+        return self.values[SIDES[side] + HP] / max_hp if max_hp else 0.0
+
+    def stunned(self, side):
+        return self.values[SIDES[side] + STUN_TURNS] > 0
+
+    def legal_moves(self, side=None):
+        """Ability indices ``side`` (default: the side to move) could play, as ServerBattle.legal_moves."""
+        if side is None:
+            side = self.values[TURN]
+        moves = self.profiles[side].moves
+        if self.stunned(side):
+            return list(range(len(moves)))  # Any choice just loses the turn.
+        energy = self.values[SIDES[side] + ENERGY]
+        return [i for i, m in enumerate(moves) if m[5] and m[1] <= energy]
+
+    def tick(self, base):
+        v = self.values
+        for left, mult in ((base + ATK_TURNS, base + ATK_MULT), (base + DEF_TURNS, base + DEF_MULT)):
+            if v[left] > 0:
+                v[left] -= 1
+                if v[left] == 0:
+                    v[mult] = 1.0
+        if v[base + STUN_TURNS] > 0:
+            v[base + STUN_TURNS] -= 1
+
+    def end_turn(self, side):
+        """side has acted: the turn goes to the other side, or by due time (InitiativeScheduler.next)."""
+        v = self.values
+        if not v[SPEED_ORDER]:
+            v[TURN] = 1 - side
+            return
+        other = 1 - side
+        mover = other if v[DUE[other]] <= v[DUE[side]] else side
+        v[DUE[mover]] += InitiativeScheduler.interval(self.profiles[mover])
+        v[TURN] = mover
+
+    def apply(self, index):
+        """
+        The side to move plays ability ``index`` (one of legal_moves()) and
+        the turn passes (end_turn). Mirrors Battle.apply_attack, except that effects are
+        kept when the battle is won (Battle clears them).
+        :return: damage dealt, 0 if the mover was stunned.
+        """
+        v = self.values
+        side = v[TURN]
+        me, them = SIDES[side], SIDES[1 - side]
+        if v[me + STUN_TURNS] > 0:
+            self.tick(me)
+            self.end_turn(side)
+            return 0
+        damage, cost, kind, value, duration, _ = self.profiles[side].moves[index]
+        v[me + ENERGY] -= cost
+        effective_defense = int(self.profiles[1 - side].defense * v[them + DEF_MULT])
+        damage = max(1, damage + int(self.profiles[side].attack * v[me + ATK_MULT]) - int(effective_defense * 0.5))
+        v[them + HP] -= damage
+        self.tick(me)
+        if kind == "buff" and duration > 0:
+            v[me + ATK_MULT], v[me + ATK_TURNS] = value, duration
+        elif kind == "debuff" and duration > 0:
+            v[them + DEF_MULT], v[them + DEF_TURNS] = value, duration
+        elif kind == "heal":
+            v[me + HP] = min(self.profiles[side].max_hp, v[me + HP] + value)
+        elif kind == "status" and duration > 0:
+            v[them + STUN_TURNS] = duration
+        if v[them + HP] <= 0:
+            v[them + HP] = 0
+            v[WINNER] = side
+        self.end_turn(side)
+        return damage
+
+    def pass_turn(self):
+        """The side to move has nothing it can play; the turn passes unchanged."""
+        self.end_turn(self.values[TURN])
+
+
+def check(battles=300, seed=1, speed_order=False):
+    """
+    Play random battles on battle_system.Battle and on a BattleState side
+    by side, round-tripping through to_battle()/from_battle() every few
+    turns. :return: number of turns whose states differ.
+    """
+    import random
+    from creatures import Creature
+    from server_battle import Combatant
+    rng = random.Random(seed)
+    mismatches = 0
+    for _ in range(battles):
+        battle = Battle(Combatant.from_dict(Creature(rng=rng).to_dict()),
+                        Combatant.from_dict(Creature(rng=rng).to_dict()), rng.getrandbits(32),
+                        speed_order=speed_order)
+        state = BattleState.from_battle(battle)
+        for turn in range(60):
+            if turn % 7 == 6:
+                battle = state.to_battle()
+            legal = state.legal_moves()
+            if not legal:
+                state.pass_turn()
+                battle.next_turn()
+                mismatches += battle.turn != TURN_NAMES[state.turn]
+                battle.turn = TURN_NAMES[state.turn]
+                continue
+            index = rng.choice(legal)
+            sides = (battle.player, battle.enemy) if state.turn == 0 else (battle.enemy, battle.player)
+            state.apply(index)
+            battle.apply_attack(sides[0], sides[1], index)
+            battle.next_turn()
+            after = BattleState.from_battle(battle, profiles=state.profiles)
+            if battle.battle_over:
+                # Battle drops effects on a win; compare everything else.
+                mismatches += (after.winner != state.winner
+                               or after.side(0)[:2] != state.side(0)[:2] or after.side(1)[:2] != state.side(1)[:2])
+                break
+            mismatches += after != state
+    return mismatches
+
+
+def benchmark(count=100000):
+    """Microseconds to clone, key and hash one state."""
+    from creatures import Creature
+    from server_battle import Combatant
+    battle = Battle(Combatant.from_dict(Creature().to_dict()), Combatant.from_dict(Creature().to_dict()))
+    state = BattleState.from_battle(battle)
+    start = time.perf_counter()
+    for _ in range(count):
+        state.clone()
+    clone = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(count):
+        hash(state.key())
+    key = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(count // 100):
+        BattleState.from_battle(battle)
+    from_battle = time.perf_counter() - start
+    return {"clone_us": clone / count * 1e6, "key_us": key / count * 1e6,
+            "from_battle_us": from_battle / (count // 100) * 1e6}
+
+
+if __name__ == "__main__":
+    print(f"Round trip: {check()} turns differ from battle_system.Battle, "
+          f"{check(speed_order=True)} with turns by speed")
+    r = benchmark()
+    print(f"clone {r['clone_us']:.2f} us, key+hash {r['key_us']:.2f} us, "
+          f"from_battle {r['from_battle_us']:.1f} us")
@@ -1,63 +1,331 @@
 # battle_system.py
 
+import heapq
+import itertools
 import random
+import time
+from abilities import ability_to_dict
+from battle_events import ATTACK, DAMAGE, FAINT, HEADLINES, PASS, REJECTED, START, STUNNED, EventLog, format_event
+from config import BATTLE_EVENT_BUFFER, INITIATIVE_SCALE
+from effects import effective_attack, effective_defense
+
+def combat_state(creature):
+    """
+    The fields a battle reads from a Creature (or Combatant), as a plain dict.
+    Abilities are full records rather than catalog ids, so a replay plays
+    the same after a balance patch changes the ability pools.
+    """
+    return {
+        "creature_type": creature.creature_type,
+        "max_hp": creature.max_hp,
+        "current_hp": creature.current_hp,
+        "attack": creature.attack,
+        "defense": creature.defense,
+        "speed": creature.speed,
+        "energy": creature.energy,
+        "allowed_tier": getattr(creature, 'allowed_tier', 1),
+        "abilities": [ability_to_dict(a) for a in creature.abilities]
+    }
+
+class InitiativeScheduler:
+    """
+    Turn order by speed. Every actor acts once per INITIATIVE_SCALE / speed
+    time units, so a creature twice as fast acts twice as often; the next
+    actor is the one with the earliest due time (ties go to whoever was
+    added first). A heap of due times makes next() O(log n) whatever the
+    number of actors. Removed actors are dropped lazily when they reach
+    the top of the heap.
+    """
+
+    def __init__(self, actors=()):
+        self.heap = []      # [due time, tie-break, actor, active]
+        self.entries = {}   # actor -> its active heap entry
+        self.counter = itertools.count()
+        self.now = 0.0
+        for actor in actors:
+            self.add(actor)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, actor):
+        return actor in self.entries
+
+    @staticmethod
+    def interval(actor):
+        return INITIATIVE_SCALE / max(1, actor.speed)
+
+    def add(self, actor):
+        """Schedule actor's first action one interval from now."""
+        self.remove(actor)
+        entry = [self.now + self.interval(actor), next(self.counter), actor, True]
+        self.entries[actor] = entry
+        heapq.heappush(self.heap, entry)
+
+    def load(self, dues):
+        """Replace the schedule with (actor, due time) pairs; ties go to the earlier pair."""
+        self.heap = []
+        self.entries = {}
+        for actor, due in dues:
+            entry = [due, next(self.counter), actor, True]
+            self.entries[actor] = entry
+            heapq.heappush(self.heap, entry)
+
+    def remove(self, actor):
+        entry = self.entries.pop(actor, None)
+        if entry is not None:
+            entry[3] = False
+
+    def next(self):
+        """
+        The actor whose action is due first, rescheduled for its following
+        action at its current speed. Returns None once nobody is left.
+        """
+        heap = self.heap
+        while heap:
+            due, _, actor, active = heapq.heappop(heap)
+            if not active:
+                continue
+            self.now = due
+            entry = [due + self.interval(actor), next(self.counter), actor, True]
+            self.entries[actor] = entry
+            heapq.heappush(heap, entry)
+            return actor
+        return None
 
 class Battle:
-    def __init__(self, player_creature, enemy_creature):
+    def __init__(self, player_creature, enemy_creature, seed=None, event_capacity=BATTLE_EVENT_BUFFER,
+                 speed_order=False):
+        """
+        :param seed: seeds this battle's own random stream (self.rng); a
+                     random one is picked if None. With the starting
+                     creatures and self.moves it reproduces the battle
+                     (see replay.py).
+        :param event_capacity: most recent events kept in self.events.
+        :param speed_order: take turns by speed (InitiativeScheduler), so
+                            the faster creature may move first and act
+                            more often. Otherwise the sides alternate,
+                            player first, as the server protocol expects.
+        """
         self.player = player_creature
         self.enemy = enemy_creature
         self.turn = "player"  # 'player' or 'enemy'
         self.battle_over = False
         self.winner = None
-        self.message = "Battle start!"
+        self.events = EventLog(event_capacity)
+        self.events.emit(START)
+        self.seed = seed if seed is not None else random.getrandbits(64)
+        self.rng = random.Random(self.seed)
+        self.start_state = (combat_state(player_creature), combat_state(enemy_creature))
+        self.moves = []  # (0 = player / 1 = enemy, ability index) per applied move
+        self.enemy_ai = None  # Picks the enemy's moves if set (e.g. ai.SearchAI)
+        self.scheduler = InitiativeScheduler((player_creature, enemy_creature)) if speed_order else None
+        if self.scheduler is not None:
+            self.next_turn()
 
     def calculate_damage(self, attacker, defender, ability):
-        raw_damage = ability.damage + attacker.attack - int(defender.defense * 0.5)
+        # Effective stats come from multipliers cached in each creature's
+        # EffectSlots, so this stays O(1) however effects are stacked.
+        raw_damage = ability.damage + effective_attack(attacker) - int(effective_defense(defender) * 0.5)
         return max(1, raw_damage)
 
-    def apply_attack(self, attacker, defender, ability_index):
-        # Basic checks
-        if ability_index < 0 or ability_index >= len(attacker.abilities):
-            self.message = "Invalid ability selection!"
-            return
+    def validate_move(self, attacker, ability_index):
+        """
+        Check whether attacker may use the ability at ability_index.
+        Returns None if the move is legal, otherwise the reason it is not.
+        """
+        # JSON true/false arrive as bools, which are ints to isinstance.
+        if (not isinstance(ability_index, int) or isinstance(ability_index, bool)
+                or ability_index < 0 or ability_index >= len(attacker.abilities)):
+            return "Invalid ability selection!"
+        if attacker.effects.stunned:
+            return None  # Any choice just loses the turn (apply_attack).
         ability = attacker.abilities[ability_index]
-
-        if ability.tier > getattr(attacker, 'allowed_tier', 1):
-            self.message = f"Cannot use {ability.name}: tier {ability.tier} > allowed tier {attacker.allowed_tier}!"
-            return
+        allowed_tier = getattr(attacker, 'allowed_tier', 1)
+        if ability.tier > allowed_tier:
+            return f"Cannot use {ability.name}: tier {ability.tier} > allowed tier {allowed_tier}!"
         if attacker.energy < ability.energy_cost:
-            self.message = f"Not enough energy to use {ability.name} (cost {ability.energy_cost})!"
-            return
+            return f"Not enough energy to use {ability.name} (cost {ability.energy_cost})!"
+        return None
+
+    def apply_attack(self, attacker, defender, ability_index):
+        """
+        Returns the damage dealt (0 if the attacker was stunned and lost the
+        turn), or None if the move was rejected.
+        """
+        error = self.validate_move(attacker, ability_index)
+        if error:
+            self.events.emit(REJECTED, attacker, detail=error)
+            return None
+        self.record_move(attacker, defender, ability_index)
+        if attacker.effects.stunned:
+            attacker.effects.tick()
+            self.events.emit(STUNNED, attacker)
+            return 0
+        ability = attacker.abilities[ability_index]
 
         # Deduct energy and apply damage
         attacker.energy -= ability.energy_cost
         damage = self.calculate_damage(attacker, defender, ability)
         defender.current_hp -= damage
-        self.message = f"{attacker.creature_type} used {ability.name} for {damage} damage!"
+        emit = self.events.emit
+        emit(ATTACK, attacker, defender, ability, damage)
+        emit(DAMAGE, None, defender, max(0, defender.current_hp), damage)
 
-        # If ability has an effect, apply it
-        if ability.duration > 0 and ability.effect_value:
-            ability.apply_effect(attacker, defender, self)
+        # The attacker's turn is spent: its effects count down before this
+        # move's own effect lands (see effects.py).
+        attacker.effects.tick()
+        ability.apply_effect(attacker, defender, self)
 
         # Check if defender died
         if defender.current_hp <= 0:
             defender.current_hp = 0
-            self.battle_over = True
-            self.winner = "player" if attacker == self.player else "enemy"
+            emit(FAINT, attacker, defender)
+            self.defeated(attacker, defender)
+        return damage
+
+    @property
+    def message(self):
+        """The latest action as text, formatted only when asked for."""
+        event = self.events.last(HEADLINES)
+        return format_event(event) if event is not None else ""
+
+    def next_turn(self):
+        """Pass self.turn to whoever acts next: the other side, or the next one due by speed."""
+        if self.scheduler is not None:
+            self.turn = "player" if self.scheduler.next() is self.player else "enemy"
+        else:
+            self.turn = "enemy" if self.turn == "player" else "player"
+
+    def record_move(self, attacker, defender, ability_index):
+        self.moves.append((0 if attacker is self.player else 1, ability_index))
+
+    def defeated(self, attacker, defender):
+        """defender has just been knocked out by attacker."""
+        self.battle_over = True
+        self.winner = "player" if attacker == self.player else "enemy"
+        self.player.effects.clear()
+        self.enemy.effects.clear()
 
     def enemy_turn(self):
         """
-        Called after the player attacks if the battle isn't over.
-        Enemy picks a random ability index and attacks the player.
+        Called on the enemy's turn if the battle isn't over.
+        Enemy picks an ability index (enemy_ai's choice, or a random one)
+        and attacks the player, then the turn passes on (next_turn).
         """
         if self.battle_over:
             return
-        # Randomly pick an ability from enemy's list
         if len(self.enemy.abilities) == 0:
-            self.message = f"{self.enemy.creature_type} has no abilities!"
-            return
-        ability_index = random.randint(0, len(self.enemy.abilities) - 1)
-        self.apply_attack(self.enemy, self.player, ability_index)
-        # Switch turn back to player if the battle isn't over
+            self.events.emit(PASS, self.enemy)
+        else:
+            if self.enemy_ai is not None:
+                ability_index = self.enemy_ai.choose(self, self.enemy)
+            else:
+                # Randomly pick an ability from enemy's list
+                ability_index = self.rng.randint(0, len(self.enemy.abilities) - 1)
+            self.apply_attack(self.enemy, self.player, ability_index)
         if not self.battle_over:
-            self.turn = "player"
+            self.next_turn()
+
+class TeamBattle(Battle):
+    """
+    Several creatures per side, acting in speed order (InitiativeScheduler)
+    instead of alternating sides. A knocked-out creature leaves the turn
+    order; the side with nobody left standing loses, at once if it starts
+    with nobody. 1v1 battles use Battle (speed_order for turns by speed).
+    Call next_actor() to advance to the next creature due to act, then
+    apply_attack() for it (or pass_turn() if it has nothing to play).
+    self.player and self.enemy are the two team leads.
+    """
+
+    def __init__(self, player_team, enemy_team, seed=None):
+        super().__init__(player_team[0], enemy_team[0], seed)
+        self.teams = (list(player_team), list(enemy_team))
+        self.standing = tuple([c for c in team if c.current_hp > 0] for team in self.teams)
+        self.sides = {c: side for side, team in enumerate(self.teams) for c in team}
+        self.positions = {c: i for team in self.teams for i, c in enumerate(team)}
+        self.start_state = tuple([combat_state(c) for c in team] for team in self.teams)
+        self.scheduler = InitiativeScheduler(self.standing[0] + self.standing[1])
+        self.team_moves = []  # (side, index in team, target's index in its team, ability index)
+        self.current = None
+        for side in (0, 1):
+            if not self.standing[side]:
+                self.finish(side)
+                break
+
+    def next_actor(self):
+        """Advance to the next creature due to act; sets self.current and self.turn."""
+        self.current = self.scheduler.next()
+        if self.current is not None:
+            self.turn = "player" if self.sides[self.current] == 0 else "enemy"
+        return self.current
+
+    def opponents(self, creature):
+        """creature's opponents still standing."""
+        return self.standing[1 - self.sides[creature]]
+
+    def pass_turn(self):
+        self.events.emit(PASS, self.current)
+
+    def next_turn(self):
+        self.next_actor()
+
+    def record_move(self, attacker, defender, ability_index):
+        # self.moves stays empty: replays (replay.py) only hold 1v1 battles.
+        self.team_moves.append((self.sides[attacker], self.positions[attacker], self.positions[defender],
+                                ability_index))
+
+    def defeated(self, attacker, defender):
+        self.scheduler.remove(defender)
+        defender.effects.clear()
+        side = self.sides[defender]
+        self.standing[side].remove(defender)
+        if not self.standing[side]:
+            self.finish(side)
+
+    def finish(self, losing_side):
+        self.battle_over = True
+        self.winner = "enemy" if losing_side == 0 else "player"
+        for team in self.teams:
+            for c in team:
+                c.effects.clear()
+
+    def enemy_turn(self):
+        """The current creature, if on the enemy side, plays a random ability on a random target."""
+        if self.battle_over or self.current is None or self.sides[self.current] != 1:
+            return
+        self.auto_turn()
+
+    def auto_turn(self):
+        """The current creature plays a random usable ability on a random opponent."""
+        attacker = self.current
+        usable = [i for i in range(len(attacker.abilities)) if self.validate_move(attacker, i) is None]
+        if not usable:
+            self.pass_turn()
+            return
+        self.apply_attack(attacker, self.rng.choice(self.opponents(attacker)), self.rng.choice(usable))
+
+
+def measure_team_battles(sizes=(1, 10, 100, 1000), turns=5000, seed=1):
+    """Microseconds per turn of all-random TeamBattles with ``size`` creatures a side."""
+    from creatures import Creature
+    from server_battle import Combatant
+    rng = random.Random(seed)
+    results = []
+    for size in sizes:
+        teams = [[Combatant.from_dict(Creature(rng=rng).to_dict()) for _ in range(size)] for _ in range(2)]
+        for c in teams[0] + teams[1]:
+            c.max_hp = c.current_hp = 10 ** 9  # Nobody falls, so every turn schedules someone.
+            c.energy = 10 ** 9
+        battle = TeamBattle(teams[0], teams[1], seed)
+        start = time.perf_counter()
+        for _ in range(turns):
+            battle.next_actor()
+            battle.auto_turn()
+        results.append((size, (time.perf_counter() - start) / turns * 1e6))
+    return results
+
+
+if __name__ == "__main__":
+    for size, us in measure_team_battles():
+        print(f"{size:>5} vs {size:<5}: {us:6.2f} us/turn")
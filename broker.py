@@ -0,0 +1,190 @@
+# broker.py
+#
+# Matchmaking broker for the sharded server. Worker processes forward
+# JOIN_LOBBY requests here over a Unix socket; the broker runs the one
+# shared MatchmakingQueue so players on different workers can be paired,
+# then tells the workers involved. The pair's battle is hosted by the first
+# player's worker, and the other worker hands its client socket over (see
+# LobbyServer.hand_off in server.py), so battle traffic never crosses
+# processes.
+import asyncio
+import json
+import os
+import signal
+import socket
+import time
+from config import MATCH_TICK_INTERVAL
+from log import get_logger
+from matchmaking import MatchmakingQueue
+from protocol import FrameDecoder, FrameError, encode_frame
+
+BROKER_SOCKET = "/tmp/tamagotchi-broker.sock"
+READ_CHUNK = 65536
+
+log = get_logger("broker")
+
+
+def handoff_socket_path(broker_path, worker_id):
+    """Unix socket on which a worker receives connections handed to it."""
+    return f"{broker_path}.{worker_id}"
+
+
+def encode_op(op):
+    return encode_frame(json.dumps(op).encode())
+
+
+def bind_unix_socket(path):
+    if os.path.exists(path):
+        os.unlink(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    sock.listen()
+    return sock
+
+
+def remove_unix_socket(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class MatchBroker:
+    """
+    Broker protocol (length-prefixed JSON, see protocol.py):
+      worker -> broker  {"op": "HELLO", "worker": id}
+                        {"op": "JOIN", "worker": id, "player": conn_id, "level": n, "creature": {...}}
+                        {"op": "LEAVE", "worker": id, "player": conn_id}
+      broker -> worker  {"op": "MATCH", "first": seat, "second": seat}
+    where a seat is {"worker", "player", "level", "creature", "waited"}, waited
+    being seconds spent in the queue. The first seat waited longer, plays
+    player1 and its worker hosts the battle.
+    """
+
+    def __init__(self, path=BROKER_SOCKET):
+        self.path = path
+        self.matchmaking = MatchmakingQueue()
+        self.workers = {}  # worker id -> StreamWriter
+
+    async def handle_worker(self, reader, writer):
+        decoder = FrameDecoder()
+        worker_id = None
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK)
+                if not data:
+                    break
+                for payload in decoder.feed(data):
+                    op = json.loads(payload)
+                    if op["op"] == "HELLO":
+                        worker_id = op["worker"]
+                        self.workers[worker_id] = writer
+                        log.info("Worker %s connected", worker_id)
+                    elif op["op"] == "JOIN":
+                        key = (op["worker"], op["player"])
+                        pair = self.matchmaking.add(key, op["level"], op["creature"])
+                        if pair is not None:
+                            self.dispatch_match(*pair)
+                    elif op["op"] == "LEAVE":
+                        self.matchmaking.remove((op["worker"], op["player"]))
+        except (ConnectionError, FrameError, ValueError, KeyError) as e:
+            log.warning("Error with worker %s: %s", worker_id, e)
+        except asyncio.CancelledError:
+            # Broker shutting down; end quietly rather than re-raising into
+            # the stream callback.
+            pass
+        finally:
+            log.info("Worker %s disconnected", worker_id)
+            if worker_id is not None:
+                self.workers.pop(worker_id, None)
+                for key in [k for k in self.matchmaking.tickets if k[0] == worker_id]:
+                    self.matchmaking.remove(key)
+            writer.close()
+
+    def dispatch_match(self, first, second):
+        now = time.monotonic()
+
+        def seat(ticket):
+            worker, player = ticket.player
+            return {"worker": worker, "player": player, "level": ticket.level, "creature": ticket.data,
+                    "waited": now - ticket.enqueued_at}
+        frame = encode_op({"op": "MATCH", "first": seat(first), "second": seat(second)})
+        for worker in {first.player[0], second.player[0]}:
+            writer = self.workers.get(worker)
+            if writer is not None:
+                writer.write(frame)
+
+    async def matchmaking_loop(self):
+        while True:
+            await asyncio.sleep(MATCH_TICK_INTERVAL)
+            for first, second in self.matchmaking.tick():
+                self.dispatch_match(first, second)
+
+    async def serve_forever(self, sock=None):
+        if sock is None:
+            sock = bind_unix_socket(self.path)
+        server = await asyncio.start_unix_server(self.handle_worker, sock=sock)
+        # Shut down cleanly on SIGTERM so run_sharded can stop the workers.
+        asyncio.get_event_loop().add_signal_handler(signal.SIGTERM, server.close)
+        log.info("Listening on %s", self.path)
+        matchmaker = asyncio.ensure_future(self.matchmaking_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            matchmaker.cancel()
+
+
+class BrokerLink:
+    """A worker's connection to the broker."""
+
+    def __init__(self, server, worker_id, path=BROKER_SOCKET):
+        self.server = server
+        self.worker_id = worker_id
+        self.path = path
+        self.writer = None
+
+    async def connect(self, retries=50, delay=0.1):
+        for _ in range(retries):
+            try:
+                reader, self.writer = await asyncio.open_unix_connection(self.path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(delay)
+        else:
+            raise ConnectionError(f"Broker not reachable at {self.path}")
+        self.send({"op": "HELLO", "worker": self.worker_id})
+        asyncio.ensure_future(self.listen(reader))
+
+    async def listen(self, reader):
+        decoder = FrameDecoder()
+        try:
+            while True:
+                data = await reader.read(READ_CHUNK)
+                if not data:
+                    break
+                for payload in decoder.feed(data):
+                    op = json.loads(payload)
+                    if op["op"] == "MATCH":
+                        self.server.on_broker_match(op["first"], op["second"])
+        except (ConnectionError, FrameError) as e:
+            log.warning("Broker link error: %s", e)
+        log.warning("Lost broker connection")
+        self.server.on_broker_lost()
+
+    def send(self, op):
+        self.writer.write(encode_op(op))
+
+    def join(self, conn, level, creature):
+        self.send({"op": "JOIN", "worker": self.worker_id, "player": conn.conn_id,
+                   "level": level, "creature": creature})
+
+    def leave(self, conn):
+        self.send({"op": "LEAVE", "worker": self.worker_id, "player": conn.conn_id})
+
+
+def run_broker(sock, path=BROKER_SOCKET):
+    try:
+        asyncio.run(MatchBroker(path).serve_forever(sock))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
@@ -2,6 +2,9 @@
 import json
 import os
 from creatures import Creature
+from log import get_logger
+
+log = get_logger("characters")
 
 class CharacterManager:
     def __init__(self):
@@ -39,7 +42,7 @@ class CharacterManager:
         if creature in self.creatures:
             self.creatures.remove(creature)
             self.save_characters()
-            print(f"[CharacterManager] Creature {creature.creature_type} deleted.")
+            log.info("Creature %s deleted.", creature.creature_type)
 
     def save_creature_list(self, filename="creatures.json"):
         data = [creature.to_dict() for creature in self.creatures]
@@ -52,7 +55,7 @@ class CharacterManager:
                 data = json.load(f)
             return data
         except Exception as e:
-            print("[Database] No creature data found:", e)
+            log.info("No creature data found: %s", e)
             return []
 
     def get_creature(self, index):
@@ -76,7 +79,7 @@ class CharacterManager:
                     tombstones = json.load(f)
                 return tombstones
             except Exception as e:
-                print("[CharacterManager] Error loading tombstones:", e)
+                log.error("Error loading tombstones: %s", e)
                 return []
         else:
             return []
@@ -93,21 +96,21 @@ class CharacterManager:
         filename = "tombstones.json"
         tombstones = self.load_tombstones(filename)
         if tombstone_index < 0 or tombstone_index >= len(tombstones):
-            print("Invalid tombstone index.")
+            log.warning("Invalid tombstone index.")
             return False
 
         tombstone_record = tombstones[tombstone_index]
         if tombstone_record.get("xp_transferred", False):
-            print("Bonus XP already transferred.")
+            log.info("Bonus XP already transferred.")
             return False
 
         bonus_xp = tombstone_record.get("bonus_xp", 0)
         if bonus_xp <= 0:
-            print("No bonus XP available in tombstone.")
+            log.info("No bonus XP available in tombstone.")
             return False
 
         target_creature.xp += bonus_xp
-        print(f"Transferred {bonus_xp} bonus XP to {target_creature.creature_type}.")
+        log.info("Transferred %s bonus XP to %s.", bonus_xp, target_creature.creature_type)
         tombstone_record["xp_transferred"] = True
         self.save_tombstones(tombstones, filename)
 
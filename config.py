@@ -23,4 +23,56 @@ EVOLUTION_MULTIPLIER = 1.2
 MAX_AGE = 300  # For testing: 5 minutes
 
 # Autosave interval (in seconds)
-AUTOSAVE_INTERVAL = 30
\ No newline at end of file
+AUTOSAVE_INTERVAL = 30
+
+# Matchmaking: players start out matched within MATCH_BASE_LEVEL_GAP levels
+# and the accepted gap grows by one level every MATCH_GAP_WIDEN_INTERVAL
+# seconds spent waiting.
+MATCH_BASE_LEVEL_GAP = 1
+MATCH_GAP_WIDEN_INTERVAL = 5.0
+MATCH_TICK_INTERVAL = 0.5  # How often the server re-checks widened gaps (seconds)
+MAX_CREATURE_LEVEL = 1000  # Highest creature level the server accepts from a client
+
+# Heartbeats: the server PINGs connections that have been silent for
+# HEARTBEAT_INTERVAL seconds and drops any silent for HEARTBEAT_TIMEOUT.
+HEARTBEAT_INTERVAL = 10.0
+HEARTBEAT_TIMEOUT = 30.0
+
+# Session resume: a player who drops mid-battle keeps their seat for
+# RESUME_GRACE seconds, and each room buffers its last ROOM_EVENT_BUFFER
+# events for replay on RESUME.
+RESUME_GRACE = 30.0
+ROOM_EVENT_BUFFER = 64
+
+# Logging (see log.py). TAMAGOTCHI_LOG_LEVEL overrides LOG_LEVEL. Each log
+# call site may emit LOG_RATE_BURST records at once and LOG_RATE_PER_SEC
+# sustained; the rest are dropped and counted.
+LOG_LEVEL = "INFO"
+LOG_RATE_PER_SEC = 20
+LOG_RATE_BURST = 50
+
+# Tournaments (tournament.py): sign-ups close after TOURNAMENT_SIGNUP seconds
+# or once TOURNAMENT_SIZE players have joined, and the rest of the field is
+# filled with bots. Simulated bot battles end after TOURNAMENT_MAX_TURNS turns;
+# battles with a human are decided on HP after TOURNAMENT_MATCH_TIMEOUT seconds.
+TOURNAMENT_SIZE = 16
+TOURNAMENT_SIGNUP = 30.0
+TOURNAMENT_MAX_TURNS = 200
+TOURNAMENT_MATCH_TIMEOUT = 300.0
+BOT_MOVE_DELAY = 1.0  # Seconds a server-played opponent "thinks" before moving
+
+# Search AI (ai.py): wall-clock budget per move and deepest search. Players
+# left in the matchmaking queue for BOT_BACKFILL_WAIT seconds are given a
+# server-played opponent instead (0 disables).
+AI_TIME_BUDGET = 0.004
+AI_MAX_DEPTH = 16
+BOT_BACKFILL_WAIT = 20.0
+
+# Speed-ordered battles (battle_system.InitiativeScheduler): a creature acts
+# once every INITIATIVE_SCALE / speed time units.
+INITIATIVE_SCALE = 100.0
+
+# Battle events kept per Battle (battle_events.EventLog); older ones are
+# dropped. Battle screens keep the last ACTION_LOG_LINES log lines.
+BATTLE_EVENT_BUFFER = 64
+ACTION_LOG_LINES = 4
@@ -1,13 +1,19 @@
 import random
 import time
-from abilities import generate_random_ability, ability_to_dict
+from abilities import ability_ref, generate_random_ability
 from config import XP_MULTIPLIER, STAT_GROWTH, MAX_AGE
+from effects import EffectSlots
+from log import get_logger
+
+log = get_logger("creatures")
 
 MAX_FEEDS_PER_HOUR = 3
 FEED_RESET_INTERVAL = 3600  # seconds
 
 class Creature:
-    def __init__(self, chosen_type=None):
+    def __init__(self, chosen_type=None, rng=None):
+        """:param rng: random.Random for the stat and ability rolls (default: the random module)."""
+        rng = rng or random
         CREATURE_TYPES = {
             "Skeleton": {"hp": 50, "attack": 10, "defense": 5, "speed": 7},
             "Fire Elemental": {"hp": 40, "attack": 12, "defense": 3, "speed": 10},
@@ -18,12 +24,12 @@ class Creature:
         if chosen_type and chosen_type in CREATURE_TYPES:
             self.creature_type = chosen_type
         else:
-            self.creature_type = random.choice(list(CREATURE_TYPES.keys()))
+            self.creature_type = rng.choice(list(CREATURE_TYPES.keys()))
         base_stats = CREATURE_TYPES[self.creature_type]
-        self.max_hp = base_stats["hp"] + random.randint(-5, 5)
-        self.attack = base_stats["attack"] + random.randint(-2, 2)
-        self.defense = base_stats["defense"] + random.randint(-2, 2)
-        self.speed = base_stats["speed"] + random.randint(-2, 2)
+        self.max_hp = base_stats["hp"] + rng.randint(-5, 5)
+        self.attack = base_stats["attack"] + rng.randint(-2, 2)
+        self.defense = base_stats["defense"] + rng.randint(-2, 2)
+        self.speed = base_stats["speed"] + rng.randint(-2, 2)
         self.current_hp = self.max_hp
         self.level = 1
         self.xp = 0
@@ -31,7 +37,7 @@ class Creature:
         # Generate exactly 4 abilities
         self.abilities = []
         while len(self.abilities) < 4:
-            ab = generate_random_ability(self.creature_type)
+            ab = generate_random_ability(self.creature_type, rng)
             if ab.tier == 1:
                 self.abilities.append(ab)
         self.special_ability = self.get_special_ability()
@@ -46,7 +52,7 @@ class Creature:
         self.last_feed_time = time.time()
         self.level_just_upgraded = False
         self.pending_skill = None
-        self.active_effects = []
+        self.effects = EffectSlots()  # Battle effects; they expire by turns (battle_system.py)
         self.inventory = []  # List of items (each is a dict)
 
         # Mood system: discrete value 0-100 with an ideal value.
@@ -58,6 +64,14 @@ class Creature:
             self.ideal_mood = 50
         self.mood = self.ideal_mood
 
+    @classmethod
+    def at_level(cls, level, chosen_type=None, rng=None):
+        """A new Creature levelled up to ``level``, rolling its growth as in play."""
+        creature = cls(chosen_type, rng)
+        while creature.level < level:
+            creature.level_up(rng)
+        return creature
+
     def get_special_ability(self):
         if self.creature_type == "Skeleton":
             return "Bone Shield: Reduces incoming damage by 50% for one turn."
@@ -78,21 +92,22 @@ class Creature:
             self.feed_count = 0
             self.last_feed_time = current_time
         if self.feed_count >= MAX_FEEDS_PER_HOUR:
-            print(f"[Feed] {self.creature_type} cannot be fed more now. Try again later.")
+            log.info("[Feed] %s cannot be fed more now. Try again later.", self.creature_type)
             return
         reduction = 40
         self.hunger = max(0, self.hunger - reduction)
         self.feed_count += 1
         self.mood = min(100, self.mood + 5)
-        print(f"[Feed] {self.creature_type} fed. Hunger: {self.hunger}, Mood: {self.mood} (Feed count: {self.feed_count}).")
+        log.info("[Feed] %s fed. Hunger: %s, Mood: %s (Feed count: %d).",
+                 self.creature_type, self.hunger, self.mood, self.feed_count)
 
     def sleep(self):
         self.is_sleeping = True
-        print(f"[Sleep] {self.creature_type} is now sleeping.")
+        log.info("[Sleep] %s is now sleeping.", self.creature_type)
 
     def wake_up(self):
         self.is_sleeping = False
-        print(f"[Sleep] {self.creature_type} woke up.")
+        log.info("[Sleep] %s woke up.", self.creature_type)
 
     def update_needs(self, dt):
         if self.is_sleeping:
@@ -115,28 +130,20 @@ class Creature:
             self.current_hp = max(0, self.current_hp - health_loss)
             if self.current_hp == 0:
                 self.is_alive = False
-                print(f"[Death] {self.creature_type} died due to extreme hunger.")
+                log.info("[Death] %s died due to extreme hunger.", self.creature_type)
 
     def update_age(self, dt):
         if self.is_alive:
             self.age += dt / 1000.0
             if self.age >= MAX_AGE:
                 self.is_alive = False
-                print(f"[Death] {self.creature_type} died of old age at {self.age:.1f} sec!")
+                log.info("[Death] %s died of old age at %.1f sec!", self.creature_type, self.age)
                 from database import save_dead_creature
                 save_dead_creature(self)
 
-    def update_effects(self):
-        new_effects = []
-        for effect in self.active_effects:
-            effect["duration"] -= 1
-            if effect["duration"] > 0:
-                new_effects.append(effect)
-        self.active_effects = new_effects
-
     def add_effect(self, effect):
-        self.active_effects.append(effect)
-        print(f"[Effect] {self.creature_type} gains effect: {effect}")
+        self.effects.add(effect)
+        log.debug("[Effect] %s gains effect: %s", self.creature_type, effect)
 
     @property
     def wellness(self):
@@ -146,50 +153,52 @@ class Creature:
         overall = (hp_ratio + energy_ratio + hunger_ratio) / 3 * 100
         return int(overall)
 
-    def gain_xp(self, amount):
+    def gain_xp(self, amount, rng=None):
         self.xp += amount
         xp_threshold = self.level * XP_MULTIPLIER
         if self.xp >= xp_threshold:
-            self.level_up()
+            self.level_up(rng)
 
     def lose_xp(self, amount):
         self.xp -= amount
         while self.xp < 0 and self.level > 1:
             self.level -= 1
             self.xp += self.level * XP_MULTIPLIER
-            print(f"[XP Loss] {self.creature_type} dropped to Level {self.level}!")
+            log.info("[XP Loss] %s dropped to Level %d!", self.creature_type, self.level)
             self.remove_high_level_abilities()
 
-    def level_up(self):
+    def level_up(self, rng=None):
+        rng = rng or random
         self.level += 1
         self.xp = 0
-        hp_inc = random.randint(*STAT_GROWTH["hp"])
-        atk_inc = random.randint(*STAT_GROWTH["attack"])
-        def_inc = random.randint(*STAT_GROWTH["defense"])
-        spd_inc = random.randint(*STAT_GROWTH["speed"])
+        hp_inc = rng.randint(*STAT_GROWTH["hp"])
+        atk_inc = rng.randint(*STAT_GROWTH["attack"])
+        def_inc = rng.randint(*STAT_GROWTH["defense"])
+        spd_inc = rng.randint(*STAT_GROWTH["speed"])
         self.max_hp += hp_inc
         self.attack += atk_inc
         self.defense += def_inc
         self.speed += spd_inc
         self.current_hp = self.max_hp
-        print(f"[Level Up] {self.creature_type} reached Level {self.level}! (+HP:{hp_inc}, +Atk:{atk_inc}, +Def:{def_inc}, +Spd:{spd_inc})")
+        log.info("[Level Up] %s reached Level %d! (+HP:%d, +Atk:%d, +Def:%d, +Spd:%d)",
+                 self.creature_type, self.level, hp_inc, atk_inc, def_inc, spd_inc)
         self.level_just_upgraded = True
-        self.pending_skill = generate_random_ability(self.creature_type)
+        self.pending_skill = generate_random_ability(self.creature_type, rng)
 
     def assign_random_skill(self):
         new_ability = generate_random_ability(self.creature_type)
         self.abilities.append(new_ability)
         if len(self.abilities) > 4:
             removed = self.abilities.pop(0)
-            print(f"[Ability Update] Removed {removed} to add new ability: {new_ability}")
+            log.info("[Ability Update] Removed %s to add new ability: %s", removed, new_ability)
         else:
-            print(f"[Ability Update] Added new ability: {new_ability}")
+            log.info("[Ability Update] Added new ability: %s", new_ability)
 
     def remove_high_level_abilities(self):
         filtered = []
         for ability in self.abilities:
             if hasattr(ability, 'min_level') and ability.min_level > self.level:
-                print(f"[Forget Ability] {self.creature_type} forgot {ability} due to level drop.")
+                log.info("[Forget Ability] %s forgot %s due to level drop.", self.creature_type, ability)
             else:
                 filtered.append(ability)
         self.abilities = filtered
@@ -198,10 +207,11 @@ class Creature:
         for inv_item in self.inventory:
             if inv_item["name"] == item["name"]:
                 inv_item["quantity"] += item["quantity"]
-                print(f"[Inventory] Added {item['quantity']} {item['name']}(s). Total now: {inv_item['quantity']}.")
+                log.debug("[Inventory] Added %s %s(s). Total now: %s.",
+                          item["quantity"], item["name"], inv_item["quantity"])
                 return
         self.inventory.append(item)
-        print(f"[Inventory] New item added: {item['name']} (x{item['quantity']}).")
+        log.debug("[Inventory] New item added: %s (x%s).", item["name"], item["quantity"])
 
     def use_item(self, item_name):
         for inv_item in self.inventory:
@@ -209,16 +219,16 @@ class Creature:
                 effect = inv_item["effect"]
                 if effect["type"] == "heal":
                     self.current_hp = min(self.max_hp, self.current_hp + effect["amount"])
-                    print(f"[Inventory] Used {item_name}: Healed {effect['amount']} HP.")
+                    log.info("[Inventory] Used %s: Healed %s HP.", item_name, effect["amount"])
                 elif effect["type"] == "energy":
                     self.energy = min(100, self.energy + effect["amount"])
-                    print(f"[Inventory] Used {item_name}: Restored {effect['amount']} energy.")
+                    log.info("[Inventory] Used %s: Restored %s energy.", item_name, effect["amount"])
                 elif effect["type"] == "mood":
                     self.mood = max(0, min(100, self.mood + effect["amount"]))
-                    print(f"[Inventory] Used {item_name}: Mood changed by {effect['amount']}.")
+                    log.info("[Inventory] Used %s: Mood changed by %s.", item_name, effect["amount"])
                 inv_item["quantity"] -= 1
                 return True
-        print(f"[Inventory] Item {item_name} not available.")
+        log.info("[Inventory] Item %s not available.", item_name)
         return False
 
     def to_dict(self):
@@ -236,7 +246,7 @@ class Creature:
             "is_alive": self.is_alive,
             "hunger": self.hunger,
             "energy": self.energy,
-            "abilities": [ability_to_dict(a) for a in self.abilities],
+            "abilities": [ability_ref(a) for a in self.abilities],
             "special_ability": self.special_ability,
             "inventory": self.inventory
         }
@@ -1,6 +1,9 @@
 # database.py
 import json
 import os
+from log import get_logger
+
+log = get_logger("database")
 
 DEAD_CREATURES_FILE = "dead_creatures.json"
 CREATURES_FILE = "creatures.json"
@@ -27,5 +30,5 @@ def load_creature_list(filename=CREATURES_FILE):
             data = json.load(f)
         return data
     except Exception as e:
-        print("[Database] No creature data found:", e)
+        log.info("No creature data found: %s", e)
         return []
@@ -0,0 +1,104 @@
+# effects.py
+#
+# Battle effects as typed records in fixed slots: each creature holds at
+# most one ATTACK, one DEFENSE and one STUN effect, and a new effect
+# replaces whatever held its slot. The attack and defense multipliers are
+# cached and only recomputed when a slot changes, so damage calculation
+# reads two floats instead of walking a list.
+#
+# Effects last a number of their owner's turns. Battle.apply_attack ticks
+# the attacker's effects once its turn is spent (moved or stunned), before
+# the move's own effect lands, so a one-turn self-buff covers the next turn
+# and a one-turn stun costs the target exactly one turn.
+ATTACK = 0
+DEFENSE = 1
+STUN = 2
+SLOT_NAMES = ("attack", "defense", "stun")
+
+
+class Effect:
+    __slots__ = ("slot", "multiplier", "turns")
+
+    def __init__(self, slot, multiplier, turns):
+        """
+        :param slot: ATTACK, DEFENSE or STUN.
+        :param multiplier: applied to the slot's stat (unused for STUN).
+        :param turns: owner's turns left.
+        """
+        self.slot = slot
+        self.multiplier = multiplier
+        self.turns = turns
+
+    def to_dict(self):
+        return {"slot": SLOT_NAMES[self.slot], "multiplier": self.multiplier, "turns": self.turns}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(SLOT_NAMES.index(d["slot"]), float(d.get("multiplier", 1.0)), int(d["turns"]))
+
+    def __repr__(self):
+        return f"Effect({SLOT_NAMES[self.slot]}, x{self.multiplier:g}, {self.turns} turns)"
+
+
+class EffectSlots:
+    """A creature's active effects plus the cached stat multipliers they imply."""
+    __slots__ = ("slots", "attack", "defense")
+
+    def __init__(self):
+        self.slots = [None, None, None]
+        self.attack = 1.0
+        self.defense = 1.0
+
+    def __iter__(self):
+        return (e for e in self.slots if e is not None)
+
+    def __len__(self):
+        return sum(1 for e in self.slots if e is not None)
+
+    @property
+    def stunned(self):
+        return self.slots[STUN] is not None
+
+    def add(self, effect):
+        self.slots[effect.slot] = effect
+        self.refresh()
+
+    def tick(self):
+        """One of the owner's turns has passed: count down and drop expired effects."""
+        changed = False
+        for i, e in enumerate(self.slots):
+            if e is not None:
+                e.turns -= 1
+                if e.turns <= 0:
+                    self.slots[i] = None
+                    changed = True
+        if changed:
+            self.refresh()
+
+    def clear(self):
+        self.slots = [None, None, None]
+        self.refresh()
+
+    def refresh(self):
+        attack, defense = self.slots[ATTACK], self.slots[DEFENSE]
+        self.attack = attack.multiplier if attack is not None else 1.0
+        self.defense = defense.multiplier if defense is not None else 1.0
+
+    def to_list(self):
+        return [e.to_dict() for e in self]
+
+    def load(self, effects):
+        """Replace every slot from a to_list() payload (e.g. a state sync delta)."""
+        self.slots = [None, None, None]
+        for d in effects:
+            e = Effect.from_dict(d)
+            self.slots[e.slot] = e
+        self.refresh()
+
+
+def effective_attack(creature):
+    return int(creature.attack * creature.effects.attack)
+
+
+def effective_defense(creature):
+    return int(creature.defense * creature.effects.defense)
@@ -4,6 +4,9 @@ from ui.creature_screen import CreatureScreen
 from creatures import Creature
 from ui.creature_selector import CreatureSelectorScreen
 from character_manager import CharacterManager
+from log import get_logger
+
+log = get_logger("game")
 
 class GameEngine:
     def __init__(self, screen):
@@ -63,7 +66,7 @@ class GameEngine:
         self.state = "CREATURE_SCREEN"
 
     def delete_creature(self, creature):
-        print(f"[GameEngine] Deleting creature: {creature.creature_type}")
+        log.info("Deleting creature: %s", creature.creature_type)
         self.char_manager.delete_creature(creature)
 
     def start_multiplayer(self):
@@ -71,14 +74,14 @@ class GameEngine:
         from network import NetworkClient
 
         if not self.current_creature:
-            print("[Multiplayer] Please create your creature first.")
+            log.warning("Multiplayer: please create your creature first.")
             return
 
         network_client = NetworkClient(host='localhost', port=9999)
         try:
             network_client.connect()
         except Exception as e:
-            print("[Multiplayer] Failed to connect:", e)
+            log.error("Multiplayer: failed to connect: %s", e)
             return
 
         def on_start_battle(battle_start_data):
@@ -92,7 +95,20 @@ class GameEngine:
             )
             self.state = "MULTIPLAYER"
 
+        def on_spectate(spectate_start_data):
+            from ui.multiplayer_screen import MultiplayerScreen
+            self.multiplayer_screen = MultiplayerScreen(
+                self.screen,
+                spectate_start_data,
+                network_client,
+                on_main_menu=self.return_to_main_menu,
+                on_battle_complete=on_battle_complete
+            )
+            self.state = "MULTIPLAYER"
+
         def on_battle_complete():
+            # The server closed the room when the battle ended; this connection is done too.
+            network_client.close()
             self.char_manager.save_characters()
             self.creature_screen = CreatureScreen(
                 self.screen,
@@ -102,14 +118,15 @@ class GameEngine:
                 on_main_menu=self.return_to_main_menu
             )
             self.state = "CREATURE_SCREEN"
-            print("[GameEngine] Battle complete; creature stats saved and loaded into Creature Screen.")
+            log.info("Battle complete; creature stats saved and loaded into Creature Screen.")
 
         self.lobby_screen = MultiplayerLobbyScreen(
             self.screen,
             self.current_creature,
             network_client,
             on_start_battle,
-            on_main_menu=self.return_to_main_menu
+            on_main_menu=self.return_to_main_menu,
+            on_spectate=on_spectate
         )
         self.state = "LOBBY"
 
@@ -128,7 +145,15 @@ class GameEngine:
         from ui.battle_screen import BattleScreen
         # Create a Battle instance using the player's creature and the wild enemy.
         from battle_system import Battle
-        battle_instance = Battle(self.current_creature, wild_creature)
+        from ai import SearchAI
+        # Effects only last within a battle; drop any left by one abandoned midway.
+        self.current_creature.effects.clear()
+        # Wild battles are local, so turns can follow speed rather than the
+        # server protocol's strict alternation.
+        battle_instance = Battle(self.current_creature, wild_creature, speed_order=True)
+        # The wild creature searches a few milliseconds per move (config AI_TIME_BUDGET),
+        # well inside one frame of BattleScreen's loop.
+        battle_instance.enemy_ai = SearchAI()
         self.battle_screen = BattleScreen(
             self.screen,
             battle_instance,
@@ -0,0 +1,238 @@
+# loadtest.py
+#
+# Headless bot players for capacity testing server.py. Each bot speaks the
+# same framed protocol as network.NetworkClient (protocol.py): it joins the
+# lobby with a random Creature().to_dict(), plays legal MOVEs until the
+# battle ends, then disconnects. Bots run as coroutines rather than one
+# NetworkClient thread each, so thousands of them fit in one process
+# without the generator becoming the bottleneck.
+#
+#   python loadtest.py --bots 2000 --spawn-server
+#   python loadtest.py --bots 5000 --port 9999 --server-pid 1234 --json
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from abilities import ability_from_dict
+from creatures import Creature
+from matchmaking import percentile
+from protocol import FrameDecoder, encode_message
+from server import raise_fd_limit
+
+
+class LoadStats:
+    def __init__(self):
+        self.connected = 0
+        self.connect_failures = 0
+        self.matches = 0
+        self.battles_finished = 0
+        self.abandoned = 0
+        self.errors = 0
+        self.move_rtts = []
+        self.first_connect = None
+        self.last_connect = None
+        self.first_match = None
+        self.last_match = None
+
+    def summary(self, server_rss_kb=None):
+        connect_span = (self.last_connect - self.first_connect) if self.connected > 1 else 0.0
+        match_span = (self.last_match - self.first_match) if self.matches > 1 else 0.0
+        rtts_ms = [r * 1000.0 for r in self.move_rtts]
+        return {
+            "connected": self.connected,
+            "connect_failures": self.connect_failures,
+            "connections_per_sec": self.connected / connect_span if connect_span else 0.0,
+            "matches": self.matches,
+            "matches_per_sec": self.matches / match_span if match_span else 0.0,
+            "battles_finished": self.battles_finished,
+            "abandoned": self.abandoned,
+            "errors": self.errors,
+            "moves": len(rtts_ms),
+            "rtt_p50_ms": percentile(rtts_ms, 50),
+            "rtt_p90_ms": percentile(rtts_ms, 90),
+            "rtt_p99_ms": percentile(rtts_ms, 99),
+            "server_rss_kb": server_rss_kb,
+        }
+
+
+async def run_bot(host, port, stats, connect_gate, timeout):
+    async with connect_gate:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            stats.connect_failures += 1
+            return
+    now = time.perf_counter()
+    stats.connected += 1
+    stats.first_connect = stats.first_connect or now
+    stats.last_connect = now
+
+    decoder = FrameDecoder()
+    creature = Creature().to_dict()
+    writer.write(encode_message(json.dumps({"type": "JOIN_LOBBY", "creature": creature})))
+    my_role = None
+    abilities = []
+    energy = 0
+    move_sent_at = None
+
+    def send_move():
+        nonlocal move_sent_at
+        affordable = [i for i, a in enumerate(abilities) if a.energy_cost <= energy]
+        if not affordable:
+            return False
+        writer.write(encode_message(json.dumps({"type": "MOVE", "index": random.choice(affordable)})))
+        move_sent_at = time.perf_counter()
+        return True
+
+    battle_over = False
+    try:
+        done = False
+        while not done:
+            data = await asyncio.wait_for(reader.read(65536), timeout)
+            if not data:
+                stats.errors += 1
+                break
+            for payload in decoder.feed(data):
+                msg = json.loads(payload)
+                kind = msg.get("type")
+                if kind == "PING":
+                    writer.write(encode_message(json.dumps({"type": "PONG"})))
+                elif kind == "BATTLE_START":
+                    my_role = msg["your_role"]
+                    abilities = [ability_from_dict(a) for a in msg["player_creature"]["abilities"]]
+                    energy = msg["player_creature"].get("energy", 100)
+                    if my_role == "player1":
+                        now = time.perf_counter()
+                        stats.matches += 1
+                        stats.first_match = stats.first_match or now
+                        stats.last_match = now
+                    if msg["current_turn"] == my_role and not send_move():
+                        done = True
+                elif kind == "MOVE_RESULT":
+                    fields = msg.get("delta", {}).get(my_role, {})
+                    energy = fields.get("en", energy)
+                    if msg["actor"] == my_role and move_sent_at is not None:
+                        stats.move_rtts.append(time.perf_counter() - move_sent_at)
+                        move_sent_at = None
+                    if msg.get("winner"):
+                        if my_role == "player1":
+                            stats.battles_finished += 1
+                        battle_over = done = True
+                    elif msg["next_turn"] == my_role and not send_move():
+                        # Out of energy: give up and let the opponent win by default.
+                        done = True
+                elif kind == "MOVE_REJECTED":
+                    if not send_move():
+                        done = True
+                elif kind == "OPPONENT_LEFT":
+                    stats.abandoned += 1
+                    battle_over = done = True
+                if done:
+                    break
+        if my_role is not None and not battle_over:
+            writer.write(encode_message(json.dumps({"type": "LEAVE_BATTLE"})))
+    except (asyncio.TimeoutError, OSError, ValueError):
+        stats.errors += 1
+    finally:
+        writer.close()
+
+
+def read_rss_kb(pid):
+    """Resident set size of pid plus its children (sharded workers), in KB."""
+    total = 0
+    pids = [pid]
+    try:
+        children = subprocess.run(["pgrep", "-P", str(pid)], capture_output=True, text=True).stdout.split()
+        pids += [int(c) for c in children]
+    except OSError:
+        pass
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            pass
+    return total or None
+
+
+async def run_load(args, server_pid):
+    stats = LoadStats()
+    connect_gate = asyncio.Semaphore(args.connect_concurrency)
+    bots = []
+    started = time.perf_counter()
+    for i in range(args.bots):
+        bots.append(asyncio.ensure_future(run_bot(args.host, args.port, stats, connect_gate, args.timeout)))
+        if args.ramp and i % args.ramp == args.ramp - 1:
+            await asyncio.sleep(1.0)
+    peak_rss = None
+    pending = set(bots)
+    while pending:
+        _, pending = await asyncio.wait(pending, timeout=0.5)
+        if server_pid:
+            rss = read_rss_kb(server_pid)
+            if rss and (peak_rss is None or rss > peak_rss):
+                peak_rss = rss
+    result = stats.summary(peak_rss)
+    result["bots"] = args.bots
+    result["elapsed_sec"] = time.perf_counter() - started
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bot load generator for server.py")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--bots", type=int, default=1000)
+    parser.add_argument("--ramp", type=int, default=0, help="bots started per second (0 = all at once)")
+    parser.add_argument("--connect-concurrency", type=int, default=500,
+                        help="maximum connection attempts in flight")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds a bot waits for any message")
+    parser.add_argument("--spawn-server", action="store_true", help="start a local server.py for the run")
+    parser.add_argument("--workers", type=int, default=1, help="worker processes for --spawn-server")
+    parser.add_argument("--server-pid", type=int, help="pid of an already running server, for RSS")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    raise_fd_limit()
+    proc = None
+    server_pid = args.server_pid
+    if args.spawn_server:
+        here = os.path.dirname(os.path.abspath(__file__))
+        proc = subprocess.Popen(
+            [sys.executable, os.path.join(here, "server.py"), "--host", args.host,
+             "--port", str(args.port), "--workers", str(args.workers)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        server_pid = proc.pid
+        time.sleep(1.0)
+    try:
+        result = asyncio.run(run_load(args, server_pid))
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+    print(f"Bots: {result['bots']} | connected {result['connected']} "
+          f"({result['connections_per_sec']:.0f}/s), failures {result['connect_failures']}")
+    print(f"Matches: {result['matches']} ({result['matches_per_sec']:.0f}/s), finished "
+          f"{result['battles_finished']}, abandoned {result['abandoned']}, errors {result['errors']}")
+    print(f"MOVE round trip over {result['moves']} moves: p50 {result['rtt_p50_ms']:.2f} ms, "
+          f"p90 {result['rtt_p90_ms']:.2f} ms, p99 {result['rtt_p99_ms']:.2f} ms")
+    if result["server_rss_kb"]:
+        print(f"Server peak RSS: {result['server_rss_kb'] / 1024:.1f} MB")
+    print(f"Elapsed: {result['elapsed_sec']:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 # main.py
 import pygame
 from game_engine import GameEngine
+from log import setup_logging
 
 def main():
+    setup_logging()
     pygame.init()
     screen = pygame.display.set_mode((800, 600))
     pygame.display.set_caption("Dark Tamagotchi")
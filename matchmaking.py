@@ -0,0 +1,247 @@
+# matchmaking.py
+import bisect
+import math
+import time
+from collections import deque
+from config import MATCH_BASE_LEVEL_GAP, MATCH_GAP_WIDEN_INTERVAL
+
+LATENCY_SAMPLES = 10000  # Most recent match wait times kept for percentiles
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an iterable of numbers (0 if empty)."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered), math.ceil(pct / 100.0 * len(ordered))) - 1)
+    return ordered[rank]
+
+
+class Ticket:
+    """A player waiting in the matchmaking queue."""
+    __slots__ = ("player", "level", "data", "enqueued_at", "active")
+
+    def __init__(self, player, level, data, enqueued_at):
+        self.player = player
+        self.level = level
+        self.data = data
+        self.enqueued_at = enqueued_at
+        self.active = True
+
+
+class MatchmakingQueue:
+    """
+    Waiting players indexed by creature level. Each level has a FIFO bucket
+    and the non-empty levels are kept sorted, so finding the nearest
+    opponent is a bisect plus a short outward walk over neighbouring levels.
+
+    A ticket accepts opponents within ``base_gap`` levels, widened by one
+    level for every ``widen_interval`` seconds it has waited. Two tickets
+    match when their level difference fits the more patient one's gap.
+    """
+
+    def __init__(self, base_gap=MATCH_BASE_LEVEL_GAP, widen_interval=MATCH_GAP_WIDEN_INTERVAL, clock=time.monotonic):
+        self.base_gap = base_gap
+        self.widen_interval = widen_interval
+        self.clock = clock
+        self.buckets = {}      # level -> deque of Tickets (may hold cancelled ones)
+        self.bucket_sizes = {}  # level -> number of active tickets in its bucket
+        self.levels = []       # sorted levels with at least one active ticket
+        self.tickets = {}      # player -> active Ticket
+        self.arrivals = deque()  # Tickets in arrival order (may hold cancelled ones)
+        self.matches_made = 0
+        self.match_latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def __len__(self):
+        return len(self.tickets)
+
+    def __contains__(self, player):
+        return player in self.tickets
+
+    def allowed_gap(self, ticket, now):
+        return self.base_gap + int((now - ticket.enqueued_at) / self.widen_interval)
+
+    def add(self, player, level, data=None):
+        """
+        Queue a player and try to pair them straight away.
+        :return: (first_ticket, second_ticket) if matched, else None. The
+                 first ticket is the one that waited longer.
+        """
+        self.remove(player)
+        now = self.clock()
+        ticket = Ticket(player, level, data, now)
+        match = self._find_opponent(ticket, now)
+        if match is not None:
+            self.remove(match.player)
+            return self._record(match, ticket, now)
+        self._insert(ticket)
+        return None
+
+    def remove(self, player):
+        # Lazy deletion: the ticket stays in its bucket until it reaches the
+        # head, but a level with no active tickets left is dropped at once.
+        ticket = self.tickets.pop(player, None)
+        if ticket is None:
+            return None
+        ticket.active = False
+        level = ticket.level
+        self.bucket_sizes[level] -= 1
+        if self.bucket_sizes[level] == 0:
+            del self.buckets[level]
+            del self.bucket_sizes[level]
+            del self.levels[bisect.bisect_left(self.levels, level)]
+        return ticket
+
+    def tick(self):
+        """
+        Pair players whose gaps have widened since they were queued.
+        :return: list of (first_ticket, second_ticket) pairs.
+        """
+        now = self.clock()
+        pairs = []
+        heads = [self._peek(level) for level in self.levels]
+        # Most patient first: they have the widest gaps.
+        heads.sort(key=lambda t: t.enqueued_at)
+        for ticket in heads:
+            if not ticket.active:
+                continue
+            match = self._find_opponent(ticket, now)
+            if match is None:
+                continue
+            self.remove(ticket.player)
+            self.remove(match.player)
+            first, second = (ticket, match) if ticket.enqueued_at <= match.enqueued_at else (match, ticket)
+            pairs.append(self._record(first, second, now))
+        return pairs
+
+    def expire(self, max_wait):
+        """
+        Take every player who has waited at least max_wait seconds out of
+        the queue.
+        :return: their Tickets, longest wait first.
+        """
+        now = self.clock()
+        expired = []
+        arrivals = self.arrivals
+        while arrivals and (not arrivals[0].active or now - arrivals[0].enqueued_at >= max_wait):
+            ticket = arrivals.popleft()
+            if ticket.active:
+                self.remove(ticket.player)
+                expired.append(ticket)
+        return expired
+
+    def stats(self):
+        return {
+            "queue_depth": len(self.tickets),
+            "matches_made": self.matches_made,
+            "match_wait_p50": percentile(self.match_latencies, 50),
+            "match_wait_p99": percentile(self.match_latencies, 99),
+        }
+
+    # -- internals -------------------------------------------------------
+
+    def _record(self, first, second, now):
+        self.matches_made += 1
+        self.match_latencies.append(now - first.enqueued_at)
+        self.match_latencies.append(now - second.enqueued_at)
+        return first, second
+
+    def _insert(self, ticket):
+        bucket = self.buckets.get(ticket.level)
+        if bucket is None:
+            bucket = self.buckets[ticket.level] = deque()
+            self.bucket_sizes[ticket.level] = 0
+            bisect.insort(self.levels, ticket.level)
+        bucket.append(ticket)
+        self.bucket_sizes[ticket.level] += 1
+        self.tickets[ticket.player] = ticket
+        self.arrivals.append(ticket)
+
+    def _peek(self, level, skip=None):
+        """Oldest active ticket at this level other than ``skip``."""
+        bucket = self.buckets[level]
+        while not bucket[0].active:
+            bucket.popleft()
+        for ticket in bucket:
+            if ticket.active and ticket is not skip:
+                return ticket
+        return None
+
+    def _widest_gap(self, now):
+        """Gap of the longest-waiting player, the furthest any match can reach."""
+        arrivals = self.arrivals
+        while arrivals and not arrivals[0].active:
+            arrivals.popleft()
+        if not arrivals:
+            return 0
+        return self.allowed_gap(arrivals[0], now)
+
+    def _find_opponent(self, ticket, now):
+        """Closest-level waiting ticket whose gap allows this pairing."""
+        own_gap = self.allowed_gap(ticket, now)
+        reach = max(own_gap, self._widest_gap(now))
+        levels = self.levels
+        right = bisect.bisect_left(levels, ticket.level)
+        left = right - 1
+        best = None
+        best_diff = None
+        # Walk outward from the ticket's level, nearest level first. Nothing
+        # beyond the widest gap in the queue, or beyond the best candidate
+        # found so far, can be a better match.
+        while True:
+            if left >= 0 and (right >= len(levels) or ticket.level - levels[left] <= levels[right] - ticket.level):
+                level = levels[left]
+                left -= 1
+            elif right < len(levels):
+                level = levels[right]
+                right += 1
+            else:
+                break
+            diff = abs(level - ticket.level)
+            if diff > reach or (best is not None and diff > best_diff):
+                break
+            head = self._peek(level, skip=ticket)
+            if head is None:
+                continue
+            if diff <= max(own_gap, self.allowed_gap(head, now)):
+                if best is None or head.enqueued_at < best.enqueued_at:
+                    best, best_diff = head, diff
+        return best
+
+
+def simulate_bot_flood(arrivals_per_sec=500, duration=60.0, step=0.05, seed=1):
+    """
+    Push a synthetic stream of bots through the queue on a virtual clock and
+    report wait-time percentiles. Levels are skewed towards low values, like
+    a real player base, so sparse high levels exercise gap widening.
+    """
+    import random
+    rng = random.Random(seed)
+    clock = [0.0]
+    mm = MatchmakingQueue(clock=lambda: clock[0])
+    bot_id = 0
+    max_depth = 0
+    carry = 0.0
+    while clock[0] < duration:
+        carry += arrivals_per_sec * step
+        while carry >= 1:
+            carry -= 1
+            level = min(100, int(rng.expovariate(1 / 8.0)) + 1)
+            mm.add(bot_id, level)
+            bot_id += 1
+        mm.tick()
+        max_depth = max(max_depth, len(mm))
+        clock[0] += step
+    result = mm.stats()
+    result["bots"] = bot_id
+    result["max_queue_depth"] = max_depth
+    result["match_wait_max"] = max(mm.match_latencies) if mm.match_latencies else 0.0
+    return result
+
+
+if __name__ == "__main__":
+    for rate in (50, 500, 5000):
+        r = simulate_bot_flood(arrivals_per_sec=rate)
+        print(f"{rate:>5} bots/s: matched {r['matches_made']} pairs of {r['bots']} bots, "
+              f"p50 wait {r['match_wait_p50']:.2f}s, p99 wait {r['match_wait_p99']:.2f}s, "
+              f"max wait {r['match_wait_max']:.2f}s, max depth {r['max_queue_depth']}")
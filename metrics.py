@@ -0,0 +1,168 @@
+# metrics.py
+#
+# In-process server metrics, served in the Prometheus text format by
+# serve_metrics(). Counters and histograms are updated without locks: each
+# thread increments its own cell and a scrape sums the cells of every
+# thread. Gauges are usually backed by a callback, so they cost nothing
+# until scraped.
+#   curl http://localhost:9100/metrics
+import asyncio
+import bisect
+import threading
+
+# Seconds. Relay latency is sub-millisecond; match waits run to minutes.
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+WAIT_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}  # name -> metric, in registration order
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class PerThreadMetric:
+    """Base for metrics whose updates land in a cell owned by the calling thread."""
+
+    def __init__(self, name, help_text, registry=REGISTRY):
+        self.name = name
+        self.help = help_text
+        self.local = threading.local()
+        self.cells = []  # every thread's cell, appended to once per thread
+        self.cells_lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def cell(self):
+        try:
+            return self.local.cell
+        except AttributeError:
+            cell = self.local.cell = self.new_cell()
+            with self.cells_lock:
+                self.cells.append(cell)
+            return cell
+
+    def all_cells(self):
+        with self.cells_lock:
+            return list(self.cells)
+
+
+class Counter(PerThreadMetric):
+    kind = "counter"
+
+    def new_cell(self):
+        return [0]
+
+    def inc(self, amount=1):
+        self.cell()[0] += amount
+
+    def value(self):
+        return sum(c[0] for c in self.all_cells())
+
+    def samples(self):
+        return [f"{self.name} {self.value()}"]
+
+
+class Histogram(PerThreadMetric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help_text, registry)
+
+    def new_cell(self):
+        # One count per bucket plus +Inf, then the running sum.
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def observe(self, value):
+        cell = self.cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    def snapshot(self):
+        """:return: (per-bucket counts including +Inf, sum of observations)."""
+        cells = self.all_cells()
+        counts = [sum(c[i] for c in cells) for i in range(len(self.buckets) + 1)]
+        return counts, sum(c[-1] for c in cells)
+
+    def samples(self):
+        counts, total = self.snapshot()
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ("+Inf",), counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {cumulative}")
+        return lines
+
+
+class Gauge:
+    """A current value, either set() directly or read from a callback on scrape."""
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn=None, registry=REGISTRY):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.current = 0
+        if registry is not None:
+            registry.register(self)
+
+    def set(self, value):
+        self.current = value
+
+    def set_function(self, fn):
+        self.fn = fn
+
+    def value(self):
+        return self.fn() if self.fn is not None else self.current
+
+    def samples(self):
+        return [f"{self.name} {self.value()}"]
+
+
+async def serve_metrics(host, port, registry=REGISTRY, timeout=5.0, pages=None):
+    """
+    Answer GET /metrics with registry.render(). Returns the asyncio server.
+    :param pages: optional dict of extra path -> callable returning text.
+    """
+    pages = dict(pages or {})
+    pages["/"] = pages["/metrics"] = registry.render
+
+    async def handle(reader, writer):
+        try:
+            request = await asyncio.wait_for(reader.readline(), timeout)
+            while await asyncio.wait_for(reader.readline(), timeout) not in (b"\r\n", b"\n", b""):
+                pass  # Headers are not needed.
+            parts = request.split()
+            page = pages.get(parts[1].split(b"?")[0].decode("latin-1")) if len(parts) >= 2 else None
+            if parts[0:1] == [b"GET"] and page is not None:
+                status, body = "200 OK", page().encode()
+            else:
+                status, body = "404 Not Found", b"Not found\n"
+            writer.write(f"HTTP/1.0 {status}\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
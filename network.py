@@ -1,7 +1,19 @@
 # network.py
+import json
 import socket
 import threading
+import time
 import queue
+from config import HEARTBEAT_TIMEOUT, RESUME_GRACE
+from log import get_logger
+from protocol import FrameDecoder, FrameError, encode_message
+
+log = get_logger("network")
+
+RECV_SIZE = 65536
+PONG = json.dumps({"type": "PONG"})
+RECONNECT_DELAY = 0.5  # First retry delay; doubles up to RECONNECT_MAX_DELAY
+RECONNECT_MAX_DELAY = 4.0
 
 class NetworkClient:
     def __init__(self, host='localhost', port=9999):
@@ -10,42 +22,153 @@ class NetworkClient:
         self.sock = None
         self.recv_queue = queue.Queue()
         self.running = False
+        self.decoder = FrameDecoder()
+        self.handlers = {}  # message type -> callable(msg)
+        self.session = None  # Battle session token from BATTLE_START, while resumable
+        self.last_seq = 0  # Highest battle event seq received
+        # The listener thread answers PINGs while the game thread sends moves;
+        # one sendall at a time keeps their frames from interleaving.
+        self.send_lock = threading.Lock()
 
     def connect(self):
         self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.sock.connect((self.host, self.port))
+        # The server pings idle clients, so a silent socket means a dead link.
+        self.sock.settimeout(HEARTBEAT_TIMEOUT)
         self.running = True
         threading.Thread(target=self.listen, daemon=True).start()
-        print("[Network] Connected to server at {}:{}".format(self.host, self.port))
+        log.info("Connected to server at %s:%s", self.host, self.port)
 
     def listen(self):
         while self.running:
             try:
-                data = self.sock.recv(4096)
-                if data:
-                    message = data.decode()
+                data = self.sock.recv(RECV_SIZE)
+                if not data:
+                    raise ConnectionResetError("Server closed the connection")
+                for payload in self.decoder.feed(data):
+                    # Decoded once here; handlers receive the dict.
+                    try:
+                        message = json.loads(payload)
+                    except ValueError as e:
+                        log.warning("Dropping undecodable message: %s", e)
+                        continue
+                    if message.get("type") == "PING":
+                        # Answer straight from the listener thread so
+                        # heartbeats do not depend on the frame rate.
+                        self.send(PONG)
+                        continue
+                    self.track_session(message)
                     self.recv_queue.put(message)
-                    print("[Network] Received:", message)
-                else:
+                    log.debug("Received %s", message.get("type"))
+            except (OSError, FrameError) as e:
+                if not self.running:  # Not an error if close() woke us up
+                    break
+                log.warning("Listen error: %s", e)
+                if not (self.session and self.reconnect()):
                     self.running = False
-            except Exception as e:
-                print("[Network] Listen error:", e)
-                self.running = False
-                break
+                    break
+
+    def track_session(self, message):
+        if "session" in message:
+            self.session = message["session"]
+            self.last_seq = 0
+        if "seq" in message:
+            self.last_seq = max(self.last_seq, message["seq"])
+        if message.get("winner") or message.get("type") in ("OPPONENT_LEFT", "RESUME_FAILED"):
+            self.session = None
+
+    def reconnect(self):
+        """
+        Reopen the connection and RESUME the battle session, retrying with
+        backoff for as long as the server holds our seat. Handlers see a
+        RECONNECTING message now and the server's RESUMED (or RESUME_FAILED)
+        reply later.
+        :return: True once RESUME has been sent on a new socket.
+        """
+        self.recv_queue.put({"type": "RECONNECTING"})
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        deadline = time.monotonic() + RESUME_GRACE
+        delay = RECONNECT_DELAY
+        while self.running and time.monotonic() < deadline:
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=HEARTBEAT_TIMEOUT)
+            except OSError as e:
+                log.info("Reconnect failed: %s; retrying in %.1fs", e, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+            self.sock = sock
+            self.decoder = FrameDecoder()
+            self.send(json.dumps({"type": "RESUME", "token": self.session, "last_seq": self.last_seq}))
+            log.info("Reconnected to %s:%s; resuming from event %d", self.host, self.port, self.last_seq)
+            return True
+        return False
 
     def send(self, message):
         try:
-            self.sock.sendall(message.encode())
-            print("[Network] Sent:", message)
-        except Exception as e:
-            print("[Network] Send error:", e)
+            data = encode_message(message)
+            with self.send_lock:
+                self.sock.sendall(data)
+            log.debug("Sent %s", message)
+        except (OSError, FrameError) as e:
+            log.warning("Send error: %s", e)
+
+    def send_many(self, messages):
+        """Pipeline several messages in a single sendall."""
+        try:
+            data = b"".join(encode_message(m) for m in messages)
+            with self.send_lock:
+                self.sock.sendall(data)
+        except (OSError, FrameError) as e:
+            log.warning("Send error: %s", e)
 
     def get_message(self):
-        if not self.recv_queue.empty():
-            return self.recv_queue.get()
-        return None
+        """Pop one decoded message (dict), or None if nothing is queued."""
+        try:
+            return self.recv_queue.get_nowait()
+        except queue.Empty:
+            return None
+
+    def register_handler(self, msg_type, handler):
+        """Route messages whose "type" is msg_type to handler(msg) in dispatch()."""
+        self.handlers[msg_type] = handler
+
+    def unregister_handler(self, msg_type):
+        self.handlers.pop(msg_type, None)
+
+    def dispatch(self):
+        """
+        Drain every queued message and hand each to the handler registered for
+        its type. Call once per frame; a burst of messages is processed in one
+        tick instead of one per frame. Handlers are looked up per message, so a
+        handler may register new ones for the rest of the burst.
+        :return: number of messages processed.
+        """
+        count = 0
+        while True:
+            try:
+                msg = self.recv_queue.get_nowait()
+            except queue.Empty:
+                return count
+            count += 1
+            handler = self.handlers.get(msg.get("type"))
+            if handler is None:
+                log.debug("No handler for message type %s", msg.get("type"))
+                continue
+            try:
+                handler(msg)
+            except Exception:
+                log.exception("Error handling %s message", msg.get("type"))
 
     def close(self):
         self.running = False
         if self.sock:
+            try:
+                # Wake the listener blocked in recv() and send FIN right away.
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             self.sock.close()
@@ -0,0 +1,69 @@
+# protocol.py
+#
+# Wire format shared by network.py and server.py: every message is a
+# 4-byte big-endian length followed by that many bytes of UTF-8 JSON.
+import struct
+
+HEADER = struct.Struct("!I")
+MAX_FRAME_SIZE = 1024 * 1024  # Larger frames are treated as a protocol error.
+
+
+class FrameError(ValueError):
+    pass
+
+
+def encode_frame(payload):
+    """Prefix raw payload bytes with their length."""
+    if len(payload) > MAX_FRAME_SIZE:
+        raise FrameError(f"Frame of {len(payload)} bytes exceeds {MAX_FRAME_SIZE}")
+    return HEADER.pack(len(payload)) + payload
+
+
+def encode_message(message):
+    """Frame a JSON message string."""
+    return encode_frame(message.encode())
+
+
+class FrameDecoder:
+    """
+    Streaming decoder. Feed it whatever recv() returned; it buffers partial
+    frames across calls and returns every complete payload in the chunk, so
+    split and coalesced TCP reads both come out as whole messages.
+    """
+
+    def __init__(self, max_frame_size=MAX_FRAME_SIZE):
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        """
+        :param data: bytes received from the socket.
+        :return: list of complete payloads (bytes), possibly empty.
+        """
+        buf = self._buffer
+        buf += data
+        frames = []
+        pos = 0
+        available = len(buf)
+        while available - pos >= HEADER.size:
+            (length,) = HEADER.unpack_from(buf, pos)
+            if length > self.max_frame_size:
+                raise FrameError(f"Incoming frame of {length} bytes exceeds {self.max_frame_size}")
+            end = pos + HEADER.size + length
+            if end > available:
+                break
+            frames.append(bytes(buf[pos + HEADER.size:end]))
+            pos = end
+        if pos:
+            del buf[:pos]
+        return frames
+
+    def pending(self):
+        """Number of buffered bytes belonging to an incomplete frame."""
+        return len(self._buffer)
+
+    def take_pending(self):
+        """Remove and return the buffered bytes of an incomplete frame."""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
@@ -0,0 +1,284 @@
+# replay.py
+#
+# Compact binary battle replays. A Battle (battle_system.py) owns a seeded
+# random stream, snapshots both creatures when it starts and records every
+# applied move, which is all it takes to play it again:
+#
+#   header    "<4sBQIIH": magic, version, seed, creature block length,
+#             move count, keyframe interval
+#   creatures zlib-compressed JSON list [player, enemy]
+#             (battle_system.combat_state)
+#   moves     one byte per move: side << 7 | ability index
+#   keyframes "<dddd6d6B" after every keyframe-interval moves: player hp,
+#             player energy, enemy hp, enemy energy, then the multiplier
+#             and turns left of each effect slot (effects.py), player's
+#             slots first; 0 turns is an empty slot
+#
+# Keyframes let ReplayPlayer.seek() jump near any move without replaying
+# the battle from the start.
+#   python replay.py --bench 2000
+#   python replay.py replays/12.tgr --seek 5
+import argparse
+import json
+import random
+import struct
+import time
+import zlib
+from battle_events import EFFECT, FAINT, HEAL, format_event
+from battle_state import (ATK_MULT, ATK_TURNS, DEF_MULT, DEF_TURNS, ENERGY, HP, NO_WINNER, STUN_TURNS, WINNER,
+                          BattleState)
+from battle_system import Battle, TeamBattle
+from server_battle import Combatant
+
+MAGIC = b"TGRP"
+VERSION = 2  # 2: keyframes carry effect slots, which affect damage since then
+HEADER = struct.Struct("<4sBQIIH")
+KEYFRAME = struct.Struct("<dddd6d6B")
+KEYFRAME_INTERVAL = 16
+MAX_ABILITY_INDEX = 0x7F
+
+
+class ReplayError(ValueError):
+    pass
+
+
+class Replay:
+    __slots__ = ("seed", "creatures", "moves", "interval", "keyframes")
+
+    def __init__(self, seed, creatures, moves, interval=KEYFRAME_INTERVAL, keyframes=None):
+        """
+        :param creatures: (player, enemy) combat_state() dicts at the start.
+        :param moves: list of (side, ability index); side 0 is the player.
+        :param keyframes: keyframe() tuples after each ``interval`` moves;
+                          computed if None.
+        """
+        self.seed = seed
+        self.creatures = creatures
+        self.moves = moves
+        self.interval = interval
+        self.keyframes = keyframes if keyframes is not None else self.compute_keyframes()
+
+    @classmethod
+    def from_battle(cls, battle, interval=KEYFRAME_INTERVAL):
+        if isinstance(battle, TeamBattle):
+            raise ReplayError("Replays hold 1v1 battles only")
+        return cls(battle.seed, battle.start_state, list(battle.moves), interval)
+
+    def compute_keyframes(self):
+        player = ReplayPlayer(self, keyframes=False)
+        keyframes = []
+        for end in range(self.interval, len(self.moves) + 1, self.interval):
+            player.seek(end)
+            keyframes.append(keyframe(player.state()))
+        return keyframes
+
+    def encode(self):
+        creatures = zlib.compress(json.dumps(list(self.creatures), separators=(",", ":")).encode())
+        for side, index in self.moves:
+            if not 0 <= index <= MAX_ABILITY_INDEX:
+                raise ReplayError(f"Ability index {index} does not fit a replay byte")
+        parts = [HEADER.pack(MAGIC, VERSION, self.seed, len(creatures), len(self.moves), self.interval),
+                 creatures,
+                 bytes(side << 7 | index for side, index in self.moves)]
+        parts.extend(KEYFRAME.pack(*k) for k in self.keyframes)
+        return b"".join(parts)
+
+    @classmethod
+    def decode(cls, data):
+        """Raises ReplayError if data is not a replay this version can read."""
+        if len(data) < HEADER.size:
+            raise ReplayError("Truncated replay header")
+        magic, version, seed, creatures_len, move_count, interval = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ReplayError(f"Not a version {VERSION} replay")
+        offset = HEADER.size
+        try:
+            creatures = tuple(json.loads(zlib.decompress(data[offset:offset + creatures_len])))
+        except (zlib.error, ValueError) as e:
+            raise ReplayError(f"Bad creature block: {e}")
+        offset += creatures_len
+        moves = [(b >> 7, b & MAX_ABILITY_INDEX) for b in data[offset:offset + move_count]]
+        offset += move_count
+        count = move_count // interval if interval else 0
+        if len(data) != offset + count * KEYFRAME.size or len(moves) != move_count:
+            raise ReplayError("Replay length does not match its header")
+        keyframes = [KEYFRAME.unpack_from(data, offset + i * KEYFRAME.size) for i in range(count)]
+        return cls(seed, creatures, moves, interval, keyframes)
+
+
+class ReplayPlayer:
+    """Steps a Replay through a fresh Battle; seek() uses the keyframes."""
+
+    def __init__(self, replay, keyframes=True):
+        self.replay = replay
+        self.use_keyframes = keyframes
+        self.reset()
+
+    def reset(self):
+        player, enemy = self.replay.creatures
+        self.battle = Battle(Combatant.from_dict(player), Combatant.from_dict(enemy), self.replay.seed)
+        self.sides = (self.battle.player, self.battle.enemy)
+        self.profiles = BattleState.from_battle(self.battle).profiles
+        self.position = 0
+
+    def __len__(self):
+        return len(self.replay.moves)
+
+    def state(self):
+        """The battle as a BattleState, with the side to play the next move to move."""
+        return BattleState.from_battle(self.battle, self.next_side(), self.profiles)
+
+    def next_side(self):
+        if self.position < len(self.replay.moves):
+            return self.replay.moves[self.position][0]
+        return 1 - self.replay.moves[-1][0] if self.replay.moves else 0
+
+    def step(self):
+        """Apply the next move; returns its damage, or None at the end."""
+        if self.position >= len(self.replay.moves):
+            return None
+        side, index = self.replay.moves[self.position]
+        self.position += 1
+        return self.battle.apply_attack(self.sides[side], self.sides[1 - side], index)
+
+    def seek(self, position):
+        """Put the battle in the state after ``position`` moves."""
+        position = max(0, min(position, len(self.replay.moves)))
+        index = 0
+        if self.use_keyframes:
+            index = min(position // self.replay.interval, len(self.replay.keyframes))
+        start = index * self.replay.interval
+        if position < self.position or start > self.position:
+            self.reset()
+            if index:
+                self.restore(index)
+        while self.position < position:
+            self.step()
+
+    def restore(self, index):
+        self.position = index * self.replay.interval
+        state = self.state()
+        frame = self.replay.keyframes[index - 1]
+        for side in (0, 1):
+            multipliers, turns = frame[4 + side * 3:7 + side * 3], frame[10 + side * 3:13 + side * 3]
+            state.set_side(side, (frame[side * 2], frame[side * 2 + 1],
+                                  multipliers[0], turns[0], multipliers[1], turns[1], turns[2]))
+        state.values[WINNER] = 1 if frame[0] <= 0 else 0 if frame[2] <= 0 else NO_WINNER
+        state.apply_to(self.battle)
+
+
+def keyframe(state):
+    """A BattleState's fields in KEYFRAME order."""
+    p, e = state.side(0), state.side(1)
+    return (p[HP], p[ENERGY], e[HP], e[ENERGY],
+            p[ATK_MULT], p[DEF_MULT], 1.0, e[ATK_MULT], e[DEF_MULT], 1.0,
+            p[ATK_TURNS], p[DEF_TURNS], p[STUN_TURNS], e[ATK_TURNS], e[DEF_TURNS], e[STUN_TURNS])
+
+
+def save(battle, path):
+    with open(path, "wb") as f:
+        f.write(Replay.from_battle(battle).encode())
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return Replay.decode(f.read())
+
+
+def record_battle(seed, max_turns=200):
+    """
+    A reproducible offline battle: both creatures and every choice come
+    from one seed. Sides alternate as in BattleScreen, each picking its
+    ability the way Battle.enemy_turn does.
+    """
+    from creatures import Creature
+    rng = random.Random(seed)
+    player, enemy = Creature(rng=rng), Creature(rng=rng)
+    battle = Battle(Combatant.from_dict(player.to_dict()), Combatant.from_dict(enemy.to_dict()), seed)
+    sides = (battle.player, battle.enemy)
+    for turn in range(max_turns):
+        attacker = sides[turn % 2]
+        battle.apply_attack(attacker, sides[1 - turn % 2], battle.rng.randint(0, len(attacker.abilities) - 1))
+        if battle.battle_over:
+            break
+    return battle
+
+
+def benchmark(battles=2000, seed=1):
+    """
+    Record seeded battles, round-trip them through the binary format and
+    re-simulate them, checking every final state against the original.
+    """
+    recorded = [record_battle(seed + i) for i in range(battles)]
+    blobs = [Replay.from_battle(b).encode() for b in recorded]
+    start = time.perf_counter()
+    replays = [Replay.decode(blob) for blob in blobs]
+    decoded = time.perf_counter() - start
+    start = time.perf_counter()
+    players = []
+    for r in replays:
+        player = ReplayPlayer(r)
+        while player.step() is not None:
+            pass
+        players.append(player)
+    elapsed = time.perf_counter() - start
+    mismatches = sum(1 for b, p in zip(recorded, players)
+                     if (b.player.current_hp, b.player.energy, b.enemy.current_hp, b.enemy.energy) != keyframe(p.state())[:4]
+                     or b.winner != p.battle.winner)
+    moves = sum(len(r.moves) for r in replays)
+    start = time.perf_counter()
+    rng = random.Random(seed)
+    for player in players:
+        player.seek(rng.randint(0, len(player)))
+    seek = (time.perf_counter() - start) / len(players)
+    return {
+        "battles": battles,
+        "moves": moves,
+        "bytes_per_battle": sum(map(len, blobs)) / battles,
+        "decode_us": decoded / battles * 1e6,
+        "turns_per_sec": moves / elapsed,
+        "seek_us": seek * 1e6,
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or benchmark battle replays")
+    parser.add_argument("path", nargs="?", help="replay file to play")
+    parser.add_argument("--seek", type=int, help="show the state after this many moves")
+    parser.add_argument("--bench", type=int, metavar="N", help="record and replay N seeded battles")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.bench:
+        r = benchmark(args.bench, args.seed)
+        print(f"{r['battles']} battles, {r['moves']} moves, {r['bytes_per_battle']:.0f} bytes/replay, "
+              f"decode {r['decode_us']:.1f} us/replay")
+        print(f"Re-simulation: {r['turns_per_sec']:,.0f} turns/s; random seek {r['seek_us']:.1f} us; "
+              f"{r['mismatches']} final states differ from the recording")
+        return
+    if not args.path:
+        parser.error("give a replay file or --bench")
+    replay = load(args.path)
+    player = ReplayPlayer(replay)
+    names = [c["creature_type"] for c in replay.creatures]
+    print(f"Seed {replay.seed}: {names[0]} vs {names[1]}, {len(replay.moves)} moves")
+    if args.seek is not None:
+        player.seek(args.seek)
+        p, e = player.state().side(0), player.state().side(1)
+        print(f"After {player.position} moves: HP {p[HP]:g} / {e[HP]:g}, energy {p[ENERGY]:g} / {e[ENERGY]:g}")
+        return
+    seen = player.battle.events.next_seq - 1
+    while player.position < len(player):
+        player.step()
+        print(f"{player.position:>4}: {player.battle.message}")
+        for event in player.battle.events.since(seen):
+            if event.kind in (EFFECT, HEAL, FAINT):
+                print(f"      {format_event(event)}")
+        seen = player.battle.events.next_seq - 1
+    if player.battle.winner:
+        print(f"Winner: {names[0 if player.battle.winner == 'player' else 1]}")
+
+
+if __name__ == "__main__":
+    main()
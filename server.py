@@ -1,108 +1,1163 @@
 # server.py
+import argparse
+import asyncio
+import base64
+import json
+import multiprocessing
+import os
+import secrets
 import socket
 import threading
-import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from ai import SearchAI
+from broker import (BROKER_SOCKET, BrokerLink, bind_unix_socket, handoff_socket_path, remove_unix_socket,
+                    run_broker)
+from creatures import Creature
+from config import (BOT_BACKFILL_WAIT, BOT_MOVE_DELAY, HEARTBEAT_INTERVAL, HEARTBEAT_TIMEOUT, MATCH_TICK_INTERVAL, RESUME_GRACE,
+                    MAX_CREATURE_LEVEL, ROOM_EVENT_BUFFER, TOURNAMENT_MATCH_TIMEOUT, TOURNAMENT_SIGNUP, TOURNAMENT_SIZE)
+from log import SERVER_FORMAT, get_logger, setup_logging, shutdown_logging
+from matchmaking import MatchmakingQueue, Ticket
+from metrics import WAIT_BUCKETS, Counter, Gauge, Histogram, serve_metrics
+from protocol import FrameDecoder, FrameError, encode_frame, encode_message
+from replay import Replay
+from server_battle import ROLES, Combatant, ServerBattle
+from state_sync import battle_snapshot, sync_state
+from tournament import BRACKET, FORMATS, Entrant, Tournament, adjudicate, bot_entrants
+
+log = get_logger("server")
 
 HOST = 'localhost'
 PORT = 9999
-clients = []
-waiting_player = None
+MAX_CONNECTIONS = 20000      # Hard cap on concurrently open client sockets.
+LISTEN_BACKLOG = 1024
+WRITE_BUFFER_LIMIT = 64 * 1024  # Per-connection transport buffer high-water mark.
+SEND_QUEUE_LIMIT = 256 * 1024  # Unsent bytes at which a connection is dropped.
+STATS_INTERVAL = 60.0  # Seconds between matchmaking stats lines
+HANDOFF_TIMEOUT = 5.0  # Seconds a host worker waits for a matched peer's socket
+WORKER_EXIT_TIMEOUT = 2.0  # Seconds the broker waits for terminated workers before cleaning up
+MAX_SPECTATORS = 500  # Per battle
+BOT_AI_TABLE_SIZE = 4096  # Transposition table entries per server-played seat
+METRICS_HOST = 'localhost'
+METRICS_PORT = 9100  # Sharded workers serve on METRICS_PORT + worker id
 
-def handle_client(conn, addr):
-    global waiting_player
-    print(f"[Server] Client {addr} connected")
-    while True:
+ACTIVE_CONNECTIONS = Gauge("tamagotchi_connections", "Open client connections")
+QUEUE_DEPTH = Gauge("tamagotchi_queue_depth", "Players waiting for an opponent")
+MATCHES_STARTED = Counter("tamagotchi_matches_started_total", "Battles started")
+MOVES_RELAYED = Counter("tamagotchi_moves_relayed_total", "MOVE results broadcast to rooms")
+BYTES_IN = Counter("tamagotchi_bytes_in_total", "Bytes read from clients")
+BYTES_OUT = Counter("tamagotchi_bytes_out_total", "Bytes queued to clients")
+SEND_ERRORS = Counter("tamagotchi_send_errors_total", "Frames dropped because the connection was closing")
+SEND_OVERFLOWS = Counter("tamagotchi_send_overflows_total", "Connections dropped for exceeding SEND_QUEUE_LIMIT")
+SEND_QUEUE_BYTES = Gauge("tamagotchi_send_queue_bytes", "Unsent bytes buffered across all connections")
+SEND_QUEUE_MAX = Gauge("tamagotchi_send_queue_max_bytes", "Largest per-connection unsent backlog")
+MATCH_WAIT = Histogram("tamagotchi_match_wait_seconds", "Time from JOIN_LOBBY to BATTLE_START", WAIT_BUCKETS)
+RELAY_LATENCY = Histogram("tamagotchi_relay_seconds", "Time to process a room message and write it to peers")
+SPECTATORS = Gauge("tamagotchi_spectators", "Connections watching a battle")
+SPECTATORS_DROPPED = Counter("tamagotchi_spectators_dropped_total", "Spectators dropped for falling behind")
+TOURNAMENT_MATCHES = Counter("tamagotchi_tournament_matches_total", "Tournament battles hosted in rooms")
+
+
+class ClientConnection(asyncio.Protocol):
+    """One connected client. Slotted so 10k+ idle lobby connections stay cheap."""
+    __slots__ = ("server", "transport", "addr", "conn_id", "decoder", "initial_data", "handed_off",
+                 "last_seen", "write_paused")
+
+    def __init__(self, server, initial_data=b""):
+        self.server = server
+        self.transport = None
+        self.addr = None
+        self.conn_id = None
+        self.decoder = FrameDecoder()
+        self.initial_data = initial_data  # Bytes already read by a worker that handed us this socket
+        self.handed_off = False
+        self.last_seen = time.monotonic()
+        self.write_paused = False  # Transport buffer is above WRITE_BUFFER_LIMIT
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.addr = transport.get_extra_info("peername")
+        transport.set_write_buffer_limits(high=WRITE_BUFFER_LIMIT)
+        if not self.server.register(self):
+            transport.close()
+            return
+        if self.initial_data:
+            self.data_received(self.initial_data)
+            self.initial_data = b""
+
+    def data_received(self, data):
+        BYTES_IN.inc(len(data))
+        # Any traffic proves the peer is alive; PONG exists for idle peers.
+        self.last_seen = time.monotonic()
+        # One read may carry many pipelined frames, or only part of one.
         try:
-            data = conn.recv(4096)
-            if not data:
+            frames = self.decoder.feed(data)
+        except FrameError as e:
+            log.warning("Error with %s: %s", self.addr, e)
+            self.transport.abort()
+            return
+        for payload in frames:
+            if self.handed_off or self.transport.is_closing():
                 break
-            message = data.decode()
-            msg_obj = json.loads(message)
-
-            if msg_obj["type"] == "JOIN_LOBBY":
-                if waiting_player is None:
-                    # The first client to JOIN_LOBBY
-                    waiting_player = {
-                        "conn": conn,
-                        "addr": addr,
-                        "creature": msg_obj["creature"]
-                    }
-                    print(f"[Server] {addr} is now waiting as player1.")
-                else:
-                    # The second client to JOIN_LOBBY is player2
-                    other_conn = waiting_player["conn"]
-                    other_creature = waiting_player["creature"]
-                    other_addr = waiting_player["addr"]
-
-                    # Construct the messages
-                    start_msg_waiting = {
-                        "type": "BATTLE_START",
-                        "player_creature": other_creature,
-                        "opponent_creature": msg_obj["creature"],
-                        "your_role": "player1",
-                        "current_turn": "player1"
-                    }
-                    start_msg_new = {
-                        "type": "BATTLE_START",
-                        "player_creature": msg_obj["creature"],
-                        "opponent_creature": other_creature,
-                        "your_role": "player2",
-                        "current_turn": "player1"
-                    }
-
-                    # Debug prints
-                    print(f"[Server] Matching {addr} (player2) with {other_addr} (player1).")
-                    print("[Server] SENDING TO PLAYER1:")
-                    print(json.dumps(start_msg_waiting, indent=4))
-                    print("[Server] SENDING TO PLAYER2:")
-                    print(json.dumps(start_msg_new, indent=4))
-
-                    # Send the messages
-                    try:
-                        other_conn.sendall(json.dumps(start_msg_waiting).encode())
-                    except Exception as e:
-                        print(f"[Server] Error sending to {other_addr}: {e}")
-                    try:
-                        conn.sendall(json.dumps(start_msg_new).encode())
-                    except Exception as e:
-                        print(f"[Server] Error sending to {addr}: {e}")
-
-                    waiting_player = None
+            self.server.handle_message(self, payload)
+
+    def connection_lost(self, exc):
+        self.server.disconnect(self)
+
+    def pause_writing(self):
+        # Backpressure: stop reading from a peer that is not reading from us,
+        # so its requests cannot keep growing its own send queue.
+        self.write_paused = True
+        self.transport.pause_reading()
+
+    def resume_writing(self):
+        self.write_paused = False
+        if not self.handed_off:
+            self.transport.resume_reading()
+
+    def send(self, message):
+        self.send_frame(encode_message(message))
+
+    def send_frame(self, frame):
+        """
+        Write an already length-prefixed frame. The transport is this
+        connection's outbound queue: write() never blocks, and what the socket
+        cannot take now is flushed by the event loop as the peer drains it.
+        A peer that lets more than SEND_QUEUE_LIMIT bytes pile up is dropped;
+        a player can RESUME and is sent a state summary instead of the backlog.
+        """
+        transport = self.transport
+        if transport.is_closing():
+            SEND_ERRORS.inc()
+            return
+        if transport.get_write_buffer_size() + len(frame) > SEND_QUEUE_LIMIT:
+            SEND_OVERFLOWS.inc()
+            log.info("Dropping %s: %d bytes unsent", self.addr, transport.get_write_buffer_size())
+            transport.abort()
+            return
+        BYTES_OUT.inc(len(frame))
+        transport.write(frame)
+
+    def send_queue_size(self):
+        return self.transport.get_write_buffer_size() if self.transport else 0
+
+    def close(self):
+        self.transport.close()
+
+
+class BattleRoom:
+    """
+    The connections taking part in one battle, the battle itself and anyone
+    watching it. Battle events carry a sequence number and the most recent
+    ones are kept so a player who reconnects can be replayed what they missed.
+    """
+    __slots__ = ("room_id", "members", "roles", "battle", "tokens", "away", "events", "next_seq",
+                 "snapshots", "spectators", "bot_role", "bot_ai", "on_finish")
+
+    def __init__(self, room_id, members, battle=None, tokens=(), snapshots=None):
+        self.room_id = room_id
+        self.members = members
+        self.roles = {c: role for c, role in zip(members, ROLES)}
+        self.battle = battle
+        self.tokens = {t: role for t, role in zip(tokens, ROLES)}  # session token -> role
+        self.away = {}  # role -> TimerHandle releasing a dropped player's seat
+        self.events = deque(maxlen=ROOM_EVENT_BUFFER)  # (seq, frame)
+        self.next_seq = 1
+        self.snapshots = snapshots  # BATTLE_START snapshots of (player1, player2)
+        self.spectators = []
+        self.bot_role = None  # Seat whose moves the server plays, if any
+        self.bot_ai = None  # SearchAI picking those moves
+        self.on_finish = None  # callback(winning role), called once
+
+    def publish(self, event):
+        """
+        Stamp a battle event with the next seq, buffer it and write it to the
+        players, then to the spectators. It is encoded once; every recipient
+        gets the same bytes.
+        """
+        event["seq"] = self.next_seq
+        frame = encode_message(json.dumps(event))
+        self.events.append((self.next_seq, frame))
+        self.next_seq += 1
+        self.broadcast(frame)
+        self.fan_out(frame)
+
+    def fan_out(self, frame):
+        # A spectator whose transport stopped draining is dropped rather than
+        # buffered for: transport writes never block, so the players are not
+        # held up, but server memory would be.
+        for s in self.spectators:
+            if s.write_paused:
+                if not s.transport.is_closing():
+                    SPECTATORS_DROPPED.inc()
+                    s.transport.abort()
             else:
-                broadcast_to_others(conn, message)
-        except Exception as e:
-            print(f"[Server] Error with {addr}: {e}")
+                s.send_frame(frame)
+
+    def missed_since(self, last_seq):
+        """Buffered frames after last_seq, or None if some fell out of the buffer."""
+        if last_seq + 1 < (self.events[0][0] if self.events else self.next_seq):
+            return None
+        return [frame for seq, frame in self.events if seq > last_seq]
+
+    def broadcast(self, frame):
+        for c in self.members:
+            c.send_frame(frame)
+
+    def relay(self, sender_conn, frame):
+        for c in self.members:
+            if c is not sender_conn:
+                c.send_frame(frame)
+
+
+class LobbyServer:
+    def __init__(self, host=HOST, port=PORT, max_connections=MAX_CONNECTIONS,
+                 worker_id=None, broker_path=BROKER_SOCKET, metrics_port=None, replay_dir=None):
+        """
+        :param worker_id: set when running as one worker of a sharded server;
+                          matchmaking is then delegated to the broker.
+        :param metrics_port: serve metrics (metrics.py) on this port; None disables.
+        :param replay_dir: write a replay (replay.py) of every battle here when
+                           its room closes; None disables.
+        """
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.connections = {}  # conn_id -> ClientConnection
+        self.next_conn_id = 1
+        self.matchmaking = MatchmakingQueue()
+        self.rooms = {}  # connection -> BattleRoom it is playing in
+        self.next_room_id = 1
+        self.server = None
+        self.worker_id = worker_id
+        self.broker_path = broker_path
+        self.broker = None
+        self.broker_queued = set()  # conn_ids with a JOIN outstanding at the broker
+        self.pending_handoffs = {}  # (worker, player) -> (local Ticket, remote seat) awaiting a socket
+        self.early_handoffs = {}  # (worker, player) -> (header, fd) that arrived before our MATCH
+        self.sessions = {}  # session token -> BattleRoom, while the battle's seats are held
+        self.live_rooms = {}  # room_id -> BattleRoom with a battle, until it closes
+        self.watching = {}  # spectator connection -> BattleRoom
+        self.signup = None  # Entrants of the tournament taking sign-ups
+        self.signup_format = BRACKET
+        self.signup_timer = None
+        self.entrants = {}  # connection -> Entrant, from sign-up until eliminated
+        self.pool = None  # ProcessPoolExecutor for simulated tournament battles
+        self.pool_workers = os.cpu_count() or 1
+        self.bot_moves = asyncio.Queue()  # BattleRooms whose server-played seat is due to move
+        self.metrics_port = metrics_port
+        self.replay_dir = replay_dir
+        ACTIVE_CONNECTIONS.set_function(lambda: len(self.connections))
+        QUEUE_DEPTH.set_function(lambda: len(self.broker_queued) if self.broker else len(self.matchmaking))
+        SPECTATORS.set_function(lambda: len(self.watching))
+        SEND_QUEUE_BYTES.set_function(lambda: sum(c.send_queue_size() for c in self.connections.values()))
+        SEND_QUEUE_MAX.set_function(lambda: max((c.send_queue_size() for c in self.connections.values()), default=0))
+
+    def register(self, conn):
+        if len(self.connections) >= self.max_connections:
+            log.warning("Connection limit reached; rejecting %s", conn.addr)
+            return False
+        conn.conn_id = self.next_conn_id
+        self.next_conn_id += 1
+        self.connections[conn.conn_id] = conn
+        log.debug("Client %s connected", conn.addr)
+        return True
+
+    def handle_message(self, conn, payload):
+        try:
+            msg_obj = json.loads(payload)
+        except ValueError as e:
+            log.warning("Bad message from %s: %s", conn.addr, e)
+            return
+        if not isinstance(msg_obj, dict):
+            log.warning("Bad message from %s: not an object", conn.addr)
+            return
+        if msg_obj.get("type") == "PONG":
+            return
+        if msg_obj.get("type") == "JOIN_LOBBY":
+            if "creature" not in msg_obj:
+                log.warning("JOIN_LOBBY without creature from %s", conn.addr)
+                return
+            self.join_lobby(conn, msg_obj["creature"])
+        elif msg_obj.get("type") == "MOVE":
+            self.handle_move(conn, msg_obj)
+        elif msg_obj.get("type") == "RESUME":
+            self.resume_session(conn, msg_obj, payload)
+        elif msg_obj.get("type") == "SPECTATE":
+            self.spectate(conn, msg_obj, payload)
+        elif msg_obj.get("type") == "LIST_BATTLES":
+            self.list_battles(conn)
+        elif msg_obj.get("type") == "TOURNAMENT_JOIN":
+            self.join_tournament(conn, msg_obj)
+        elif msg_obj.get("type") == "LEAVE_BATTLE":
+            # Deliberate forfeit: free the room now rather than after RESUME_GRACE.
+            self.leave_room(conn)
+        else:
+            # Clients only send requests; battle results, endings and winners
+            # come from the room's ServerBattle, so nothing is passed through
+            # to the opponent.
+            log.debug("Unknown message type %r from %s", msg_obj.get("type"), conn.addr)
+            conn.send(json.dumps({"type": "ERROR", "reason": "Unknown message type"}))
+
+    def join_lobby(self, conn, creature):
+        # Runs to completion without awaiting, so two JOIN_LOBBY messages can
+        # never interleave on the event loop and race for the same opponent.
+        if conn in self.entrants:
+            conn.send(json.dumps({"type": "ERROR", "reason": "Entered in a tournament"}))
+            return
+        self.stop_watching(conn)
+        if conn in self.rooms:
+            self.leave_room(conn)
+        try:
+            level = creature_level(creature)
+        except (KeyError, TypeError, ValueError) as e:
+            log.warning("Invalid creature from %s: %r", conn.addr, e)
+            conn.send(json.dumps({"type": "ERROR", "reason": "Invalid creature data"}))
+            return
+        if self.broker is not None:
+            self.broker_queued.add(conn.conn_id)
+            self.broker.join(conn, level, creature)
+            return
+        pair = self.matchmaking.add(conn, level, creature)
+        if pair is None:
+            log.debug("%s is waiting for an opponent (level %s, queue depth %d)",
+                      conn.addr, level, len(self.matchmaking))
+            return
+        self.start_battle(*pair)
+
+    def start_battle(self, first, second, on_finish=None):
+        """
+        :param first: Ticket of the player who waited longer; plays player1.
+        :param second: Ticket of the player who plays player2. Its player may
+                       be None for an opponent the server plays (bot_move).
+        :param on_finish: callback(winning role) once the battle is decided;
+                          set for tournament battles, which skip the queue.
+        :return: the BattleRoom.
+        """
+        # Both sides get one trimmed combat snapshot; after this only
+        # per-turn deltas are sent (see state_sync.py).
+        snapshot_first = battle_snapshot(first.data)
+        snapshot_second = battle_snapshot(second.data)
+        members = [t.player for t in (first, second) if t.player is not None]
+        tokens = tuple(self.new_session_token() for _ in members)
+        start_msg_first = {
+            "type": "BATTLE_START",
+            "player_creature": snapshot_first,
+            "opponent_creature": snapshot_second,
+            "your_role": "player1",
+            "current_turn": "player1",
+            "session": tokens[0]
+        }
+        start_msg_second = {
+            "type": "BATTLE_START",
+            "player_creature": snapshot_second,
+            "opponent_creature": snapshot_first,
+            "your_role": "player2",
+            "current_turn": "player1"
+        }
+        log.debug("Matching %s (player2, level %s) with %s (player1, level %s)",
+                  getattr(second.player, "addr", "bot"), second.level, first.player.addr, first.level)
+        for c in members:
+            # A tournament entrant may still be watching a battle.
+            self.stop_watching(c)
+            if c in self.rooms:
+                self.leave_room(c)
+        battle = ServerBattle(snapshot_first, snapshot_second)
+        room = self.open_room(members, battle, tokens, (snapshot_first, snapshot_second))
+        room.on_finish = on_finish
+        MATCHES_STARTED.inc()
+        if on_finish is None:
+            now = time.monotonic()
+            for t in (first, second):
+                if t.player is not None:
+                    MATCH_WAIT.observe(now - t.enqueued_at)
+        first.player.send(json.dumps(start_msg_first))
+        if second.player is None:
+            room.bot_role = "player2"
+            room.bot_ai = SearchAI(table_size=BOT_AI_TABLE_SIZE)
+        else:
+            start_msg_second["session"] = tokens[1]
+            second.player.send(json.dumps(start_msg_second))
+        return room
+
+    async def matchmaking_loop(self):
+        # Gaps widen over time, so waiting players are re-checked even when
+        # nobody new joins.
+        last_stats = time.monotonic()
+        while True:
+            await asyncio.sleep(MATCH_TICK_INTERVAL)
+            for first, second in self.matchmaking.tick():
+                self.start_battle(first, second)
+            if BOT_BACKFILL_WAIT > 0:
+                # Nobody in range turned up in time: the server plays them.
+                for ticket in self.matchmaking.expire(BOT_BACKFILL_WAIT):
+                    bot = Creature.at_level(ticket.level).to_dict()
+                    self.start_battle(ticket, Ticket(None, ticket.level, bot, time.monotonic()))
+            now = time.monotonic()
+            if now - last_stats >= STATS_INTERVAL:
+                last_stats = now
+                stats = self.matchmaking.stats()
+                log.info("Matchmaking: depth %d, matches %d, wait p50 %.2fs p99 %.2fs",
+                         stats["queue_depth"], stats["matches_made"],
+                         stats["match_wait_p50"], stats["match_wait_p99"])
+
+    async def heartbeat_loop(self, interval=HEARTBEAT_INTERVAL, timeout=HEARTBEAT_TIMEOUT):
+        """
+        PING connections that have gone quiet and reap those that stayed quiet
+        past the timeout, so half-open sockets do not linger in the
+        connection table, rooms or the matchmaking queue.
+        """
+        ping = encode_message(json.dumps({"type": "PING"}))
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for conn in list(self.connections.values()):
+                idle = now - conn.last_seen
+                if idle >= timeout:
+                    log.info("Reaping %s: silent for %.0fs", conn.addr, idle)
+                    # abort() triggers connection_lost -> disconnect(), which
+                    # removes the connection from every structure.
+                    conn.transport.abort()
+                elif idle >= interval:
+                    conn.send_frame(ping)
+
+    def new_session_token(self):
+        # Sharded workers prefix their id so a RESUME landing on another
+        # worker can be forwarded to the one hosting the battle.
+        token = secrets.token_urlsafe(16)
+        return token if self.worker_id is None else f"{self.worker_id}:{token}"
+
+    def open_room(self, members, battle=None, tokens=(), snapshots=None):
+        # Like session tokens, room ids name the worker that hosts them.
+        room_id = str(self.next_room_id) if self.worker_id is None else f"{self.worker_id}:{self.next_room_id}"
+        room = BattleRoom(room_id, members, battle, tokens, snapshots)
+        self.next_room_id += 1
+        for c in members:
+            self.rooms[c] = room
+        for token in tokens:
+            self.sessions[token] = room
+        if battle is not None:
+            self.live_rooms[room_id] = room
+        return room
+
+    def leave_room(self, conn):
+        room = self.rooms.pop(conn, None)
+        if room is None:
+            return
+        room.members = [c for c in room.members if c is not conn]
+        self.close_room(room)
+
+    def close_room(self, room, opponent_left=True):
+        """
+        :param opponent_left: tell the players still in the room that their
+                              opponent left; False when the room closes on
+                              an outcome they have already been sent.
+        """
+        if room.on_finish is not None:
+            # Decided by a player leaving: whoever is still seated wins.
+            seated = [room.roles[c] for c in room.members if c in room.roles]
+            self.finish_room(room, seated[0] if seated else room.bot_role or ROLES[0])
+        left = encode_message(json.dumps({"type": "OPPONENT_LEFT"}))
+        for c in room.members:
+            if opponent_left:
+                c.send_frame(left)
+            del self.rooms[c]
+        room.members = []
+        ended = encode_message(json.dumps({"type": "SPECTATE_ENDED"}))
+        for s in room.spectators:
+            s.send_frame(ended)
+            del self.watching[s]
+        room.spectators = []
+        self.live_rooms.pop(room.room_id, None)
+        for handle in room.away.values():
+            handle.cancel()
+        room.away.clear()
+        for token in room.tokens:
+            self.sessions.pop(token, None)
+        if self.replay_dir is not None and room.battle is not None and room.battle.battle.moves:
+            self.save_replay(room)
+
+    def save_replay(self, room):
+        path = os.path.join(self.replay_dir, f"{room.room_id.replace(':', '-')}.tgr")
+        try:
+            with open(path, "wb") as f:
+                f.write(Replay.from_battle(room.battle.battle).encode())
+        except (OSError, ValueError) as e:
+            log.warning("Could not save replay of room %s: %s", room.room_id, e)
+
+    def detach(self, room, conn):
+        """Take conn out of its room but keep its seat; returns the seat's role."""
+        del self.rooms[conn]
+        room.members = [c for c in room.members if c is not conn]
+        return room.roles.pop(conn)
+
+    def suspend_seat(self, room, conn):
+        """A player dropped mid-battle: hold their seat for RESUME_GRACE seconds."""
+        role = self.detach(room, conn)
+        if not room.members and room.away:
+            # Both players are gone.
+            self.close_room(room)
+            return
+        room.away[role] = asyncio.get_event_loop().call_later(RESUME_GRACE, self.release_seat, room, role)
+        room.broadcast(encode_message(json.dumps({"type": "OPPONENT_DISCONNECTED", "grace": RESUME_GRACE})))
+
+    def release_seat(self, room, role):
+        if room.away.pop(role, None) is not None:
+            log.debug("Room %s: %s did not resume in time", room.room_id, role)
+            self.close_room(room)
+
+    def resume_session(self, conn, msg_obj, payload):
+        """
+        RESUME {"token", "last_seq"}: put a reconnected player back in their
+        seat, then replay the battle events they missed, or send the current
+        state if those have already left the room's buffer.
+        """
+        token = str(msg_obj.get("token", ""))
+        worker, sep, _ = token.partition(":")
+        if self.broker is not None and sep and worker != str(self.worker_id):
+            asyncio.ensure_future(self.forward_to_worker(conn, int(worker), payload, "RESUME_FAILED"))
+            return
+        room = self.sessions.get(token)
+        if room is None or conn in self.rooms:
+            conn.send(json.dumps({"type": "RESUME_FAILED", "reason": "Session expired"}))
+            return
+        role = room.tokens[token]
+        for old, old_role in list(room.roles.items()):
+            if old_role == role:
+                # The old socket died without us noticing yet.
+                self.detach(room, old)
+                old.transport.abort()
+        handle = room.away.pop(role, None)
+        if handle is not None:
+            handle.cancel()
+        self.leave_matchmaking(conn)
+        room.members.append(conn)
+        room.roles[conn] = role
+        self.rooms[conn] = room
+        battle = room.battle
+        resumed = {"type": "RESUMED", "your_role": role, "current_turn": battle.current_turn,
+                   "seq": room.next_seq - 1}
+        try:
+            missed = room.missed_since(int(msg_obj.get("last_seq", 0)))
+        except (TypeError, ValueError):
+            missed = None
+        if missed is None:
+            resumed["state"] = {r: sync_state(battle.combatant(r)) for r in ROLES}
+            if battle.battle.battle_over:
+                resumed["winner"] = "player1" if battle.battle.winner == "player" else "player2"
+        conn.send(json.dumps(resumed))
+        for frame in missed or ():
+            conn.send_frame(frame)
+        log.debug("Room %s: %s resumed, replayed %d events", room.room_id, role, len(missed or ()))
+        room.relay(conn, encode_message(json.dumps({"type": "OPPONENT_RESUMED"})))
+
+    def spectate(self, conn, msg_obj, payload):
+        """
+        SPECTATE {"room": id}, or without a room to watch any live battle.
+        The spectator gets SPECTATE_START with both creatures and the current
+        state, then the same MOVE_RESULT frames the players get.
+        """
+        self.stop_watching(conn)
+        if conn in self.rooms:
+            conn.send(json.dumps({"type": "ERROR", "reason": "Already in a battle"}))
+            return
+        room_id = msg_obj.get("room")
+        if room_id is None:
+            room = next((r for r in self.live_rooms.values() if not r.battle.battle.battle_over), None)
+        else:
+            room_id = str(room_id)
+            worker, sep, _ = room_id.partition(":")
+            if self.broker is not None and sep and worker != str(self.worker_id):
+                asyncio.ensure_future(self.forward_to_worker(conn, int(worker), payload, "ERROR"))
+                return
+            room = self.live_rooms.get(room_id)
+        if room is None or room.battle.battle.battle_over:
+            conn.send(json.dumps({"type": "ERROR", "reason": "No live battle to watch"}))
+            return
+        if len(room.spectators) >= MAX_SPECTATORS:
+            conn.send(json.dumps({"type": "ERROR", "reason": "Too many spectators"}))
+            return
+        self.leave_matchmaking(conn)
+        room.spectators.append(conn)
+        self.watching[conn] = room
+        battle = room.battle
+        conn.send(json.dumps({
+            "type": "SPECTATE_START",
+            "room": room.room_id,
+            "spectator": True,
+            "your_role": "player1",
+            "player_creature": room.snapshots[0],
+            "opponent_creature": room.snapshots[1],
+            "current_turn": battle.current_turn,
+            "state": {r: sync_state(battle.combatant(r)) for r in ROLES},
+            "seq": room.next_seq - 1
+        }))
+
+    def stop_watching(self, conn):
+        room = self.watching.pop(conn, None)
+        if room is not None:
+            room.spectators.remove(conn)
+
+    def leave_matchmaking(self, conn):
+        """Drop conn from the local queue and, in sharded mode, its broker ticket."""
+        self.matchmaking.remove(conn)
+        if conn.conn_id in self.broker_queued:
+            self.broker_queued.discard(conn.conn_id)
+            self.broker.leave(conn)
+
+    def list_battles(self, conn, limit=50):
+        """BATTLE_LIST of live battles hosted by this server (or worker)."""
+        battles = []
+        for room in self.live_rooms.values():
+            if room.battle.battle.battle_over:
+                continue
+            battles.append({"room": room.room_id,
+                            "creatures": [s["creature_type"] for s in room.snapshots],
+                            "levels": [s.get("level", 1) for s in room.snapshots],
+                            "spectators": len(room.spectators)})
+            if len(battles) >= limit:
+                break
+        conn.send(json.dumps({"type": "BATTLE_LIST", "battles": battles}))
+
+    def handle_move(self, conn, msg_obj):
+        """Apply a MOVE to the room's authoritative battle and broadcast the result."""
+        room = self.rooms.get(conn)
+        if room is None or room.battle is None:
+            return
+        started = time.perf_counter()
+        result, error = room.battle.submit_move(room.roles[conn], msg_obj.get("index"))
+        if error:
+            conn.send(json.dumps({"type": "MOVE_REJECTED", "reason": error}))
+            return
+        self.publish_result(room, result)
+        RELAY_LATENCY.observe(time.perf_counter() - started)
+
+    def publish_result(self, room, result):
+        room.publish(result)
+        MOVES_RELAYED.inc()
+        if "winner" in result:
+            self.finish_room(room, result["winner"])
+            # Everyone has the outcome: free the seats, sessions and event buffer.
+            self.close_room(room, opponent_left=False)
+        elif result["next_turn"] == room.bot_role:
+            asyncio.get_event_loop().call_later(BOT_MOVE_DELAY, self.bot_moves.put_nowait, room)
+
+    async def bot_loop(self):
+        """
+        Play queued bot moves one per event loop pass. Each search takes up
+        to AI_TIME_BUDGET, so socket I/O is served between any two of them
+        however many bot rooms are due at once.
+        """
+        while True:
+            room = await self.bot_moves.get()
+            try:
+                self.bot_move(room)
+            except Exception:
+                # One broken room must not stop every other bot on the server.
+                log.exception("Bot move failed in room %s; closing it", room.room_id)
+                if self.live_rooms.get(room.room_id) is room:
+                    self.close_room(room)
+            await asyncio.sleep(0)
+
+    def bot_move(self, room):
+        """Play the search AI's move for the room's server-played seat."""
+        battle = room.battle
+        if (self.live_rooms.get(room.room_id) is not room or battle.battle.battle_over
+                or battle.current_turn != room.bot_role):
+            return
+        legal = battle.legal_moves(room.bot_role)
+        if not legal:
+            # Out of energy: the bot concedes.
+            self.finish_room(room, ROLES[1] if room.bot_role == ROLES[0] else ROLES[0])
+            self.close_room(room)
+            return
+        index = room.bot_ai.choose(battle.battle, battle.combatant(room.bot_role))
+        result, _ = battle.submit_move(room.bot_role, index)
+        self.publish_result(room, result)
+
+    def finish_room(self, room, winner):
+        on_finish, room.on_finish = room.on_finish, None
+        if on_finish is not None:
+            on_finish(winner)
+
+    def disconnect(self, conn):
+        if conn.conn_id is None or self.connections.pop(conn.conn_id, None) is None:
+            return
+        if conn.handed_off:
+            return
+        log.debug("Client %s disconnected", conn.addr)
+        self.stop_watching(conn)
+        entrant = self.entrants.pop(conn, None)
+        if entrant is not None and self.signup is not None and entrant in self.signup:
+            self.signup.remove(entrant)
+        room = self.rooms.get(conn)
+        if room is not None and room.tokens and not room.battle.battle.battle_over:
+            self.suspend_seat(room, conn)
+        else:
+            self.leave_room(conn)
+        self.leave_matchmaking(conn)
+        conn.close()
+
+    def describe_send_queues(self, limit=20):
+        """Text report of the connections with the deepest send queues."""
+        conns = sorted(self.connections.values(), key=lambda c: c.send_queue_size(), reverse=True)
+        lines = [f"{len(self.connections)} connections; deepest send queues (bytes):"]
+        for c in conns[:limit]:
+            room = self.rooms.get(c) or self.watching.get(c)
+            where = "lobby" if room is None else f"room {room.room_id}"
+            lines.append(f"{c.send_queue_size():>9} {c.addr} {where}{' paused' if c.write_paused else ''}")
+        return "\n".join(lines) + "\n"
+
+    # -- tournaments -----------------------------------------------------
+
+    def join_tournament(self, conn, msg_obj):
+        """
+        TOURNAMENT_JOIN {"creature", "name", "format"}: sign up for the next
+        tournament. It starts once TOURNAMENT_SIZE players have joined or
+        TOURNAMENT_SIGNUP seconds after the first did, with bots filling the
+        empty places. The first sign-up picks the format.
+        """
+        room = self.rooms.get(conn)
+        if conn in self.entrants or (room is not None and not room.battle.battle.battle_over):
+            conn.send(json.dumps({"type": "ERROR", "reason": "Already in a battle or tournament"}))
+            return
+        creature = msg_obj.get("creature")
+        try:
+            creature_level(creature)
+        except (KeyError, TypeError, ValueError) as e:
+            log.warning("Invalid tournament creature from %s: %r", conn.addr, e)
+            conn.send(json.dumps({"type": "ERROR", "reason": "Invalid creature data"}))
+            return
+        self.stop_watching(conn)
+        self.leave_matchmaking(conn)
+        loop = asyncio.get_event_loop()
+        if self.signup is None:
+            self.signup = []
+            self.signup_format = msg_obj.get("format") if msg_obj.get("format") in FORMATS else BRACKET
+            self.signup_timer = loop.call_later(TOURNAMENT_SIGNUP, self.start_tournament)
+        entrant = Entrant(len(self.signup), str(msg_obj.get("name") or f"Player {len(self.signup) + 1}")[:32],
+                          creature, conn)
+        self.signup.append(entrant)
+        self.entrants[conn] = entrant
+        conn.send(json.dumps({"type": "TOURNAMENT_JOINED", "format": self.signup_format,
+                              "entrants": len(self.signup), "size": TOURNAMENT_SIZE,
+                              "starts_in": max(0.0, self.signup_timer.when() - loop.time())}))
+        if len(self.signup) >= TOURNAMENT_SIZE:
+            self.start_tournament()
+
+    def start_tournament(self):
+        entrants, self.signup = self.signup, None
+        self.signup_timer.cancel()
+        if not entrants:
+            return
+        for i, entrant in enumerate(entrants):
+            entrant.entrant_id = i
+        entrants += bot_entrants(TOURNAMENT_SIZE - len(entrants), len(entrants))
+        tournament = Tournament(entrants, self.signup_format, self.tournament_pool(), self.play_tournament_match,
+                                workers=self.pool_workers)
+        tournament.on_round = lambda round_no, played: self.tournament_round(tournament, round_no, played)
+        asyncio.ensure_future(self.run_tournament(tournament))
+
+    def tournament_pool(self):
+        # Spawned, not forked: this process runs an event loop and threads.
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(self.pool_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.pool
+
+    async def run_tournament(self, tournament):
+        humans = [e for e in tournament.entrants if not e.is_bot]
+        log.info("Tournament (%s) starting: %d entrants, %d human",
+                 tournament.fmt, len(tournament.entrants), len(humans))
+        try:
+            standings = await tournament.run()
+        except Exception:
+            log.exception("Tournament failed")
+            standings = tournament.standings()
+        finally:
+            for e in humans:
+                if self.entrants.get(e.conn) is e:
+                    del self.entrants[e.conn]
+        self.announce(tournament, "TOURNAMENT_OVER", standings)
+        log.info("Tournament (%s) won by %s", tournament.fmt, standings[0].name)
+
+    def tournament_round(self, tournament, round_no, played):
+        if tournament.fmt == BRACKET:
+            # Knocked-out players are free to use the lobby again.
+            for first, second, winner in played:
+                loser = second if winner is first else first
+                if not loser.is_bot and self.entrants.get(loser.conn) is loser:
+                    del self.entrants[loser.conn]
+        self.announce(tournament, "TOURNAMENT_ROUND", tournament.standings(), round_no)
+
+    def announce(self, tournament, kind, standings, round_no=None, top=10):
+        table = [[e.name, e.wins, e.losses] for e in standings[:top]]
+        for place, e in enumerate(standings, 1):
+            if e.is_bot or e.conn.conn_id not in self.connections:
+                continue
+            e.conn.send(json.dumps({"type": kind, "round": round_no or tournament.round_no, "standings": table,
+                                    "place": place, "wins": e.wins, "losses": e.losses}))
+
+    async def play_tournament_match(self, first, second):
+        """
+        Tournament.play_live: host a battle with at least one human entrant in
+        an ordinary room; a bot entrant's moves are played by the server.
+        :return: the winning Entrant.
+        """
+        if first.is_bot:
+            first, second = second, first
+        for entrant, other in ((first, second), (second, first)):
+            if not entrant.is_bot and entrant.conn.conn_id not in self.connections:
+                return other  # Walkover
+        result = asyncio.get_event_loop().create_future()
+
+        def finish(role):
+            if not result.done():
+                result.set_result(first if role == ROLES[0] else second)
+
+        now = time.monotonic()
+        # Levels were checked on sign-up (creature_level in join_tournament).
+        room = self.start_battle(Ticket(first.conn, first.creature.get("level", 1), first.creature, now),
+                                 Ticket(second.conn, second.creature.get("level", 1), second.creature, now),
+                                 on_finish=finish)
+        TOURNAMENT_MATCHES.inc()
+        try:
+            return await asyncio.wait_for(asyncio.shield(result), TOURNAMENT_MATCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            log.info("Room %s: tournament battle timed out; deciding on HP", room.room_id)
+            winner = adjudicate(room.battle)
+            room.publish({"type": "BATTLE_END", "winner": winner, "reason": "timeout"})
+            self.finish_room(room, winner)
+            self.close_room(room, opponent_left=False)
+            return result.result()
+
+    # -- sharded mode ----------------------------------------------------
+
+    def on_broker_match(self, first, second):
+        """
+        The broker paired two seats, at least one of them on this worker.
+        The first seat's worker hosts the battle; if the second seat lives
+        elsewhere, its worker hands the client socket over to the host.
+        """
+        for seat in (first, second):
+            if seat["worker"] == self.worker_id:
+                self.broker_queued.discard(seat["player"])
+        if first["worker"] == self.worker_id:
+            first_ticket = self.seat_ticket(first)
+            if second["worker"] == self.worker_id:
+                second_ticket = self.seat_ticket(second)
+                if first_ticket and second_ticket:
+                    self.start_battle(first_ticket, second_ticket)
+                else:
+                    self.requeue(first_ticket or second_ticket)
+                return
+            key = (second["worker"], second["player"])
+            early = self.early_handoffs.pop(key, None)
+            if early is not None:
+                header, fd = early
+                if fd is None:
+                    self.requeue(first_ticket)
+                else:
+                    asyncio.ensure_future(self.accept_handoff(fd, header, (first_ticket, second)))
+                return
+            self.pending_handoffs[key] = (first_ticket, second)
+            asyncio.get_event_loop().call_later(HANDOFF_TIMEOUT, self.expire_handoff, key)
+        else:
+            asyncio.ensure_future(self.hand_off(self.connections.get(second["player"]), first["worker"], second))
+
+    def on_broker_lost(self):
+        # The broker is the parent process; without it this worker is orphaned.
+        self.server.close()
+
+    def seat_ticket(self, seat):
+        conn = self.connections.get(seat["player"])
+        if conn is None or conn.transport.is_closing():
+            return None
+        # Backdate by the time already spent in the broker's queue.
+        return Ticket(conn, seat["level"], seat["creature"], time.monotonic() - seat.get("waited", 0.0))
+
+    def requeue(self, ticket):
+        if ticket is not None and not ticket.player.transport.is_closing():
+            self.join_lobby(ticket.player, ticket.data)
+
+    async def hand_off(self, conn, host_worker, seat):
+        """Pass a matched client's socket to the worker hosting its battle."""
+        header = {"worker": self.worker_id, "player": seat["player"], "creature": seat["creature"]}
+        if conn is None or conn.transport.is_closing():
+            header["abort"] = True
+            fd = None
+        else:
+            conn.transport.pause_reading()
+            conn.handed_off = True
+            header["pending"] = base64.b64encode(conn.decoder.take_pending()).decode()
+            fd = os.dup(conn.transport.get_extra_info("socket").fileno())
+        path = handoff_socket_path(self.broker_path, host_worker)
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, send_handoff, path, header, fd)
+        except OSError as e:
+            log.warning("Handoff to worker %s failed: %s", host_worker, e)
+            if fd is not None:
+                conn.handed_off = False
+                conn.transport.resume_reading()
+                self.join_lobby(conn, seat["creature"])
+            return
+        finally:
+            if fd is not None:
+                os.close(fd)
+        if fd is not None:
+            # The host now owns the connection; dropping our descriptor does
+            # not close it because the host holds its own.
+            conn.transport.abort()
+
+    async def forward_to_worker(self, conn, host_worker, payload, failure_type):
+        """
+        Pass a client, together with the message that named another worker's
+        battle (RESUME or SPECTATE), to the worker hosting that battle.
+        """
+        conn.transport.pause_reading()
+        conn.handed_off = True
+        # The host re-reads the message, so it travels back in front of any
+        # bytes already buffered after it.
+        pending = encode_frame(payload) + conn.decoder.take_pending()
+        header = {"worker": self.worker_id, "player": conn.conn_id, "forward": True,
+                  "pending": base64.b64encode(pending).decode()}
+        fd = os.dup(conn.transport.get_extra_info("socket").fileno())
+        path = handoff_socket_path(self.broker_path, host_worker)
+        try:
+            await asyncio.get_event_loop().run_in_executor(None, send_handoff, path, header, fd)
+        except OSError as e:
+            log.warning("Forwarding to worker %s failed: %s", host_worker, e)
+            conn.handed_off = False
+            conn.transport.resume_reading()
+            conn.send(json.dumps({"type": failure_type, "reason": "Battle not found"}))
+            return
+        finally:
+            os.close(fd)
+        # The host worker owns the client now; a JOIN still queued here
+        # would pair an opponent with a socket this worker no longer has.
+        self.leave_matchmaking(conn)
+        conn.transport.abort()
+
+    def adopt_handoff(self, header, fd):
+        """Called on the event loop when another worker hands us a socket."""
+        if header.get("forward"):
+            asyncio.ensure_future(self.accept_handoff(fd, header, None))
+            return
+        key = (header["worker"], header["player"])
+        pending = self.pending_handoffs.pop(key, None)
+        if pending is None and key not in self.early_handoffs:
+            # The broker writes MATCH to both workers independently, so the
+            # peer can act on it and hand the socket over before our copy
+            # arrives. Hold the socket until it does.
+            self.early_handoffs[key] = (header, fd)
+            asyncio.get_event_loop().call_later(HANDOFF_TIMEOUT, self.expire_early_handoff, key)
+            return
+        if fd is None:
+            if pending is not None:
+                self.requeue(pending[0])
+            return
+        asyncio.ensure_future(self.accept_handoff(fd, header, pending))
+
+    async def accept_handoff(self, fd, header, pending):
+        sock = socket.socket(fileno=fd)
+        initial = base64.b64decode(header.get("pending", ""))
+        loop = asyncio.get_event_loop()
+        _, conn = await loop.connect_accepted_socket(lambda: ClientConnection(self, initial), sock=sock)
+        if conn.conn_id is None or header.get("forward"):
+            # A forwarded connection's buffered messages were replayed on connect.
+            return
+        if pending is None:
+            # We gave up waiting; put the player back in the queue.
+            self.join_lobby(conn, header.get("creature", {}))
+            return
+        first_ticket, seat = pending
+        second_ticket = Ticket(conn, seat["level"], seat["creature"], time.monotonic() - seat.get("waited", 0.0))
+        if first_ticket is None or first_ticket.player.transport.is_closing():
+            self.join_lobby(conn, seat["creature"])
+        else:
+            self.start_battle(first_ticket, second_ticket)
+
+    def expire_early_handoff(self, key):
+        early = self.early_handoffs.pop(key, None)
+        if early is not None and early[1] is not None:
+            # No MATCH after all (or it was already given up on): requeue the player.
+            asyncio.ensure_future(self.accept_handoff(early[1], early[0], None))
+
+    def expire_handoff(self, key):
+        pending = self.pending_handoffs.pop(key, None)
+        if pending is not None:
+            log.warning("Handoff %s timed out; requeueing", key)
+            self.requeue(pending[0])
+
+    def listen_for_handoffs(self, loop):
+        sock = bind_unix_socket(handoff_socket_path(self.broker_path, self.worker_id))
+
+        def accept_loop():
+            while True:
+                peer, _ = sock.accept()
+                try:
+                    header, fd = receive_handoff(peer)
+                except (OSError, ValueError) as e:
+                    log.warning("Bad handoff: %s", e)
+                    continue
+                finally:
+                    peer.close()
+                loop.call_soon_threadsafe(self.adopt_handoff, header, fd)
+
+        threading.Thread(target=accept_loop, daemon=True).start()
+
+    async def serve_forever(self, reuse_port=False):
+        loop = asyncio.get_event_loop()
+        self.server = await loop.create_server(
+            lambda: ClientConnection(self), self.host, self.port,
+            backlog=LISTEN_BACKLOG, reuse_port=reuse_port
+        )
+        if self.worker_id is not None:
+            self.listen_for_handoffs(loop)
+            self.broker = BrokerLink(self, self.worker_id, self.broker_path)
+            await self.broker.connect()
+            log.info("Worker %s listening on %s:%s (pid %d)", self.worker_id, self.host, self.port, os.getpid())
+        else:
+            log.info("Listening on %s:%s", self.host, self.port)
+        metrics_server = None
+        if self.metrics_port is not None:
+            metrics_server = await serve_metrics(METRICS_HOST, self.metrics_port,
+                                                 pages={"/connections": self.describe_send_queues})
+            log.info("Metrics on http://%s:%s/metrics", METRICS_HOST, self.metrics_port)
+        tasks = [asyncio.ensure_future(self.matchmaking_loop()),
+                 asyncio.ensure_future(self.heartbeat_loop()),
+                 asyncio.ensure_future(self.bot_loop())]
+        try:
+            async with self.server:
+                await self.server.serve_forever()
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+            if metrics_server is not None:
+                metrics_server.close()
+
+
+def creature_level(creature):
+    """
+    The matchmaking level of a client's Creature.to_dict() payload.
+    Raises KeyError/TypeError/ValueError unless the payload makes a valid
+    Combatant and its level is an int in 1..MAX_CREATURE_LEVEL.
+    """
+    Combatant.from_dict(creature)
+    level = creature.get("level", 1)
+    if type(level) is not int or not 1 <= level <= MAX_CREATURE_LEVEL:
+        raise ValueError(f"Invalid level {level!r}")
+    return level
+
+
+def send_handoff(path, header, fd):
+    """Blocking: connect to a worker's handoff socket and pass ``fd`` (or an abort)."""
+    data = json.dumps(header).encode()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.connect(path)
+        if fd is None:
+            s.sendall(data)
+        else:
+            sent = socket.send_fds(s, [data], [fd])
+            if sent < len(data):
+                s.sendall(data[sent:])
+
+
+def receive_handoff(peer):
+    data, fds, _, _ = socket.recv_fds(peer, 65536, 1)
+    chunks = [data]
+    while True:
+        chunk = peer.recv(65536)
+        if not chunk:
             break
+        chunks.append(chunk)
+    return json.loads(b"".join(chunks)), (fds[0] if fds else None)
 
-    print(f"[Server] Client {addr} disconnected")
-    if waiting_player and waiting_player["conn"] == conn:
-        waiting_player = None
+
+def raise_fd_limit():
+    # Each connection is a file descriptor; lift the soft limit to the hard one.
     try:
-        conn.close()
-    except Exception:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
         pass
 
-def broadcast_to_others(sender_conn, message):
-    for c in clients[:]:
-        if c != sender_conn:
-            try:
-                c.sendall(message.encode())
-            except Exception as e:
-                print("[Server] Error broadcasting:", e)
-                try:
-                    clients.remove(c)
-                except Exception:
-                    pass
+
+def run_worker(worker_id, host, port, broker_path, log_level=None, metrics_port=None, replay_dir=None):
+    # The parent's log listener thread did not survive the fork.
+    setup_logging(log_level, SERVER_FORMAT)
+    if metrics_port is not None:
+        metrics_port += worker_id
+    server = LobbyServer(host, port, worker_id=worker_id, broker_path=broker_path, metrics_port=metrics_port,
+                         replay_dir=replay_dir)
+    try:
+        asyncio.run(server.serve_forever(reuse_port=True))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        shutdown_logging()
+
+
+def run_sharded(workers, host=HOST, port=PORT, broker_path=BROKER_SOCKET, log_level=None, metrics_port=None,
+                replay_dir=None):
+    """
+    Fork ``workers`` processes that all accept on the same port via
+    SO_REUSEPORT, with this process acting as the matchmaking broker.
+    Each worker serves its own metrics on metrics_port + worker id.
+    """
+    broker_sock = bind_unix_socket(broker_path)
+    ctx = multiprocessing.get_context("fork")
+    procs = []
+    for worker_id in range(workers):
+        proc = ctx.Process(target=run_worker,
+                           args=(worker_id, host, port, broker_path, log_level, metrics_port, replay_dir),
+                           name=f"worker-{worker_id}", daemon=True)
+        proc.start()
+        procs.append(proc)
+    try:
+        run_broker(broker_sock, broker_path)
+    finally:
+        for proc in procs:
+            proc.terminate()
+        for proc in procs:
+            proc.join(WORKER_EXIT_TIMEOUT)
+        # Nothing else removes the sockets, and a stale handoff socket makes
+        # forwards to that worker id fail until it is bound again.
+        remove_unix_socket(broker_path)
+        for worker_id in range(workers):
+            remove_unix_socket(handoff_socket_path(broker_path, worker_id))
+
 
 def main():
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((HOST, PORT))
-    server.listen()
-    print(f"[Server] Listening on {HOST}:{PORT}")
-    while True:
-        conn, addr = server.accept()
-        clients.append(conn)
-        threading.Thread(target=handle_client, args=(conn, addr), daemon=True).start()
+    parser = argparse.ArgumentParser(description="Dark Tamagotchi matchmaking server")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes sharing the port (>1 starts a matchmaking broker)")
+    parser.add_argument("--broker-socket", default=BROKER_SOCKET)
+    parser.add_argument("--log-level", help="DEBUG, INFO, WARNING... (default: config.LOG_LEVEL)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT,
+                        help="HTTP port for /metrics on localhost (0 disables)")
+    parser.add_argument("--replay-dir", help="save a replay of every battle in this directory")
+    args = parser.parse_args()
+    setup_logging(args.log_level, SERVER_FORMAT)
+    raise_fd_limit()
+    metrics_port = args.metrics_port or None
+    if args.replay_dir:
+        os.makedirs(args.replay_dir, exist_ok=True)
+    if args.workers > 1:
+        run_sharded(args.workers, args.host, args.port, args.broker_socket, args.log_level, metrics_port,
+                    args.replay_dir)
+        return
+    try:
+        asyncio.run(LobbyServer(args.host, args.port, metrics_port=metrics_port,
+                                replay_dir=args.replay_dir).serve_forever())
+    except KeyboardInterrupt:
+        pass
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,118 @@
+# server_battle.py
+#
+# Authoritative battle state hosted by the server for each room. Clients
+# only send the ability index they want to use; the server validates it
+# against its own copy of both creatures and broadcasts the outcome.
+import math
+from abilities import ability_from_dict, check_ability
+from battle_system import Battle
+from effects import EffectSlots
+from state_sync import StateTracker
+
+ROLES = ("player1", "player2")
+SERVER_EVENT_BUFFER = 8  # Battle events kept per room; clients get MOVE_RESULTs instead
+
+
+class Combatant:
+    """
+    The combat-relevant part of a Creature, rebuilt from its to_dict()
+    payload. Slotted and free of inventory, mood and timers so thousands of
+    concurrent battles stay cheap; it quacks enough like a Creature for
+    Battle and Ability.apply_effect.
+    """
+    __slots__ = ("creature_type", "max_hp", "current_hp", "attack", "defense", "speed",
+                 "energy", "allowed_tier", "abilities", "effects")
+
+    def __init__(self, creature_type, max_hp, current_hp, attack, defense, speed,
+                 energy, abilities, allowed_tier=1):
+        self.creature_type = creature_type
+        self.max_hp = max_hp
+        self.current_hp = current_hp
+        self.attack = attack
+        self.defense = defense
+        self.speed = speed
+        self.energy = energy
+        self.abilities = abilities
+        self.allowed_tier = allowed_tier
+        self.effects = EffectSlots()
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Raises KeyError/TypeError/ValueError on a malformed payload, including
+        non-finite HP or energy and abilities that fail check_ability.
+        """
+        try:
+            combatant = cls(
+                str(data["creature_type"]),
+                int(data["max_hp"]),
+                float(data["current_hp"]),
+                int(data["attack"]),
+                int(data["defense"]),
+                int(data["speed"]),
+                float(data.get("energy", 100)),
+                [ability_from_dict(a) for a in data["abilities"]],
+                int(data.get("allowed_tier", 1)),
+            )
+        except OverflowError as e:  # int() of an infinite JSON number
+            raise ValueError(str(e))
+        if not (math.isfinite(combatant.current_hp) and math.isfinite(combatant.energy)):
+            raise ValueError("HP and energy must be finite")
+        for ability in combatant.abilities:
+            check_ability(ability)
+        return combatant
+
+    def add_effect(self, effect):
+        self.effects.add(effect)
+
+
+class ServerBattle:
+    """One room's battle. player1 maps to Battle.player, player2 to Battle.enemy."""
+    __slots__ = ("battle", "current_turn", "tracker")
+
+    def __init__(self, player1_data, player2_data, seed=None):
+        self.battle = Battle(Combatant.from_dict(player1_data), Combatant.from_dict(player2_data), seed,
+                             SERVER_EVENT_BUFFER)
+        self.current_turn = "player1"
+        self.tracker = StateTracker({"player1": self.battle.player, "player2": self.battle.enemy})
+
+    def combatant(self, role):
+        return self.battle.player if role == "player1" else self.battle.enemy
+
+    def legal_moves(self, role):
+        """Indices of the abilities ``role`` can afford right now."""
+        attacker = self.combatant(role)
+        return [i for i in range(len(attacker.abilities)) if self.battle.validate_move(attacker, i) is None]
+
+    def submit_move(self, role, ability_index):
+        """
+        Validate and apply a MOVE from ``role``.
+        :return: (result_event, None) on success or (None, reason) if rejected.
+        """
+        battle = self.battle
+        if battle.battle_over:
+            return None, "Battle is over!"
+        if role != self.current_turn:
+            return None, "Not your turn!"
+        attacker = self.combatant(role)
+        opponent_role = ROLES[1] if role == ROLES[0] else ROLES[0]
+        error = battle.validate_move(attacker, ability_index)
+        if error:
+            return None, error
+        stunned = attacker.effects.stunned
+        damage = battle.apply_attack(attacker, self.combatant(opponent_role), ability_index)
+        result = {
+            "type": "MOVE_RESULT",
+            "actor": role,
+            "index": ability_index,
+            "damage": damage,
+            "delta": self.tracker.delta(),
+        }
+        if stunned:
+            result["stunned"] = True
+        if battle.battle_over:
+            result["winner"] = "player1" if battle.winner == "player" else "player2"
+        else:
+            self.current_turn = opponent_role
+        result["next_turn"] = self.current_turn
+        return result, None
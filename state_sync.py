@@ -0,0 +1,118 @@
+# state_sync.py
+#
+# Battle state sync: BATTLE_START carries one combat snapshot of each
+# creature, and every MOVE_RESULT after that carries only the fields that
+# changed, keyed by role:
+#     "delta": {"player2": {"hp": 31}, "player1": {"en": 70.0}}
+import json
+
+# Creature fields a battle needs; everything else in to_dict() (inventory,
+# hunger, age, special ability text...) stays out of the battle protocol.
+SNAPSHOT_FIELDS = ("creature_type", "level", "xp", "evolution_stage", "max_hp", "current_hp",
+                   "attack", "defense", "speed", "energy", "abilities")
+
+# Per-turn synced fields: wire key -> creature attribute. "fx" carries the
+# EffectSlots as a list of Effect.to_dict() records.
+SYNC_FIELDS = {"hp": "current_hp", "en": "energy", "fx": "effects"}
+
+
+def battle_snapshot(creature_data):
+    """Trim a Creature.to_dict() payload down to what a battle uses."""
+    return {k: creature_data[k] for k in SNAPSHOT_FIELDS if k in creature_data}
+
+
+def sync_state(creature):
+    state = {}
+    for key, attr in SYNC_FIELDS.items():
+        value = getattr(creature, attr)
+        state[key] = value.to_list() if key == "fx" else value
+    return state
+
+
+def apply_delta(creature, fields):
+    for key, value in fields.items():
+        attr = SYNC_FIELDS.get(key)
+        if key == "fx":
+            creature.effects.load(value)
+        elif attr is not None:
+            setattr(creature, attr, value)
+
+
+class StateTracker:
+    """Remembers what each client last saw and reports only what changed."""
+    __slots__ = ("creatures", "last")
+
+    def __init__(self, creatures):
+        """:param creatures: dict of role -> creature-like object."""
+        self.creatures = creatures
+        self.last = {role: sync_state(c) for role, c in creatures.items()}
+
+    def delta(self):
+        changes = {}
+        for role, creature in self.creatures.items():
+            current = sync_state(creature)
+            previous = self.last[role]
+            fields = {k: v for k, v in current.items() if previous[k] != v}
+            if fields:
+                changes[role] = fields
+                self.last[role] = current
+        return changes
+
+
+def measure_battle_bytes(seed=1, max_turns=200):
+    """
+    Play one server battle between two random creatures and count the bytes
+    the battle protocol sends to one client, once with full to_dict()
+    payloads on BATTLE_START and every result ("before"), and once with a
+    snapshot plus per-turn deltas ("after").
+    """
+    import random
+    from creatures import Creature
+    from server_battle import ServerBattle
+    random.seed(seed)
+    data1, data2 = Creature().to_dict(), Creature().to_dict()
+    battle = ServerBattle(battle_snapshot(data1), battle_snapshot(data2))
+
+    def size(msg):
+        return len(json.dumps(msg).encode())
+
+    before = [size({"type": "BATTLE_START", "player_creature": data1, "opponent_creature": data2,
+                    "your_role": "player1", "current_turn": "player1"})]
+    after = [size({"type": "BATTLE_START", "player_creature": battle_snapshot(data1),
+                   "opponent_creature": battle_snapshot(data2), "your_role": "player1",
+                   "current_turn": "player1"})]
+    turns = 0
+    while not battle.battle.battle_over and turns < max_turns:
+        role = battle.current_turn
+        attacker = battle.combatant(role)
+        legal = [i for i in range(len(attacker.abilities)) if not battle.battle.validate_move(attacker, i)]
+        if not legal:
+            break
+        result, _ = battle.submit_move(role, random.choice(legal))
+        turns += 1
+        after.append(size(result))
+        full = dict(result)
+        del full["delta"]
+        full["player1"] = dict(data1, current_hp=battle.battle.player.current_hp,
+                               energy=battle.battle.player.energy,
+                               active_effects=battle.battle.player.effects.to_list())
+        full["player2"] = dict(data2, current_hp=battle.battle.enemy.current_hp,
+                               energy=battle.battle.enemy.energy,
+                               active_effects=battle.battle.enemy.effects.to_list())
+        before.append(size(full))
+    return {
+        "turns": turns,
+        "before_total": sum(before),
+        "after_total": sum(after),
+        "before_per_turn": sum(before[1:]) / max(1, turns),
+        "after_per_turn": sum(after[1:]) / max(1, turns),
+        "before_min_turn": min(before[1:], default=0),
+        "after_max_turn": max(after[1:], default=0),
+    }
+
+
+if __name__ == "__main__":
+    r = measure_battle_bytes()
+    print(f"{r['turns']} turns: full payloads {r['before_total']} bytes "
+          f"({r['before_per_turn']:.0f}/turn), snapshot+deltas {r['after_total']} bytes "
+          f"({r['after_per_turn']:.0f}/turn)")
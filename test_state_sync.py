@@ -0,0 +1,40 @@
+# test_state_sync.py
+#
+# Bytes the battle protocol sends per battle, full payloads ("before")
+# against one snapshot plus per-turn deltas ("after"); see state_sync.py.
+#   python -m pytest test_state_sync.py
+from state_sync import StateTracker, measure_battle_bytes
+
+# A MOVE_RESULT carries at most hp, energy and three effect slots per
+# role, whatever the creatures' abilities, inventory or history.
+MAX_DELTA_BYTES = 400
+SEEDS = range(50)
+
+
+def test_delta_bytes_per_turn_are_bounded():
+    for seed in SEEDS:
+        r = measure_battle_bytes(seed)
+        assert r["turns"] > 0
+        assert r["after_max_turn"] <= MAX_DELTA_BYTES, seed
+
+
+def test_deltas_are_well_below_full_payloads():
+    for seed in SEEDS:
+        r = measure_battle_bytes(seed)
+        assert r["after_max_turn"] * 2 < r["before_min_turn"], seed
+        assert r["after_total"] * 2 < r["before_total"], seed
+
+
+def test_same_seed_same_bytes():
+    assert measure_battle_bytes(7) == measure_battle_bytes(7)
+
+
+def test_unchanged_creatures_send_nothing():
+    from creatures import Creature
+    from server_battle import Combatant
+    creature = Combatant.from_dict(Creature().to_dict())
+    tracker = StateTracker({"player1": creature})
+    assert tracker.delta() == {}
+    creature.current_hp -= 5
+    assert tracker.delta() == {"player1": {"hp": creature.current_hp}}
+    assert tracker.delta() == {}
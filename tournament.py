@@ -0,0 +1,241 @@
+# tournament.py
+#
+# Tournaments over registered creatures: a single-elimination bracket or a
+# round robin. Every pairing in a round is played at the same time. Battles
+# between two bots are simulated in a process pool, in chunks of at least
+# MIN_CHUNK battles (smaller rounds are simulated inline, where a pool round
+# trip would cost more than the battles); battles involving a human are handed to a coroutine supplied by the
+# server, which hosts them in an ordinary battle room.
+import asyncio
+import random
+from battle_state import BattleState
+from config import TOURNAMENT_MAX_TURNS
+from server_battle import ROLES, Combatant
+
+BRACKET = "bracket"
+ROUND_ROBIN = "round_robin"
+FORMATS = (BRACKET, ROUND_ROBIN)
+MIN_CHUNK = 32  # Battles per pool task; ~2.5 ms of simulation against ~1 ms of IPC
+
+
+class Entrant:
+    __slots__ = ("entrant_id", "name", "creature", "conn", "wins", "losses")
+
+    def __init__(self, entrant_id, name, creature, conn=None):
+        """
+        :param creature: Creature.to_dict() payload.
+        :param conn: the player's connection, or None for a bot.
+        """
+        self.entrant_id = entrant_id
+        self.name = name
+        self.creature = creature
+        self.conn = conn
+        self.wins = 0
+        self.losses = 0
+
+    @property
+    def is_bot(self):
+        return self.conn is None
+
+
+def adjudicate(battle):
+    """Role ahead on remaining HP fraction; player1 on a tie."""
+    def share(role):
+        c = battle.combatant(role)
+        return c.current_hp / c.max_hp if c.max_hp else 0.0
+    return max(ROLES, key=share)
+
+
+def simulate_match(first, second, seed, max_turns=TOURNAMENT_MAX_TURNS):
+    """
+    Play two creature payloads against each other on the server's battle
+    rules (as a BattleState), each side picking random legal moves.
+    A side with no affordable move forfeits; a battle still running after
+    max_turns goes to whoever has more HP left.
+    :return: "player1" or "player2".
+    """
+    rng = random.Random(seed)
+    state = BattleState.from_creatures(Combatant.from_dict(first), Combatant.from_dict(second))
+    for _ in range(max_turns):
+        legal = state.legal_moves()
+        if not legal:
+            return ROLES[1 - state.turn]
+        state.apply(rng.choice(legal))
+        if state.winner is not None:
+            return ROLES[state.winner]
+    return ROLES[0] if state.hp_share(0) >= state.hp_share(1) else ROLES[1]
+
+
+def simulate_matches(matches):
+    """Pool entry point: simulate_match over a list of (first, second, seed)."""
+    return [simulate_match(first, second, seed) for first, second, seed in matches]
+
+
+def bracket_pairs(entrants):
+    """Adjacent pairs; an odd entrant out gets a bye (paired with None)."""
+    pairs = [(entrants[i], entrants[i + 1]) for i in range(0, len(entrants) - 1, 2)]
+    if len(entrants) % 2:
+        pairs.append((entrants[-1], None))
+    return pairs
+
+
+def round_robin_rounds(entrants):
+    """Circle method: len(entrants) - 1 rounds (one more if odd) where everyone meets once."""
+    players = list(entrants)
+    if len(players) % 2:
+        players.append(None)
+    n = len(players)
+    rounds = []
+    for _ in range(n - 1):
+        rounds.append([(players[i], players[n - 1 - i]) for i in range(n // 2)])
+        players.insert(1, players.pop())
+    return rounds
+
+
+class Tournament:
+    """
+    :param executor: concurrent.futures executor for bot-vs-bot battles
+        (None simulates them inline).
+    :param workers: the executor's worker count; a round is split into at
+        most ``chunks_per_round`` (default 2 per worker) tasks.
+    :param play_live: coroutine function (first, second) -> winning Entrant,
+        for pairings that include a human.
+    :param on_round: callback(round_no, [(first, second, winner)]) after each round.
+    """
+
+    def __init__(self, entrants, fmt=BRACKET, executor=None, play_live=None, on_round=None,
+                 seed=None, workers=1, chunks_per_round=None):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown tournament format {fmt!r}")
+        self.entrants = list(entrants)
+        self.fmt = fmt
+        self.executor = executor
+        self.play_live = play_live
+        self.on_round = on_round
+        self.rng = random.Random(seed)
+        self.chunks_per_round = chunks_per_round or 2 * workers
+        self.results = []  # (round_no, first, second, winner)
+        self.round_no = 0
+
+    async def run(self):
+        """Play the whole tournament; returns the standings."""
+        if self.fmt == BRACKET:
+            alive = list(self.entrants)
+            while len(alive) > 1:
+                alive = await self.play_round(bracket_pairs(alive))
+        else:
+            for pairs in round_robin_rounds(self.entrants):
+                await self.play_round(pairs)
+        return self.standings()
+
+    async def play_round(self, pairs):
+        """Play every pairing at once; returns the winners in pairing order."""
+        self.round_no += 1
+        winners = [None] * len(pairs)
+        simulated, live = [], []
+        for i, (first, second) in enumerate(pairs):
+            if second is None or first is None:
+                winners[i] = first or second  # Bye
+            elif first.is_bot and second.is_bot:
+                simulated.append(i)
+            else:
+                live.append(i)
+
+        async def play(i):
+            winners[i] = await self.play_live(*pairs[i])
+
+        jobs = [play(i) for i in live]
+        if simulated:
+            jobs.append(self.simulate(pairs, simulated, winners))
+        await asyncio.gather(*jobs)
+
+        played = []
+        for (first, second), winner in zip(pairs, winners):
+            if first is None or second is None:
+                continue
+            loser = second if winner is first else first
+            winner.wins += 1
+            loser.losses += 1
+            self.results.append((self.round_no, first, second, winner))
+            played.append((first, second, winner))
+        if self.on_round is not None:
+            self.on_round(self.round_no, played)
+        return winners
+
+    async def simulate(self, pairs, indices, winners):
+        matches = [(pairs[i][0].creature, pairs[i][1].creature, self.rng.getrandbits(32)) for i in indices]
+        chunk_count = min(self.chunks_per_round, len(matches) // MIN_CHUNK)
+        if self.executor is None or chunk_count <= 1:
+            outcomes = [simulate_matches(matches)]
+        else:
+            size = -(-len(matches) // chunk_count)
+            chunks = [matches[i:i + size] for i in range(0, len(matches), size)]
+            loop = asyncio.get_event_loop()
+            outcomes = await asyncio.gather(*(loop.run_in_executor(self.executor, simulate_matches, chunk)
+                                              for chunk in chunks))
+        roles = [role for chunk in outcomes for role in chunk]
+        for i, role in zip(indices, roles):
+            winners[i] = pairs[i][0] if role == ROLES[0] else pairs[i][1]
+
+    def standings(self):
+        return sorted(self.entrants, key=lambda e: (-e.wins, e.losses, e.entrant_id))
+
+
+def bot_entrants(count, start_id=0):
+    from creatures import Creature
+    return [Entrant(start_id + i, f"Bot {start_id + i}", Creature().to_dict()) for i in range(count)]
+
+
+def measure_bracket(entrants=1024, workers=None, seed=1):
+    """
+    Run an all-bot bracket on a process pool and report wall time per round
+    against the time the same battles take back to back in one process.
+    The pool only comes out ahead with spare cores: with ``workers`` at or
+    above os.cpu_count() on a single core it is slower than serial.
+    """
+    import os
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    random.seed(seed)
+    field = bot_entrants(entrants)
+    workers = workers or os.cpu_count() or 1
+    round_times = []
+
+    async def run(executor):
+        tournament = Tournament(field, BRACKET, executor, seed=seed, workers=workers)
+        last = [time.perf_counter()]
+
+        def on_round(round_no, played):
+            now = time.perf_counter()
+            round_times.append((round_no, len(played), now - last[0]))
+            last[0] = now
+        tournament.on_round = on_round
+        start = time.perf_counter()
+        standings = await tournament.run()
+        return standings[0], time.perf_counter() - start
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Warm the pool up so worker start-up is not billed to round 1.
+        list(executor.map(simulate_matches, [[]] * workers))
+        champion, parallel = asyncio.run(run(executor))
+    matches = [(field[i].creature, field[i + 1].creature, i) for i in range(0, entrants - 1, 2)]
+    start = time.perf_counter()
+    simulate_matches(matches)
+    per_match = (time.perf_counter() - start) / len(matches)
+    return {
+        "entrants": entrants,
+        "workers": workers,
+        "cpus": os.cpu_count(),
+        "champion": champion.name,
+        "rounds": round_times,
+        "total_sec": parallel,
+        "serial_estimate_sec": per_match * (entrants - 1),
+    }
+
+
+if __name__ == "__main__":
+    r = measure_bracket()
+    for round_no, played, seconds in r["rounds"]:
+        print(f"Round {round_no:>2}: {played:>4} battles in {seconds * 1000:7.1f} ms")
+    print(f"{r['entrants']} entrants on {r['workers']} workers ({r['cpus']} CPUs), champion {r['champion']}: "
+          f"{r['total_sec']:.2f} s (one battle after another: ~{r['serial_estimate_sec']:.2f} s)")
@@ -1,5 +1,8 @@
 import pygame
+from collections import deque
+from battle_events import DAMAGE, START, format_event
 from battle_system import Battle
+from config import ACTION_LOG_LINES
 
 class BattleScreen:
     def __init__(self, screen, battle, on_main_menu=None):
@@ -12,10 +15,15 @@ class BattleScreen:
         self.on_main_menu = on_main_menu
         self.font = pygame.font.Font(None, 28)
         self.title_font = pygame.font.Font(None, 36)
-        self.action_log = []
-        self.message = "Battle begins! It's your turn."
+        self.action_log = deque(maxlen=ACTION_LOG_LINES)
+        if self.battle.turn == "player":
+            self.message = "Battle begins! It's your turn."
+        else:
+            self.message = f"Battle begins! {self.battle.enemy.creature_type} is faster and moves first."
         self.action_log.append(self.message)
+        self.seen_seq = 0  # Last battle event copied into action_log
         self.menu_button = pygame.Rect(650, 20, 120, 40)
+        self.enemy_turns()
 
     def handle_events(self, events):
         if self.battle.battle_over:
@@ -51,22 +59,32 @@ class BattleScreen:
 
     def player_attack(self, ability_index):
         self.battle.apply_attack(self.battle.player, self.battle.enemy, ability_index)
-        self.action_log.append(self.battle.message)
-        if self.battle.battle_over:
-            return
-        self.battle.turn = "enemy"
-        self.battle.enemy_turn()
-        self.action_log.append(self.battle.message)
+        self.log_events()
         if self.battle.battle_over:
             return
-        self.battle.turn = "player"
+        self.battle.next_turn()
+        self.enemy_turns()
+
+    def enemy_turns(self):
+        """Play the enemy until it is the player's turn (more than once if it is faster)."""
+        while self.battle.turn == "enemy" and not self.battle.battle_over:
+            self.battle.enemy_turn()
+            self.log_events()
+
+    def log_events(self):
+        """Format the battle's new events into action_log (DAMAGE repeats its ATTACK)."""
+        for event in self.battle.events.since(self.seen_seq):
+            if event.kind not in (START, DAMAGE):
+                self.action_log.append(format_event(event))
+        self.seen_seq = self.battle.events.next_seq - 1
 
     def update(self, dt):
         if self.battle.battle_over and not hasattr(self, "xp_processed"):
             self.xp_processed = True
             if self.battle.winner == "player":
                 xp_gain = 50
-                self.battle.player.gain_xp(xp_gain)
+                # A level-up earned here rolls from the battle's own stream.
+                self.battle.player.gain_xp(xp_gain, self.battle.rng)
                 self.action_log.append(f"You won! Gained {xp_gain} XP.")
             else:
                 xp_loss = 30
@@ -110,7 +128,7 @@ class BattleScreen:
             self.screen.blit(end_text, (200, 300))
 
         y_log = 400
-        for msg in self.action_log[-4:]:
+        for msg in self.action_log:
             log_text = self.font.render(msg, True, (255, 255, 0))
             self.screen.blit(log_text, (50, y_log))
             y_log += 30
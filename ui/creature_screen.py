@@ -1,6 +1,9 @@
 import pygame
 import time
 from config import XP_MULTIPLIER
+from log import get_logger
+
+log = get_logger("ui.creature")
 
 class CreatureScreen:
     def __init__(self, screen, creature, on_battle, on_adventure, on_main_menu):
@@ -76,11 +79,11 @@ class CreatureScreen:
             data.append(record)
             with open(tombstone_file, "w") as f:
                 json.dump(data, f, indent=4)
-            print(f"[Rest] {self.creature.creature_type} laid to rest.")
-            print(f"[Rest] Bonus XP ({record['bonus_xp']}) recorded for XP transfer.")
+            log.info("[Rest] %s laid to rest.", self.creature.creature_type)
+            log.info("[Rest] Bonus XP (%s) recorded for XP transfer.", record["bonus_xp"])
             self.on_main_menu()
         except Exception as e:
-            print("[Rest] Error laying creature to rest:", e)
+            log.error("[Rest] Error laying creature to rest: %s", e)
 
     def close_inventory(self):
         self.inventory_screen = None
@@ -88,7 +91,6 @@ class CreatureScreen:
     def update(self, dt):
         self.creature.update_needs(dt)
         self.creature.update_age(dt)
-        self.creature.update_effects()
         if self.inventory_screen:
             self.inventory_screen.update(dt)
 
@@ -4,6 +4,9 @@ import pygame
 import json
 import os
 from character_manager import CharacterManager
+from log import get_logger
+
+log = get_logger("ui.graveyard")
 
 class GraveyardScreen:
     def __init__(self, screen, on_close):
@@ -28,7 +31,7 @@ class GraveyardScreen:
                 with open("tombstones.json", "r") as f:
                     return json.load(f)
             except Exception as e:
-                print("[Graveyard] Error loading tombstones:", e)
+                log.error("Error loading tombstones: %s", e)
                 return []
         else:
             return []
@@ -68,7 +71,7 @@ class GraveyardScreen:
                 xp_transferred = tomb.get("xp_transferred", False)
                 bonus_xp = tomb.get("bonus_xp", 0)
                 if xp_transferred or bonus_xp <= 0:
-                    print("[Graveyard] No XP to transfer from this tombstone.")
+                    log.info("No XP to transfer from this tombstone.")
                 else:
                     # Move to state=1 to pick a living creature
                     self.state = 1
@@ -92,9 +95,9 @@ class GraveyardScreen:
         xp_transferred = tomb.get("xp_transferred", False)
         bonus_xp = tomb.get("bonus_xp", 0)
         if xp_transferred or bonus_xp <= 0:
-            print("[Graveyard] XP not available.")
+            log.info("XP not available.")
             return
-        print(f"[Graveyard] Transferring {bonus_xp} bonus XP to {self.selected_creature.creature_type}.")
+        log.info("Transferring %s bonus XP to %s.", bonus_xp, self.selected_creature.creature_type)
         self.selected_creature.xp += bonus_xp
         tomb["xp_transferred"] = True
         self.save_tombstones()
@@ -109,7 +112,7 @@ class GraveyardScreen:
         self.state = 0
         self.selected_tombstone = None
         self.selected_creature = None
-        print("[Graveyard] XP transfer complete.")
+        log.info("XP transfer complete.")
 
     def update(self, dt):
         pass
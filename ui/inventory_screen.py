@@ -1,4 +1,7 @@
 import pygame
+from log import get_logger
+
+log = get_logger("ui.inventory")
 
 class InventoryScreen:
     def __init__(self, screen, creature, on_close):
@@ -37,9 +40,9 @@ class InventoryScreen:
                         if rect.collidepoint(pos):
                             used = self.creature.use_item(item["name"])
                             if used:
-                                print(f"[Inventory] Used {item['name']}.")
+                                log.info("Used %s.", item["name"])
                             else:
-                                print(f"[Inventory] Could not use {item['name']}.")
+                                log.info("Could not use %s.", item["name"])
                             self.refresh_buttons()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
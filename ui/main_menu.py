@@ -3,6 +3,9 @@
 import pygame
 import os
 import json
+from log import get_logger
+
+log = get_logger("ui.main_menu")
 
 class MainMenu:
     def __init__(self, screen, on_new_game, on_creature_selector):
@@ -45,7 +48,7 @@ class MainMenu:
                         # Create GraveyardScreen with a callback to close
                         self.graveyard_screen = GraveyardScreen(self.screen, on_close=self.close_graveyard)
                     else:
-                        print("[MainMenu] No tombstones found.")
+                        log.info("No tombstones found.")
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     # ESC in MainMenu might do nothing or quit the game
@@ -4,9 +4,11 @@ import pygame
 import json
 
 class MultiplayerLobbyScreen:
-    def __init__(self, screen, player_creature, network_client, on_start_battle, on_main_menu=None):
+    def __init__(self, screen, player_creature, network_client, on_start_battle, on_main_menu=None,
+                 on_spectate=None):
         """
         :param on_start_battle: function that takes one argument (the full BATTLE_START dict)
+        :param on_spectate: like on_start_battle, for the SPECTATE_START dict
         """
         self.screen = screen
         self.player_creature = player_creature
@@ -14,8 +16,15 @@ class MultiplayerLobbyScreen:
         self.on_start_battle = on_start_battle
         self.on_main_menu = on_main_menu
         self.font = pygame.font.Font(None, 36)
-        self.message = "Press ENTER to join the lobby, ESC for Main Menu."
+        self.message = "ENTER: join the lobby, S: watch, T: tournament, ESC: Main Menu."
         self.menu_button = pygame.Rect(650, 20, 120, 40)
+        self.network.register_handler("BATTLE_START", self.on_start_battle)
+        self.network.register_handler("ERROR", self.on_error)
+        self.network.register_handler("TOURNAMENT_JOINED", self.on_tournament_joined)
+        self.network.register_handler("TOURNAMENT_ROUND", self.on_tournament_round)
+        self.network.register_handler("TOURNAMENT_OVER", self.on_tournament_round)
+        if on_spectate:
+            self.network.register_handler("SPECTATE_START", on_spectate)
 
     def handle_events(self, events):
         for event in events:
@@ -30,20 +39,36 @@ class MultiplayerLobbyScreen:
                     }
                     self.network.send(json.dumps(msg))
                     self.message = "Joined lobby... waiting for a match."
+                elif event.key == pygame.K_s:
+                    self.network.send(json.dumps({"type": "SPECTATE"}))
+                    self.message = "Looking for a battle to watch..."
+                elif event.key == pygame.K_t:
+                    msg = {
+                        "type": "TOURNAMENT_JOIN",
+                        "creature": self.player_creature.to_dict(),
+                        "name": self.player_creature.creature_type
+                    }
+                    self.network.send(json.dumps(msg))
+                    self.message = "Signing up for the tournament..."
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 mouse_pos = event.pos
                 if self.menu_button.collidepoint(mouse_pos):
                     self.on_main_menu()
 
+    def on_error(self, msg_obj):
+        self.message = msg_obj.get("reason", "Server error.")
+
+    def on_tournament_joined(self, msg_obj):
+        self.message = (f"Tournament: {msg_obj['entrants']}/{msg_obj['size']} signed up, "
+                        f"starts in {msg_obj['starts_in']:.0f}s.")
+
+    def on_tournament_round(self, msg_obj):
+        done = "final" if msg_obj["type"] == "TOURNAMENT_OVER" else f"after round {msg_obj['round']}"
+        self.message = (f"Tournament {done}: place {msg_obj['place']}, "
+                        f"{msg_obj['wins']}W {msg_obj['losses']}L.")
+
     def update(self, dt):
-        incoming = self.network.get_message()
-        if incoming:
-            try:
-                msg_obj = json.loads(incoming)
-                if msg_obj["type"] == "BATTLE_START":
-                    self.on_start_battle(msg_obj)
-            except Exception as e:
-                print("[Lobby] Error parsing message:", e)
+        self.network.dispatch()
 
     def draw(self):
         self.screen.fill((20, 20, 60))
@@ -2,15 +2,23 @@
 
 import pygame
 import json
+from collections import deque
+from battle_events import ATTACK, STUNNED
 from battle_system import Battle
+from config import ACTION_LOG_LINES
 from abilities import ability_from_dict
 from ui.levelup_screen import LevelUpScreen
 from ui.skill_replace_screen import SkillReplaceScreen
+from state_sync import apply_delta
+from log import get_logger
+
+log = get_logger("ui.multiplayer")
 
 class MultiplayerScreen:
     def __init__(self, screen, battle_start_data, network_client, on_main_menu=None, on_battle_complete=None):
         """
-        :param battle_start_data: dict from server's BATTLE_START message.
+        :param battle_start_data: dict from server's BATTLE_START message, or
+            SPECTATE_START to watch someone else's battle as player1's side.
         :param on_battle_complete: callback (no arguments) called after battle and popups finish.
         """
         self.screen = screen
@@ -22,27 +30,43 @@ class MultiplayerScreen:
         self.awarded_xp = False
         self.levelup_screen = None
         self.ready_to_exit = False
-        self.action_log = []
+        self.move_pending = False
+        self.action_log = deque(maxlen=ACTION_LOG_LINES)
 
+        self.spectator = battle_start_data.get("spectator", False)
         self.my_role = battle_start_data.get("your_role", "player1")
         self.current_turn = battle_start_data.get("current_turn", "player1")
         self.opponent_role = "player2" if self.my_role == "player1" else "player1"
 
-        print(f"[Debug] MultiplayerScreen init: my_role={self.my_role}, current_turn={self.current_turn}, opponent_role={self.opponent_role}")
+        log.debug("MultiplayerScreen init: my_role=%s, current_turn=%s, opponent_role=%s",
+                  self.my_role, self.current_turn, self.opponent_role)
 
         player_creature_data = battle_start_data["player_creature"]
         opponent_creature_data = battle_start_data["opponent_creature"]
         self.player_creature = self.reconstruct_creature(player_creature_data)
         self.opponent_creature = self.reconstruct_creature(opponent_creature_data)
-        print(f"[Debug] Player creature: {self.player_creature}")
-        print(f"[Debug] Opponent creature: {self.opponent_creature}")
+        # Spectators join mid-battle: the snapshots are topped up with the current state.
+        for role, fields in battle_start_data.get("state", {}).items():
+            apply_delta(self.creature_for(role), fields)
+        log.debug("Player creature: %s", self.player_creature)
+        log.debug("Opponent creature: %s", self.opponent_creature)
 
         self.battle = Battle(self.player_creature, self.opponent_creature)
         self.message = f"Battle begins! Turn: {self.current_turn}"
         self.action_log.append(self.message)
-        print(f"[Debug] {self.message}")
+        log.debug("%s", self.message)
 
         self.menu_button = pygame.Rect(650, 20, 120, 40)
+        self.network.register_handler("MOVE_RESULT", self.apply_move_result)
+        self.network.register_handler("MOVE_REJECTED", self.on_move_rejected)
+        self.network.register_handler("RECONNECTING", self.on_reconnecting)
+        self.network.register_handler("RESUMED", self.on_resumed)
+        self.network.register_handler("RESUME_FAILED", self.on_resume_failed)
+        self.network.register_handler("OPPONENT_DISCONNECTED", self.on_opponent_disconnected)
+        self.network.register_handler("OPPONENT_RESUMED", self.on_opponent_resumed)
+        self.network.register_handler("OPPONENT_LEFT", self.on_opponent_left)
+        self.network.register_handler("BATTLE_END", self.on_battle_end)
+        self.network.register_handler("SPECTATE_ENDED", self.on_spectate_ended)
 
     def reconstruct_creature(self, creature_data):
         from creatures import Creature
@@ -53,10 +77,12 @@ class MultiplayerScreen:
         c.speed = creature_data["speed"]
         c.current_hp = creature_data["current_hp"]
         c.level = creature_data["level"]
-        c.xp = creature_data["xp"]
-        c.evolution_stage = creature_data["evolution_stage"]
-        c.age = creature_data["age"]
-        c.is_alive = creature_data["is_alive"]
+        # BATTLE_START carries a combat snapshot (state_sync.battle_snapshot),
+        # so the non-combat fields may be absent.
+        c.xp = creature_data.get("xp", 0)
+        c.evolution_stage = creature_data.get("evolution_stage", 1)
+        c.age = creature_data.get("age", 0.0)
+        c.is_alive = creature_data.get("is_alive", True)
         c.hunger = creature_data.get("hunger", 0)
         c.energy = creature_data.get("energy", 100)
         c.abilities = [ability_from_dict(a_dict) for a_dict in creature_data["abilities"]]
@@ -69,18 +95,18 @@ class MultiplayerScreen:
         for event in events:
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
-                    if self.battle.battle_over and self.on_main_menu:
-                        print("[Debug] ESC pressed and battle over. Returning to main menu.")
+                    if (self.battle.battle_over or self.spectator) and self.on_main_menu:
+                        log.debug("ESC pressed and battle over. Returning to main menu.")
                         self.network.close()
                         self.on_main_menu()
                     else:
-                        print("[Debug] ESC pressed but battle in progress; ignoring.")
+                        log.debug("ESC pressed but battle in progress; ignoring.")
                 elif event.key == pygame.K_RETURN:
                     if self.battle.battle_over and self.ready_to_exit:
-                        print("[Debug] ENTER pressed; exiting battle and saving creature stats.")
+                        log.debug("ENTER pressed; exiting battle and saving creature stats.")
                         if self.on_battle_complete:
                             self.on_battle_complete()
-                else:
+                elif not self.spectator:
                     if not self.battle.battle_over and self.current_turn == self.my_role:
                         if event.key in [pygame.K_1, pygame.K_KP1]:
                             self.send_move(0)
@@ -91,68 +117,132 @@ class MultiplayerScreen:
                         elif event.key in [pygame.K_4, pygame.K_KP4]:
                             self.send_move(3)
                     else:
-                        print("[Debug] Not my turn or battle over; key press ignored.")
+                        log.debug("Not my turn or battle over; key press ignored.")
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 mouse_pos = event.pos
                 if self.menu_button.collidepoint(mouse_pos):
-                    if self.battle.battle_over and self.on_main_menu:
-                        print("[Debug] Main Menu button clicked and battle over. Returning to main menu.")
+                    if (self.battle.battle_over or self.spectator) and self.on_main_menu:
+                        log.debug("Main Menu button clicked and battle over. Returning to main menu.")
                         self.network.close()
                         self.on_main_menu()
                     else:
-                        print("[Debug] Main Menu button clicked but battle in progress; ignoring.")
+                        log.debug("Main Menu button clicked but battle in progress; ignoring.")
 
     def send_move(self, ability_index):
-        print(f"[Debug] {self.my_role} is sending MOVE with ability index {ability_index}")
-        self.battle.apply_attack(self.player_creature, self.opponent_creature, ability_index)
-        self.message = self.battle.message
-        self.action_log.append(self.message)
-        print(f"[Debug] After local attack: {self.message}")
-        next_turn = self.opponent_role
-        print(f"[Debug] Switching turn. Next turn will be {next_turn}")
+        if self.move_pending:
+            log.debug("Previous MOVE still awaiting the server's result; ignoring.")
+            return
+        log.debug("%s is sending MOVE with ability index %s", self.my_role, ability_index)
+        # The server owns the battle: it validates the move and replies with
+        # MOVE_RESULT (or MOVE_REJECTED); nothing is applied locally until then.
         move_msg = {
             "type": "MOVE",
-            "index": ability_index,
-            "next_turn": next_turn,
-            "sender_role": self.my_role
+            "index": ability_index
         }
         self.network.send(json.dumps(move_msg))
-        print(f"[Debug] Sent MOVE message: {json.dumps(move_msg)}")
-        self.current_turn = next_turn
-        print(f"[Debug] Local current_turn updated to {self.current_turn}")
+        self.move_pending = True
+        log.debug("Sent MOVE message: %s", move_msg)
+
+    def creature_for(self, role):
+        return self.player_creature if role == self.my_role else self.opponent_creature
+
+    def end_battle(self, winner_role):
+        self.battle.battle_over = True
+        self.battle.winner = "player" if winner_role == self.my_role else "enemy"
+
+    def apply_move_result(self, msg):
+        """Copy the server's authoritative outcome of a move into the local battle."""
+        for role, fields in msg.get("delta", {}).items():
+            apply_delta(self.creature_for(role), fields)
+
+        # Mirror the move into the local battle's event log; text is made
+        # here only because the log line is shown straight away.
+        attacker = self.creature_for(msg["actor"])
+        if msg.get("stunned"):
+            self.battle.events.emit(STUNNED, attacker)
+        else:
+            defender = self.opponent_creature if attacker is self.player_creature else self.player_creature
+            self.battle.events.emit(ATTACK, attacker, defender, attacker.abilities[msg["index"]], msg["damage"])
+        self.message = self.battle.message
+        self.action_log.append(self.message)
+
+        self.current_turn = msg["next_turn"]
+        if msg.get("winner"):
+            self.end_battle(msg["winner"])
+        if msg["actor"] == self.my_role:
+            self.move_pending = False
+        log.debug("Updated current_turn: %s, message: %s", self.current_turn, self.message)
+
+    def on_move_rejected(self, msg):
+        self.move_pending = False
+        self.message = msg.get("reason", "Move rejected!")
+        self.action_log.append(self.message)
+
+    def on_reconnecting(self, msg):
+        self.message = "Connection lost. Reconnecting..."
+        self.action_log.append(self.message)
+
+    def on_resumed(self, msg):
+        """Back in our seat; missed MOVE_RESULTs follow, or ``state`` replaces them."""
+        for role, fields in msg.get("state", {}).items():
+            apply_delta(self.creature_for(role), fields)
+        self.current_turn = msg["current_turn"]
+        if msg.get("winner"):
+            self.end_battle(msg["winner"])
+        # A MOVE sent while we were away never reached the server.
+        self.move_pending = False
+        self.message = "Reconnected."
+        self.action_log.append(self.message)
+
+    def on_resume_failed(self, msg):
+        if not self.battle.battle_over:
+            self.end_battle(self.opponent_role)
+        self.message = "Could not rejoin the battle."
+        self.action_log.append(self.message)
+
+    def on_opponent_disconnected(self, msg):
+        self.message = f"Opponent disconnected. Waiting up to {msg.get('grace', 0):.0f}s for them..."
+        self.action_log.append(self.message)
+
+    def on_opponent_resumed(self, msg):
+        self.message = "Opponent reconnected."
+        self.action_log.append(self.message)
+
+    def on_spectate_ended(self, msg):
+        if not self.battle.battle_over:
+            self.battle.battle_over = True
+            self.message = "The battle has ended."
+            self.action_log.append(self.message)
+
+    def on_opponent_left(self, msg):
+        if not self.battle.battle_over:
+            self.end_battle(self.my_role)
+            self.message = "Opponent left the battle. You win by forfeit!"
+            self.action_log.append(self.message)
+
+    def on_battle_end(self, msg):
+        """The server decided the battle without a final move (a timed-out tournament battle)."""
+        if not self.battle.battle_over:
+            self.end_battle(msg["winner"])
+            self.message = "Time is up! The battle is decided on remaining HP."
+            self.action_log.append(self.message)
 
     def update(self, dt):
         if self.levelup_screen is not None:
             self.levelup_screen.update(dt)
             return
 
-        incoming = self.network.get_message()
-        if incoming:
-            print(f"[Debug] Received message: {incoming}")
-            try:
-                msg = json.loads(incoming)
-                if msg.get("type") == "MOVE":
-                    if msg.get("sender_role") == self.my_role:
-                        print("[Debug] Ignoring our own echoed MOVE message.")
-                    else:
-                        index = msg["index"]
-                        next_turn = msg["next_turn"]
-                        print(f"[Debug] Processing MOVE from opponent: index={index}, next_turn={next_turn}")
-                        self.battle.apply_attack(self.opponent_creature, self.player_creature, index)
-                        self.action_log.append(self.battle.message)
-                        self.current_turn = next_turn
-                        self.message = self.battle.message
-                        print(f"[Debug] Updated current_turn: {self.current_turn}, message: {self.message}")
-            except Exception as e:
-                print("[Debug] Error processing incoming message:", e)
+        self.network.dispatch()
 
         if self.battle.battle_over and not self.ready_to_exit:
             self.ready_to_exit = True
+            if self.spectator:
+                return
             if self.battle.winner == "player":
                 prev_level = self.player_creature.level
                 self.player_creature.gain_xp(100)
                 if self.player_creature.level > prev_level and self.player_creature.pending_skill:
-                    print("[Debug] Level up detected. Launching LevelUpScreen popup.")
+                    log.debug("Level up detected. Launching LevelUpScreen popup.")
                     xp_gained = 100
                     self.levelup_screen = LevelUpScreen(
                         self.screen,
@@ -166,11 +256,11 @@ class MultiplayerScreen:
             else:
                 self.player_creature.lose_xp(50)
                 self.message = "You lost! Lost 50 XP. Press ENTER to continue."
-            print(f"[Debug] Battle over. Winner: {self.battle.winner}")
+            log.debug("Battle over. Winner: %s", self.battle.winner)
 
     def levelup_decision_callback(self, decision):
         if decision:
-            print("[Debug] Player chose to apply the new skill. Launching SkillReplaceScreen popup.")
+            log.debug("Player chose to apply the new skill. Launching SkillReplaceScreen popup.")
             self.levelup_screen = SkillReplaceScreen(
                 self.screen,
                 self.player_creature,
@@ -178,17 +268,17 @@ class MultiplayerScreen:
                 self.skill_replace_callback
             )
         else:
-            print("[Debug] Player chose to discard the new skill.")
+            log.debug("Player chose to discard the new skill.")
             self.player_creature.pending_skill = None
             self.player_creature.level_just_upgraded = False
             self.levelup_screen = None
 
     def skill_replace_callback(self, index):
         if index is not None:
-            print(f"[Debug] Replacing ability at index {index} with new skill.")
+            log.debug("Replacing ability at index %s with new skill.", index)
             self.player_creature.abilities[index] = self.player_creature.pending_skill
         else:
-            print("[Debug] Player canceled ability replacement.")
+            log.debug("Player canceled ability replacement.")
         self.player_creature.pending_skill = None
         self.player_creature.level_just_upgraded = False
         self.levelup_screen = None
@@ -214,15 +304,18 @@ class MultiplayerScreen:
         opp_hp = self.font.render(f"HP: {self.opponent_creature.current_hp}/{self.opponent_creature.max_hp}", True, (255, 255, 255))
         self.screen.blit(opp_hp, (450, 80))
 
-        # Draw action log (last 4 actions)
+        # Draw action log (last ACTION_LOG_LINES lines)
         log_y = 150
-        for action in self.action_log[-4:]:
+        for action in self.action_log:
             log_text = self.font.render(action, True, (200, 200, 0))
             self.screen.blit(log_text, (50, log_y))
             log_y += 30
 
         if not self.battle.battle_over:
-            if self.current_turn == self.my_role:
+            if self.spectator:
+                watch_surf = self.font.render(f"Spectating: {self.current_turn} to move", True, (255, 255, 255))
+                self.screen.blit(watch_surf, (50, 500))
+            elif self.current_turn == self.my_role:
                 instructions = "Your Turn! Choose an Ability (1-4):"
                 turn_text = self.font.render(instructions, True, (255, 255, 255))
                 self.screen.blit(turn_text, (50, 500))
@@ -235,7 +328,10 @@ class MultiplayerScreen:
                 wait_surf = self.font.render(waiting_text, True, (255, 255, 255))
                 self.screen.blit(wait_surf, (50, 500))
         else:
-            end_prompt = "Battle over. Press ENTER to return to Creature Screen."
+            if self.spectator:
+                end_prompt = "Battle over. Press ESC to return to Main Menu."
+            else:
+                end_prompt = "Battle over. Press ENTER to return to Creature Screen."
             prompt_text = self.font.render(end_prompt, True, (255, 255, 0))
             self.screen.blit(prompt_text, (200, 300))
 